@@ -5,6 +5,7 @@ from channels.auth import AuthMiddlewareStack
 
 from base.middleware import AuthTokenAuthMiddleware
 from chat import urls
+from posts import urls as posts_urls
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 django_asgi_app = get_asgi_application()
@@ -12,6 +13,6 @@ django_asgi_app = get_asgi_application()
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthTokenAuthMiddleware(
-        URLRouter(urls.websocket_urlpatterns)
+        URLRouter(urls.websocket_urlpatterns + posts_urls.websocket_urlpatterns)
     ),
 })
@@ -28,7 +28,7 @@ load_dotenv(os.path.join(BASE_DIR, '.env'))
 SECRET_KEY = os.getenv("SECRET_KEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = os.getenv("DEBUG", default=True)
+DEBUG = os.getenv("DEBUG", default="True").lower() in ("true", "1")
 
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS").split(',')
 CORS_ORIGIN_WHITELIST = os.getenv("CORS_ORIGIN_WHITELIST").split(',')
@@ -54,20 +54,35 @@ INSTALLED_APPS = [
 # Simple JWT
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'base.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
 }
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# events are sent from the WSGI workers (e.g. new comments) and delivered by
+# the ASGI server, that needs a layer shared between the processes. The
+# in-memory layer only reaches sockets of the process that sent the event,
+# it's meant for running everything in one process (`runserver`, tests).
+if os.getenv('CHANNEL_LAYER_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [os.getenv('CHANNEL_LAYER_REDIS_URL')],
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
     }
-}
 
 ASGI_APPLICATION = 'backend.asgi.application'
 
 MIDDLEWARE = [
+    'base.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,6 +120,10 @@ ENGINES = {
 
 DB_ENGINE = os.getenv('DB_ENGINE', default='postgres')
 
+if DB_ENGINE == 'postgres':
+    # trigram lookups used by the product search backend
+    INSTALLED_APPS += ['django.contrib.postgres']
+
 DATABASES = {
     'default': {
         'ENGINE': ENGINES[DB_ENGINE],
@@ -116,6 +135,38 @@ DATABASES = {
     }
 }
 
+# Cache
+# The default local memory cache is per process, deployments running several
+# workers should point this to a shared cache (e.g. redis or memcached).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.getenv('CACHE_LOCATION') or '',
+    }
+}
+
+# resolved auth tokens are kept in process for AUTH_TOKEN_LOCAL_TTL seconds
+# (so a change made through another process is seen after at most that long)
+# and in the shared cache for AUTH_TOKEN_CACHE_TIMEOUT seconds
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_CACHE_SIZE', default=10000))
+AUTH_TOKEN_LOCAL_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_TTL', default=10))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=300))
+
+# at most this many passwords are hashed at once on a host, across all of its
+# workers, and at most PASSWORD_HASHING_QUEUE more requests wait up to
+# PASSWORD_HASHING_QUEUE_TIMEOUT seconds for their turn. The requests past
+# that are rejected with a 429. The lock files live in
+# PASSWORD_HASHING_LOCK_DIR, which must be host local.
+PASSWORD_HASHING_SLOTS = int(os.getenv('PASSWORD_HASHING_SLOTS', default=os.cpu_count() or 1))
+PASSWORD_HASHING_QUEUE = int(os.getenv('PASSWORD_HASHING_QUEUE', default=os.cpu_count() or 1))
+PASSWORD_HASHING_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASHING_QUEUE_TIMEOUT', default=2))
+PASSWORD_HASHING_LOCK_DIR = os.getenv('PASSWORD_HASHING_LOCK_DIR',
+                                      default=os.path.join(BASE_DIR, 'var', 'password_hashing'))
+
+# page size of the chat dialog list in cursor mode
+DIALOGS_PAGINATION = int(os.getenv('DIALOGS_PAGINATION', default=20))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -166,5 +217,65 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DOMAIN_URL = os.getenv('DOMAIN_URL', default='http://localhost:8000')
 
+# per request SQL instrumentation, see `QueryInstrumentationMiddleware`
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', default='False').lower() in ('true', '1')
+# a query fingerprint executed this many times in one request is reported as a probable N+1
+SQL_REPEATED_QUERY_THRESHOLD = int(os.getenv('SQL_REPEATED_QUERY_THRESHOLD', default=5))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'base.sql': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# seconds the facet counts of a filter combination are cached for
+PRODUCT_FACETS_CACHE_TIMEOUT = int(os.getenv('PRODUCT_FACETS_CACHE_TIMEOUT', default=60))
+
+# thumbnail names are content hashed, so they can be cached for good. Sent by
+# `serve_thumbnail` under DEBUG, the server serving MEDIA_ROOT should do the same
+THUMBNAIL_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# maximum number of products in one bulk create/update request
+PRODUCT_BULK_MAX_ITEMS = int(os.getenv('PRODUCT_BULK_MAX_ITEMS', default=500))
+
+# seconds between writes of buffered product views
+PRODUCT_VIEWS_FLUSH_INTERVAL = int(os.getenv('PRODUCT_VIEWS_FLUSH_INTERVAL', default=5))
+
+# number of stored follow recommendations per user and the half-life of the
+# recency bonus in their score, they are recomputed by scheduled runs of
+# `rebuild_recommendations`
+USER_RECOMMENDATIONS_LIMIT = int(os.getenv('USER_RECOMMENDATIONS_LIMIT', default=50))
+USER_RECOMMENDATIONS_HALF_LIFE_DAYS = int(os.getenv('USER_RECOMMENDATIONS_HALF_LIFE_DAYS', default=30))
+# follows and unfollows also recompute the candidates of both users in the
+# background, unless their two hops span more follows than this
+USER_RECOMMENDATIONS_REFRESH_MAX_PATHS = int(os.getenv('USER_RECOMMENDATIONS_REFRESH_MAX_PATHS', default=100000))
+
+# CSR snapshot of the follow graph written by `compact_social_graph`, and the
+# seconds between polls of the follow events written since
+SOCIAL_GRAPH_PATH = os.getenv('SOCIAL_GRAPH_PATH', default=os.path.join(BASE_DIR, 'var', 'social_graph.csr'))
+SOCIAL_GRAPH_POLL_INTERVAL = float(os.getenv('SOCIAL_GRAPH_POLL_INTERVAL', default=1))
+# seconds the follow lookups of a user read their own changes from the database,
+# keep it well above the poll interval
+SOCIAL_GRAPH_OWN_WRITES_TIMEOUT = float(os.getenv('SOCIAL_GRAPH_OWN_WRITES_TIMEOUT', default=10))
+
+# posts are pushed to the timelines of their author's followers, unless the
+# author has more followers than this, then they are pulled when feeds are read
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000))
+# entries kept per timeline by `trim_timelines`
+FEED_TIMELINE_LENGTH = int(os.getenv('FEED_TIMELINE_LENGTH', default=800))
+# recent posts copied to the follower's timeline on follow
+FEED_BACKFILL_POSTS = int(os.getenv('FEED_BACKFILL_POSTS', default=20))
+
 AUTH_USER_MODEL = 'base.User'
 AUTHENTICATION_BACKENDS = ['base.backends.EmailBackend']
@@ -21,12 +21,17 @@ from django.conf.urls.static import static
 
 from django.views.generic import TemplateView
 from base.urls import urls
+from base.views.general_views import serve_thumbnail
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(urls)),
-    re_path(r'chat/', include('chat.urls', namespace='chat'))
+    re_path(r'chat/', include('chat.urls', namespace='chat')),
 ]
 
+if settings.DEBUG:
+    # ahead of `static` so thumbnails get their cache headers
+    urlpatterns.append(re_path(r'^media/thumbnails/(?P<path>.*)$', serve_thumbnail, name='thumbnail'))
+
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -5,3 +5,5 @@ class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
 
+    def ready(self):
+        from base import signals  # noqa
@@ -0,0 +1,100 @@
+import hashlib
+import pickle
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from base import metrics
+from base.cache import LocalTTLCache
+
+
+class TokenCache:
+    """
+    Resolved tokens, with their user attached, in a short-lived in-process LRU
+    in front of the shared cache. Entries are dropped from both when the token
+    is deleted or its user is saved. Other processes drop their local copy when
+    it expires. Cache keys are hashes, the token keys are credentials.
+
+    Columns updated in place with `UPDATE`, which no signal reports, are left
+    out of the cached user, see `CachedTokenAuthentication`.
+    """
+
+    def __init__(self, local_size, local_ttl, timeout):
+        # pickled, so every request gets its own user instance
+        self.local = LocalTTLCache(local_size, local_ttl)
+        self.timeout = timeout
+
+    @staticmethod
+    def cache_key(key):
+        return 'auth_token:%s' % hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        cache_key = self.cache_key(key)
+        data = self.local.get(cache_key)
+        if data is not None:
+            metrics.increment('auth_token_cache.local_hits')
+            return pickle.loads(data)
+        token = cache.get(cache_key)
+        if token is not None:
+            metrics.increment('auth_token_cache.shared_hits')
+            self.local.set(cache_key, pickle.dumps(token))
+            return token
+        metrics.increment('auth_token_cache.misses')
+        return None
+
+    def set(self, token):
+        cache_key = self.cache_key(token.key)
+        cache.set(cache_key, token, self.timeout)
+        self.local.set(cache_key, pickle.dumps(token))
+
+    def delete(self, *keys):
+        cache_keys = [self.cache_key(key) for key in keys]
+        for cache_key in cache_keys:
+            self.local.delete(cache_key)
+        cache.delete_many(cache_keys)
+
+    @staticmethod
+    def hit_rate():
+        hits = metrics.value('auth_token_cache.local_hits') + metrics.value('auth_token_cache.shared_hits')
+        total = hits + metrics.value('auth_token_cache.misses')
+        return round(hits / total, 4) if total else None
+
+
+token_cache = TokenCache(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_TTL,
+                         settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+metrics.register_gauge('auth_token_cache.hit_rate', token_cache.hit_rate)
+metrics.register_gauge('auth_token_cache.local_size', lambda: len(token_cache.local))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    `TokenAuthentication` that only queries the token and user tables when the
+    token isn't cached. Inactive users and unknown tokens are never cached.
+    """
+    # updated with `F()` expressions, deferred so they are read from the
+    # database when used, and left out of saves of the cached user
+    deferred_user_fields = ('followers_count', 'following_count')
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            token = self.get_token(key)
+            token_cache.set(token)
+        return token.user, token
+
+    def get_token(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user') \
+                .defer(*(f'user__{field}' for field in self.deferred_user_fields)) \
+                .get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
 
+from base.hashing import hash_password, verify_password
+
 
 class EmailBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -8,8 +10,10 @@ class EmailBackend(ModelBackend):
         try:
             user = UserModel.objects.get(email=username)
         except UserModel.DoesNotExist:
+            # hash anyway, so the response time doesn't tell which emails exist
+            hash_password(password)
             return None
         else:
-            if user.check_password(password) and self.user_can_authenticate(user):
+            if verify_password(user, password) and self.user_can_authenticate(user):
                 return user
         return None
@@ -0,0 +1,75 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.db import close_old_connections
+
+from base import metrics
+
+logger = logging.getLogger('base.background')
+
+
+class BackgroundQueue:
+    """
+    Runs jobs scheduled by requests, usually from `transaction.on_commit`, in
+    a thread per process, so no request waits for them. Jobs run one at a
+    time in the order they were scheduled. Jobs still queued when the process
+    exits are run before it does.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.pid = None
+        self._reset()
+        atexit.register(self.drain)
+        metrics.register_gauge(f'{name}.pending', self.pending_count)
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.jobs = queue.SimpleQueue()
+        self.thread = None
+
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # forked worker, the parent runs what it queued
+                self._reset()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            close_old_connections()
+            self._run_job(*job)
+
+    def _run_job(self, function, *args):
+        try:
+            function(*args)
+        except Exception:
+            logger.exception(f'Failed to run {function.__name__}{args}')
+            metrics.increment(f'{self.name}.failures')
+
+    def schedule(self, function, *args):
+        self._ensure_started()
+        self.jobs.put((function, *args))
+
+    def drain(self):
+        if self.pid != os.getpid():
+            return
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            self._run_job(*job)
+
+    def pending_count(self):
+        return self.jobs.qsize()
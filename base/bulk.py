@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from base.listing import sync_product_listings
+from base.models import Product
+from base.serializers import BulkProductItemSerializer, generate_announcement_code
+from base.utils import normalize_serializer_errors
+
+ID_FIELD = serializers.IntegerField(min_value=1)
+
+
+def generate_announcement_codes(count):
+    """Unique codes for `count` new products, checked against existing ones with a single query per round"""
+    codes = set()
+    while len(codes) < count:
+        codes.add(generate_announcement_code())
+    taken = set(Product.objects.filter(announcement_code__in=codes).values_list('announcement_code', flat=True))
+    while taken:
+        codes -= taken
+        replacements = set()
+        while len(replacements) < len(taken):
+            code = generate_announcement_code()
+            if code not in codes:
+                replacements.add(code)
+        taken = set(
+            Product.objects.filter(announcement_code__in=replacements).values_list('announcement_code', flat=True)
+        )
+        codes |= replacements
+    return list(codes)
+
+
+def validate_items(items, instances=None):
+    """
+    Validates every item against relations fetched once for the whole batch,
+    returns the validated data and the errors keyed by item index.
+    """
+    context = {'related_objects': BulkProductItemSerializer.prefetch_related_objects(items)}
+    validated, errors = [], {}
+    for index, item in enumerate(items):
+        instance = instances[index] if instances is not None else None
+        serializer = BulkProductItemSerializer(instance, data=item, context=context, partial=instance is not None)
+        if serializer.is_valid():
+            validated.append(serializer.validated_data)
+        else:
+            errors[index] = normalize_serializer_errors(serializer.errors)
+    return validated, errors
+
+
+def bulk_create_products(items, user):
+    """Creates all items or none of them, returns `(products, errors)`"""
+    validated, errors = validate_items(items)
+    if errors:
+        return [], errors
+
+    codes = generate_announcement_codes(len(validated))
+    products = [
+        Product(user=user, announcement_code=code, **data)
+        for data, code in zip(validated, codes)
+    ]
+    with transaction.atomic():
+        Product.objects.bulk_create(products)
+        if products and products[0].pk is None:
+            # mysql doesn't return the ids of bulk inserted rows, the codes are unique
+            ids = dict(Product.objects.filter(announcement_code__in=codes).values_list('announcement_code', '_id'))
+            for product in products:
+                product._id = ids[product.announcement_code]
+        sync_product_listings([product.pk for product in products])
+    return products, {}
+
+
+def validate_ids(items):
+    """The `_id` of every item, `None` for invalid ones, and their errors keyed by item index"""
+    ids, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            ids.append(ID_FIELD.run_validation(item.get('_id', empty) if isinstance(item, dict) else empty))
+        except serializers.ValidationError as e:
+            ids.append(None)
+            errors[index] = {'_id': str(e.detail[0])}
+    return ids, errors
+
+
+def bulk_update_products(items, user):
+    """Updates all items (identified by `_id`) or none of them, returns `(products, errors)`"""
+    ids, errors = validate_ids(items)
+    products_by_id = Product.objects.select_related(*BulkProductItemSerializer.relation_fields).filter(
+        user=user, _id__in=[pk for pk in ids if pk is not None]
+    ).in_bulk()
+    for index, pk in enumerate(ids):
+        if pk is not None and pk not in products_by_id:
+            errors[index] = {'_id': _('Product not found')}
+    if errors:
+        return [], errors
+
+    products = [products_by_id[pk] for pk in ids]
+    validated, errors = validate_items(items, products)
+    if errors:
+        return [], errors
+
+    fields = set()
+    now = timezone.now()
+    for product, data in zip(products, validated):
+        product.user = user
+        product.updated_at = now
+        for name, value in data.items():
+            setattr(product, name, value)
+            fields.add(name)
+    if fields:
+        with transaction.atomic():
+            Product.objects.bulk_update(products, sorted(fields | {'updated_at'}))
+            sync_product_listings([product.pk for product in products])
+    return products, {}
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class VersionedCache:
+    """
+    Keeps a computed payload in process and in the shared cache, keyed by a
+    version number stored in the shared cache. Bumping the version makes every
+    process rebuild (or fetch) the payload on its next read.
+    """
+
+    def __init__(self, name, build, timeout=None):
+        self.version_key = f'{name}:version'
+        self.payload_key = f'{name}:payload:%s'
+        self.build = build
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.local = None
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # start from a clock value, so versions don't repeat after the key is evicted
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def bump(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, time.time_ns(), None)
+
+    def get(self):
+        """Returns `(payload, etag)` for the current version"""
+        version = self.get_version()
+        local = self.local
+        if local is not None and local[0] == version:
+            return local[1], local[2]
+
+        with self.lock:
+            entry = cache.get(self.payload_key % version)
+            if entry is None:
+                payload = self.build()
+                content = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True)
+                entry = (payload, '"%s"' % hashlib.sha1(content.encode('utf-8')).hexdigest())
+                cache.set(self.payload_key % version, entry, self.timeout)
+            self.local = (version,) + tuple(entry)
+        return entry
+
+
+class LocalTTLCache:
+    """
+    Bounded in-process LRU whose entries expire `ttl` seconds after they were set.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def build_product_settings():
+    from base.serializers import ProductSettingsSerializer
+    return ProductSettingsSerializer().to_representation({})
+
+
+product_settings_cache = VersionedCache('product_settings', build_product_settings)
@@ -0,0 +1,102 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+
+from base import metrics
+from base.models import Product, ProductListing
+
+logger = logging.getLogger('base.counters')
+
+
+class ViewCountBuffer:
+    """
+    Collects product views in memory and writes them periodically as
+    `UPDATE ... SET seen_count = seen_count + n`, so a view never takes a row
+    lock on the request path. Products that got the same number of views are
+    flushed with a single statement.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.pid = None
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.oldest_pending_at = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # forked worker, whatever the parent buffered is flushed by the parent
+                self._reset()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='product-views-flush', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            close_old_connections()
+            self.flush()
+
+    def increment(self, product_id):
+        self._ensure_started()
+        with self.lock:
+            self.pending[product_id] += 1
+            if self.oldest_pending_at is None:
+                self.oldest_pending_at = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            pending, oldest_pending_at = self.pending, self.oldest_pending_at
+            self.pending, self.oldest_pending_at = defaultdict(int), None
+        if not pending:
+            return
+
+        by_count = defaultdict(list)
+        for product_id, count in pending.items():
+            by_count[count].append(product_id)
+        try:
+            with transaction.atomic():
+                for count, product_ids in sorted(by_count.items()):
+                    for model in (Product, ProductListing):
+                        model.objects.filter(_id__in=sorted(product_ids)) \
+                            .update(seen_count=F('seen_count') + count)
+        except DatabaseError:
+            logger.exception('Failed to flush product views, keeping them for the next flush')
+            with self.lock:
+                for product_id, count in pending.items():
+                    self.pending[product_id] += count
+                self.oldest_pending_at = min(filter(None, (self.oldest_pending_at, oldest_pending_at)))
+            return
+        metrics.increment('product_views.flushed', sum(pending.values()))
+
+    def flush_lag(self):
+        oldest_pending_at = self.oldest_pending_at
+        if oldest_pending_at is None:
+            return 0
+        return round(time.monotonic() - oldest_pending_at, 3)
+
+    def pending_count(self):
+        return sum(self.pending.values())
+
+
+product_views_buffer = ViewCountBuffer(settings.PRODUCT_VIEWS_FLUSH_INTERVAL)
+
+metrics.register_gauge('product_views.flush_lag_seconds', product_views_buffer.flush_lag)
+metrics.register_gauge('product_views.pending', product_views_buffer.pending_count)
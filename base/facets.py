@@ -0,0 +1,107 @@
+import hashlib
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max, Min, Value
+from django.db.models.functions import Floor, Least
+
+PRICE_QUANTUM = Decimal('0.01')
+
+
+def format_price(value):
+    # same representation as the `price` field of the product serializers
+    return str(value.quantize(PRICE_QUANTUM))
+
+
+class ProductFacets:
+    """
+    Per facet product counts for the filter sidebar, computed with grouped
+    queries over the filtered product queryset. Year buckets and price bins
+    are computed by the database in the same grouped statement.
+    """
+    year_bucket_size = 5
+    price_bins = 10
+
+    def __init__(self, queryset):
+        # ordering would end up in GROUP BY
+        self.queryset = queryset.order_by()
+
+    def compute(self):
+        return {
+            'location': self.count_by('location_id'),
+            'live_location': self.count_by('live_location_id'),
+            'category': self.count_by('category'),
+            'customs_clearance': self.count_by('customs_clearance'),
+            'year': self.year_buckets(),
+            'price': self.price_histogram(),
+        }
+
+    def count_by(self, field):
+        rows = self.queryset.values(field).annotate(count=Count('pk')).order_by('-count', field)
+        return [{'value': row[field], 'count': row['count']} for row in rows]
+
+    def year_buckets(self):
+        size = self.year_bucket_size
+        bucket = ExpressionWrapper(Floor(F('year') / Value(size)) * Value(size), output_field=IntegerField())
+        rows = self.queryset.filter(year__isnull=False) \
+            .values(bucket=bucket) \
+            .annotate(count=Count('pk')) \
+            .order_by('bucket')
+        return [
+            {'from': row['bucket'], 'to': row['bucket'] + size - 1, 'count': row['count']}
+            for row in rows
+        ]
+
+    def price_histogram(self):
+        bounds = self.queryset.aggregate(min_price=Min('price'), max_price=Max('price'))
+        min_price, max_price = bounds['min_price'], bounds['max_price']
+        if min_price is None:
+            return []
+        if min_price == max_price:
+            return [{'from': format_price(min_price), 'to': format_price(max_price),
+                     'count': self.queryset.count()}]
+
+        bins = self.price_bins
+        width = (max_price - min_price) / bins
+        # the maximum price falls on the upper edge, keep it in the last bin
+        index = ExpressionWrapper(
+            Least(Floor((F('price') - Value(min_price)) / Value(width)), Value(bins - 1)),
+            output_field=IntegerField()
+        )
+        counts = dict(
+            self.queryset.values(bin=index)
+            .annotate(count=Count('pk'))
+            .values_list('bin', 'count')
+        )
+        return [
+            {
+                'from': format_price(min_price + width * i),
+                'to': format_price(max_price if i == bins - 1 else min_price + width * (i + 1)),
+                'count': counts.get(i, 0),
+            }
+            for i in range(bins)
+        ]
+
+
+def get_facets_cache_key(filterset):
+    """
+    Key of the facets of a validated `filterset`, built from the cleaned values
+    so equivalent queries share it.
+    """
+    params = sorted(
+        (name, str(value))
+        for name, value in filterset.form.cleaned_data.items()
+        if value is not None and value != ''
+    )
+    return 'product_facets:' + hashlib.sha1(urlencode(params).encode('utf-8')).hexdigest()
+
+
+def get_product_facets(filterset):
+    key = get_facets_cache_key(filterset)
+    facets = cache.get(key)
+    if facets is None:
+        facets = ProductFacets(filterset.qs).compute()
+        cache.set(key, facets, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return facets
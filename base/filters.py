@@ -4,6 +4,7 @@ import django_filters as filters
 from django.db.models import Q
 
 from base.models import Product
+from base.search import get_search_backend
 
 
 class ProductsFilter(filters.FilterSet):
@@ -15,9 +16,9 @@ class ProductsFilter(filters.FilterSet):
     year_to = filters.NumberFilter(field_name='year', lookup_expr='lte')
     price_from = filters.NumberFilter(field_name='price', lookup_expr='gte')
     price_to = filters.NumberFilter(field_name='price', lookup_expr='lte')
-    announcement_code = filters.CharFilter(field_name='announcement_code', lookup_expr='icontains')
-    search = filters.CharFilter(field_name='name', lookup_expr='icontains')
-    category = filters.CharFilter(field_name='category', lookup_expr='icontains')
+    announcement_code = filters.CharFilter(field_name='announcement_code', method='filter_contains')
+    search = filters.CharFilter(field_name='name', method='filter_search')
+    category = filters.CharFilter(field_name='category', method='filter_contains')
     buyer = filters.NumberFilter(field_name='buyer_id')
     provider = filters.NumberFilter(field_name='provider_id')
     transiter = filters.NumberFilter(field_name='transiter_id')
@@ -29,6 +30,12 @@ class ProductsFilter(filters.FilterSet):
         min_datetime = datetime.datetime.now() - datetime.timedelta(minutes=minutes_before)
         return queryset.filter(created_at__gte=min_datetime)
 
+    def filter_search(self, queryset, name, value):
+        return get_search_backend(queryset).search(queryset, value)
+
+    def filter_contains(self, queryset, name, value):
+        return get_search_backend(queryset).contains(queryset, name, value)
+
 
 class UsersFilter(filters.FilterSet):
     query = filters.CharFilter(method='filter_query')
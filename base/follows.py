@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+
+from base.models import User, UserFollowers, FollowEvent
+from base.social_graph import social_graph
+
+# sent inside the transaction of the change with `follower_id`, `user_id` and,
+# on unfollow, the `count` of follows removed. The home feeds of `posts` keep
+# their timelines in sync with them, `base.signals` the recommendations.
+user_followed = Signal()
+user_unfollowed = Signal()
+
+
+def follow_user(follower, user_id):
+    with transaction.atomic():
+        UserFollowers.objects.create(user_id=user_id, follower=follower)
+        FollowEvent.objects.create(follower_id=follower.id, user_id=user_id, followed=True)
+        social_graph.mark_own_writes(follower.id)
+        User.objects.filter(id=user_id).update(followers_count=F('followers_count') + 1)
+        User.objects.filter(id=follower.id).update(following_count=F('following_count') + 1)
+        user_followed.send(sender=UserFollowers, follower_id=follower.id, user_id=user_id)
+
+
+def unfollow_user(follower, user_id):
+    """
+    Returns whether a follow was removed, the counters are only touched then,
+    so a repeated unfollow can't drive them below the real numbers.
+    """
+    with transaction.atomic():
+        deleted, _ = UserFollowers.objects.filter(user_id=user_id, follower=follower).delete()
+        if deleted:
+            FollowEvent.objects.create(follower_id=follower.id, user_id=user_id, followed=False)
+            social_graph.mark_own_writes(follower.id)
+            User.objects.filter(id=user_id).update(followers_count=F('followers_count') - deleted)
+            User.objects.filter(id=follower.id).update(following_count=F('following_count') - deleted)
+            user_unfollowed.send(sender=UserFollowers, follower_id=follower.id, user_id=user_id, count=deleted)
+    return bool(deleted)
+
+
+def _count_subquery(field):
+    counts = UserFollowers.objects.filter(**{field: OuterRef('id')}) \
+        .order_by() \
+        .values(field) \
+        .annotate(count=Count('id')) \
+        .values('count')
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def get_follow_counts(user_ids):
+    """
+    Returns `{user_id: (followers_count, following_count)}` counted from
+    `UserFollowers`, for the reconcile command.
+    """
+    rows = User.objects.filter(id__in=user_ids).annotate(
+        actual_followers_count=_count_subquery('user'),
+        actual_following_count=_count_subquery('follower'),
+    ).values_list('id', 'actual_followers_count', 'actual_following_count')
+    return {user_id: (followers, following) for user_id, followers, following in rows}
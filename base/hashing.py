@@ -0,0 +1,133 @@
+import fcntl
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import Throttled
+
+from base import metrics
+
+
+def verify_password_hash(password, encoded):
+    """
+    Returns `(valid, must_update)`.
+    """
+    if not check_password(password, encoded):
+        return False, False
+    preferred = get_hasher()
+    hasher = identify_hasher(encoded)
+    return True, hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+class PasswordHashingSlots:
+    """
+    Bounds password hashing on this host, across every worker process: at
+    most `size` hashes run at once, and at most `queue_size` more requests
+    wait up to `timeout` seconds for one of them to finish. Requests past
+    that get a 429 (`Throttled`). Running slots and places in the queue are
+    exclusive `flock`s on files in `directory`, the kernel releases them when
+    a process dies.
+
+    This stands in for a separate pool of hashing processes. The app runs on
+    sync gunicorn workers, which serve one request at a time, so a worker
+    handing a hash to a pool would wait for it all the same. The hash runs in
+    the request worker, and the limits bound the cores and the workers a
+    burst of logins can take from the other requests.
+    """
+    poll_interval = 0.005
+
+    def __init__(self, directory, size, queue_size=0, timeout=0):
+        self.directory = directory
+        self.size = size
+        self.queue_size = queue_size
+        self.timeout = timeout
+        # requests of this process holding a slot, and waiting for one
+        self.in_flight = 0
+        self.waiting = 0
+
+    def get_path(self, kind, index):
+        return os.path.join(self.directory, f'{kind}-{index}.lock')
+
+    def try_lock(self, kind, count):
+        """
+        An open file of one of the `count` lock files of `kind`, locked, or
+        `None` when every one is taken.
+        """
+        first = random.randrange(count)
+        for offset in range(count):
+            # a new open file per attempt, locks of the same one are shared by threads
+            fd = os.open(self.get_path(kind, (first + offset) % count), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def reject(self):
+        metrics.increment('password_hashing.rejected')
+        raise Throttled(detail=_('Too many requests, try again in a moment'))
+
+    @contextmanager
+    def acquire(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # a ticket for every running and waiting request
+        ticket = self.try_lock('ticket', self.size + self.queue_size)
+        if ticket is None:
+            self.reject()
+        try:
+            slot = self.try_lock('slot', self.size)
+            if slot is None:
+                slot = self.wait()
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                os.close(slot)
+        finally:
+            os.close(ticket)
+
+    def wait(self):
+        self.waiting += 1
+        try:
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                slot = self.try_lock('slot', self.size)
+                if slot is not None:
+                    return slot
+        finally:
+            self.waiting -= 1
+        self.reject()
+
+
+password_hashing_slots = PasswordHashingSlots(settings.PASSWORD_HASHING_LOCK_DIR, settings.PASSWORD_HASHING_SLOTS,
+                                              settings.PASSWORD_HASHING_QUEUE, settings.PASSWORD_HASHING_QUEUE_TIMEOUT)
+
+# like every metric, of this process only
+metrics.register_gauge('password_hashing.in_flight', lambda: password_hashing_slots.in_flight)
+metrics.register_gauge('password_hashing.waiting', lambda: password_hashing_slots.waiting)
+
+
+def hash_password(password):
+    with password_hashing_slots.acquire():
+        return make_password(password)
+
+
+def verify_password(user, password):
+    """
+    Checks the password of `user`, and rehashes it with the preferred hasher
+    when it was hashed with another one or with fewer iterations.
+    """
+    with password_hashing_slots.acquire():
+        valid, must_update = verify_password_hash(password, user.password)
+    if valid and must_update:
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return valid
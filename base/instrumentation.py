@@ -0,0 +1,54 @@
+import re
+import time
+from collections import Counter
+
+_whitespace = re.compile(r'\s+')
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r'\b\d+(?:\.\d+)?\b')
+_placeholder = re.compile(r'%s')
+_placeholder_list = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def fingerprint(sql):
+    """
+    Normalizes a statement so queries that differ only by their parameters
+    share a fingerprint, `IN (%s, %s, ...)` lists collapse to `IN (...)`.
+    """
+    sql = _string_literal.sub('?', sql)
+    sql = _number_literal.sub('?', sql)
+    sql = _placeholder.sub('?', sql)
+    sql = _placeholder_list.sub('(...)', sql)
+    return _whitespace.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    `connection.execute_wrapper` callable that records query count, time and
+    fingerprints, it works regardless of `DEBUG`.
+    """
+
+    def __init__(self, repeat_threshold):
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+    def repeated(self):
+        """Fingerprints executed at least `repeat_threshold` times, probable N+1 patterns"""
+        return [
+            (sql, count) for sql, count in self.fingerprints.most_common()
+            if count >= self.repeat_threshold
+        ]
@@ -0,0 +1,51 @@
+from django.db import transaction
+
+from base.models import Product, ProductListing
+
+USER_RELATIONS = ('user', 'buyer', 'provider', 'transiter')
+USER_FIELDS = ('id_number', 'name', 'email', 'is_provider', 'is_buyer', 'is_transiter', 'about', 'location')
+NAMED_RELATIONS = ('product_list', 'location', 'live_location')
+PRODUCT_FIELDS = ('_id', 'created_at', 'name', 'image', 'image_thumbnails', 'description', 'rating', 'category',
+                  'year', 'price', 'announcement_code', 'customs_clearance', 'seen_count')
+
+# listing column -> `Product` lookup it's copied from
+SOURCE_COLUMNS = dict(
+    [(field, field) for field in PRODUCT_FIELDS]
+    + [(f'{relation}_id', f'{relation}_id') for relation in USER_RELATIONS + NAMED_RELATIONS]
+    + [(f'{relation}_{field}', f'{relation}__{field}') for relation in USER_RELATIONS for field in USER_FIELDS]
+    + [(f'{relation}_name', f'{relation}__name') for relation in NAMED_RELATIONS]
+)
+
+
+def get_listing_values(products):
+    """Listing rows of the given product queryset, read with one joined query"""
+    columns = list(SOURCE_COLUMNS.items())
+    for row in products.values(*SOURCE_COLUMNS.values()):
+        yield {column: row[lookup] for column, lookup in columns}
+
+
+def sync_product_listings(product_ids):
+    """Rewrites the listing rows of the given products, rows of deleted products are dropped"""
+    product_ids = list(product_ids)
+    rows = [ProductListing(**values) for values in get_listing_values(Product.objects.filter(_id__in=product_ids))]
+    with transaction.atomic():
+        ProductListing.objects.filter(_id__in=product_ids).delete()
+        ProductListing.objects.bulk_create(rows)
+
+
+def delete_product_listings(product_ids):
+    ProductListing.objects.filter(_id__in=list(product_ids)).delete()
+
+
+def update_user_columns(user):
+    with transaction.atomic():
+        for relation in USER_RELATIONS:
+            ProductListing.objects.filter(**{f'{relation}_id': user.pk}).update(**{
+                f'{relation}_{field}': getattr(user, field) for field in USER_FIELDS
+            })
+
+
+def update_named_columns(relation, instance):
+    ProductListing.objects.filter(**{f'{relation}_id': instance.pk}).update(**{
+        f'{relation}_name': instance.name
+    })
@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from rest_framework.exceptions import Throttled
+
+from base.hashing import PasswordHashingSlots, verify_password_hash
+
+
+def run_logins(directory, slots, queue_size, timeout, encoded, seconds, retry_delay):
+    """
+    Verifies `encoded` through the slots for `seconds`, like the logins of a
+    worker process, retrying `retry_delay` seconds after a 429. Returns
+    `(logins, rejected)`.
+    """
+    hashing_slots = PasswordHashingSlots(directory, slots, queue_size, timeout)
+    logins = rejected = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            with hashing_slots.acquire():
+                verify_password_hash('benchmark password', encoded)
+            logins += 1
+        except Throttled:
+            rejected += 1
+            time.sleep(retry_delay)
+    return logins, rejected
+
+
+class Command(BaseCommand):
+    help = 'Measures the login throughput of this host with a number of worker processes verifying ' \
+           'passwords through the hashing slots, without touching the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes logging in at once')
+        parser.add_argument('--slots', type=int, default=settings.PASSWORD_HASHING_SLOTS)
+        parser.add_argument('--queue', type=int, default=settings.PASSWORD_HASHING_QUEUE)
+        parser.add_argument('--timeout', type=float, default=settings.PASSWORD_HASHING_QUEUE_TIMEOUT)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--retry-delay', type=float, default=0.1,
+                            help='Seconds a rejected login waits before the next one')
+
+    def handle(self, *args, workers=1, slots=1, queue=0, timeout=0, seconds=10, retry_delay=0.1, **options):
+        encoded = make_password('benchmark password')
+        with tempfile.TemporaryDirectory() as directory, multiprocessing.Pool(workers) as pool:
+            arguments = (directory, slots, queue, timeout, encoded, seconds, retry_delay)
+            results = pool.starmap(run_logins, [arguments] * workers)
+        logins = sum(result[0] for result in results)
+        rejected = sum(result[1] for result in results)
+        cores = min(slots, os.cpu_count() or 1)
+        self.stdout.write(f'{workers} workers, {slots} slots, queue of {queue}: '
+                          f'{logins / seconds:.1f} logins/s, {logins / seconds / cores:.1f} per core, '
+                          f'{rejected / seconds:.1f} rejected/s')
@@ -0,0 +1,60 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from base.listing import sync_product_listings
+from base.models import User, Product, Location, LiveLocation, ProductList, ProductListing
+from base.serializers import ProductSerializer, FlatProductSerializer, FlatProductListingSerializer
+
+
+class Command(BaseCommand):
+    help = ('Times product list serialization with ProductSerializer, FlatProductSerializer and '
+            'FlatProductListingSerializer, queries included, for each given number of products. '
+            'The rows are created in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('products', nargs='*', type=int, default=[100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per serializer, the best one is shown')
+
+    def handle(self, *args, products=(), repeat=1, **options):
+        flat_serializer, flat_listing_serializer = FlatProductSerializer(), FlatProductListingSerializer()
+        for count in products:
+            with transaction.atomic():
+                product_ids = self.create_products(count)
+                serializers = (
+                    ('ProductSerializer',
+                     lambda: ProductSerializer(Product.objects.filter(_id__in=product_ids), many=True).data),
+                    ('FlatProductSerializer',
+                     lambda: flat_serializer.serialize(
+                         flat_serializer.values(Product.objects.filter(_id__in=product_ids)))),
+                    ('FlatProductListingSerializer',
+                     lambda: flat_listing_serializer.serialize(
+                         flat_listing_serializer.values(ProductListing.objects.filter(_id__in=product_ids)))),
+                )
+                timings = [(name, min(self.time(serialize) for _ in range(repeat))) for name, serialize in serializers]
+                transaction.set_rollback(True)
+            self.stdout.write(f'{count} products: ' + ', '.join(f'{name} {seconds:.3f}s' for name, seconds in timings))
+
+    @staticmethod
+    def create_products(count):
+        user = User.objects.create(email='seller@benchmark.invalid', name='seller')
+        location = Location.objects.create(name='benchmark location')
+        live_location = LiveLocation.objects.create(name='benchmark live location')
+        product_list = ProductList.objects.create(name='benchmark list')
+        Product.objects.bulk_create([
+            Product(user=user, buyer=user, provider=user, name=f'product {index}', price=Decimal('10.50'),
+                    announcement_code=f'BM{index:012d}', year=2000 + index % 20, location=location,
+                    live_location=live_location, product_list=product_list)
+            for index in range(count)
+        ], batch_size=1000)
+        product_ids = list(Product.objects.filter(user=user).values_list('_id', flat=True))
+        sync_product_listings(product_ids)
+        return product_ids
+
+    @staticmethod
+    def time(function):
+        started = time.perf_counter()
+        function()
+        return time.perf_counter() - started
@@ -0,0 +1,41 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base.recommendations import FollowGraph
+
+
+class Command(BaseCommand):
+    help = 'Times the two-hop expansion of rebuild_recommendations on a random follow graph, ' \
+           'without touching the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--edges', type=int, default=5000000)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Maximum number of users per block, like rebuild_recommendations')
+        parser.add_argument('--max-paths', type=int, default=2000000,
+                            help='Maximum number of two-hop paths per block, like rebuild_recommendations')
+        parser.add_argument('--blocks', type=int, default=5, help='Number of blocks timed')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, users=0, edges=0, batch_size=0, max_paths=0, blocks=0, seed=0, **options):
+        random = np.random.default_rng(seed)
+        now = time.time()
+        started = time.perf_counter()
+        graph = FollowGraph(random.integers(1, users + 1, edges, dtype=np.int64),
+                            random.integers(1, users + 1, edges, dtype=np.int64),
+                            now - random.uniform(0, 365 * 24 * 60 * 60, edges))
+        self.stdout.write(f'{len(graph)} users, {edges} edges: graph built in {time.perf_counter() - started:.2f}s')
+
+        sizes = graph.two_hop_sizes()
+        for index, rows in enumerate(graph.iter_blocks(batch_size, max_paths)):
+            if index == blocks:
+                break
+            paths = int(sizes[rows].sum())
+            started = time.perf_counter()
+            user_ids, _, _, _ = graph.recommend(rows, now, settings.USER_RECOMMENDATIONS_LIMIT)
+            self.stdout.write(f'block of {len(rows)} users, {paths} paths: {len(user_ids)} candidates '
+                              f'in {time.perf_counter() - started:.2f}s')
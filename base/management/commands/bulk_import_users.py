@@ -0,0 +1,108 @@
+import csv
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+
+from base.models import User
+
+ROLE_COLUMNS = ('is_buyer', 'is_provider', 'is_transiter')
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+
+class Command(BaseCommand):
+    help = 'Creates users and their tokens from a CSV file with email, name, id_number, password ' \
+           '(already hashed in the Django format, empty for no usable password) and role columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, path, batch_size=1000, **options):
+        created = 0
+        skipped = 0
+        seen = set()
+        with open(path, newline='', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            missing = {'email', 'password'} - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f'Missing columns: {", ".join(sorted(missing))}')
+
+            batch = []
+            for line, row in enumerate(reader, start=2):
+                user = self.build_user(line, row)
+                keys = {('email', user.email.lower())}
+                if user.id_number is not None:
+                    keys.add(('id_number', user.id_number))
+                if keys & seen:
+                    self.stderr.write(f'Line {line}: duplicate of an earlier line, skipped')
+                    skipped += 1
+                    continue
+                seen |= keys
+                batch.append(user)
+                if len(batch) >= batch_size:
+                    created, skipped = self.add_counts((created, skipped), self.import_batch(batch))
+                    batch = []
+            if batch:
+                created, skipped = self.add_counts((created, skipped), self.import_batch(batch))
+
+        self.stdout.write(self.style.SUCCESS(f'{created} users created, {skipped} skipped'))
+
+    @staticmethod
+    def add_counts(totals, counts):
+        return totals[0] + counts[0], totals[1] + counts[1]
+
+    @staticmethod
+    def build_user(line, row):
+        email = (row.get('email') or '').strip()
+        if not email:
+            raise CommandError(f'Line {line}: email is required')
+        password = (row.get('password') or '').strip()
+        if password:
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise CommandError(f'Line {line}: password is not a hash of a configured hasher')
+        else:
+            password = make_password(None)
+
+        return User(
+            email=email,
+            name=(row.get('name') or '').strip() or 'name',
+            id_number=(row.get('id_number') or '').strip() or None,
+            password=password,
+            **{role: (row.get(role) or '').strip().lower() in TRUE_VALUES for role in ROLE_COLUMNS}
+        )
+
+    def import_batch(self, users):
+        """
+        Skips the users that already exist, with one lookup per unique column,
+        and inserts the rest with their tokens. Returns `(created, skipped)`.
+        """
+        # duplicates are told apart ignoring case, the lowercased emails catch
+        # the ones stored lowercase without giving up the index
+        emails = {user.email for user in users} | {user.email.lower() for user in users}
+        existing_emails = {email.lower() for email in User.objects.filter(
+            email__in=emails).values_list('email', flat=True)}
+        existing_id_numbers = set(User.objects.filter(
+            id_number__in=[user.id_number for user in users if user.id_number is not None]
+        ).values_list('id_number', flat=True))
+
+        new_users = []
+        for user in users:
+            if user.email.lower() in existing_emails or user.id_number in existing_id_numbers:
+                self.stderr.write(f'User {user.email}: already exists, skipped')
+            else:
+                new_users.append(user)
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(new_users)
+                # not every backend returns the primary keys of bulk inserts
+                user_ids = User.objects.filter(email__in=[user.email for user in new_users]) \
+                    .values_list('id', flat=True)
+                Token.objects.bulk_create([Token(user_id=user_id, key=Token.generate_key()) for user_id in user_ids])
+        except IntegrityError as e:
+            raise CommandError(f'Batch of {len(new_users)} users conflicts with rows written meanwhile: {e}')
+        return len(new_users), len(users) - len(new_users)
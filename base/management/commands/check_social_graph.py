@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from base.models import User, UserFollowers
+from base.social_graph import GraphView
+
+
+class Command(BaseCommand):
+    help = 'Compares the social graph file, with the pending follow events applied, against the follow table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.SOCIAL_GRAPH_PATH)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, path=None, batch_size=1000, **options):
+        try:
+            view = GraphView.load(path)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read the social graph: {e}')
+
+        checked = 0
+        mismatched = 0
+        for user_ids in self.iter_user_ids(batch_size):
+            for label, field, other_field, lookup in (('following', 'follower_id', 'user_id', view.following),
+                                                      ('followers', 'user_id', 'follower_id', view.followers)):
+                expected = defaultdict(set)
+                rows = UserFollowers.objects.filter(**{f'{field}__in': user_ids}).values_list(field, other_field)
+                for user_id, other_id in rows:
+                    expected[user_id].add(other_id)
+                for user_id in user_ids:
+                    if set(lookup(user_id)) != expected[user_id]:
+                        self.stderr.write(f'User {user_id}: {label} differ from the table')
+                        mismatched += 1
+            checked += len(user_ids)
+
+        if mismatched:
+            raise CommandError(f'{checked} users checked, {mismatched} adjacency lists differ')
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} users checked, the social graph matches the table '
+            f'({len(view.delta.pairs)} pending follow changes)'
+        ))
+
+    @staticmethod
+    def iter_user_ids(batch_size):
+        last_id = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                return
+            yield user_ids
+            last_id = user_ids[-1]
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from base.social_graph import compact_social_graph
+
+
+class Command(BaseCommand):
+    help = 'Writes a new social graph file from the follow table and drops the follow events it covers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.SOCIAL_GRAPH_PATH)
+
+    def handle(self, *args, path=None, **options):
+        try:
+            edges, last_event_id = compact_social_graph(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{edges} follows written to {path} (up to event {last_event_id})'))
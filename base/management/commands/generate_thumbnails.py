@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from base.models import Product
+from base.thumbnails import THUMBNAIL_DIR, generate_thumbnails, needs_thumbnails, save_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generates the missing thumbnails of product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--force', action='store_true', help='Regenerate thumbnails that already exist')
+
+    def handle(self, *args, workers=2, force=False, **options):
+        output_dir = default_storage.path(THUMBNAIL_DIR)
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            for product_id, image_name, thumbnails in self.iter_products():
+                if not needs_thumbnails(image_name, None if force else thumbnails):
+                    continue
+                # keep a bounded number of images in flight
+                if len(pending) >= workers * 2:
+                    done_count, failed_count = self.collect(pending, return_when=FIRST_COMPLETED)
+                    done, failed = done + done_count, failed + failed_count
+                future = executor.submit(generate_thumbnails, default_storage.path(image_name), output_dir)
+                pending[future] = (product_id, image_name)
+            done_count, failed_count = self.collect(pending)
+            done, failed = done + done_count, failed + failed_count
+
+        self.stdout.write(self.style.SUCCESS(f'{done} products processed, {failed} failed'))
+
+    @staticmethod
+    def iter_products(batch_size=500):
+        last_id = 0
+        while True:
+            rows = list(
+                Product.objects.filter(_id__gt=last_id).order_by('_id')
+                .values_list('_id', 'image', 'image_thumbnails')[:batch_size]
+            )
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+
+    def collect(self, pending, return_when=ALL_COMPLETED):
+        finished, _ = wait(pending, return_when=return_when)
+        done = failed = 0
+        for future in finished:
+            product_id, image_name = pending.pop(future)
+            try:
+                save_thumbnails(product_id, image_name, future.result())
+                done += 1
+            except Exception as e:
+                self.stderr.write(f'Product {product_id} ({image_name}): {e}')
+                failed += 1
+        return done, failed
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.listing import SOURCE_COLUMNS, get_listing_values, sync_product_listings
+from base.models import Product, ProductListing
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized product listing table from the source rows, or verifies it with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Compare the listing with the source rows without writing anything')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, verify=False, batch_size=1000, **options):
+        mismatched = 0
+        processed = 0
+        for product_ids in self.iter_product_ids(batch_size):
+            if verify:
+                mismatched += self.verify_batch(product_ids)
+            else:
+                sync_product_listings(product_ids)
+            processed += len(product_ids)
+
+        orphans = ProductListing.objects.exclude(_id__in=Product.objects.values('_id'))
+        if verify:
+            orphan_count = orphans.count()
+            if mismatched or orphan_count:
+                raise CommandError(f'{processed} products checked, {mismatched} listing rows missing or stale, '
+                                   f'{orphan_count} rows without a product')
+            self.stdout.write(self.style.SUCCESS(f'{processed} products checked, listing is up to date'))
+        else:
+            orphan_count, _ = orphans.delete()
+            self.stdout.write(self.style.SUCCESS(f'{processed} listing rows rebuilt, {orphan_count} removed'))
+
+    @staticmethod
+    def iter_product_ids(batch_size):
+        last_id = 0
+        while True:
+            product_ids = list(
+                Product.objects.filter(_id__gt=last_id).order_by('_id').values_list('_id', flat=True)[:batch_size]
+            )
+            if not product_ids:
+                return
+            yield product_ids
+            last_id = product_ids[-1]
+
+    def verify_batch(self, product_ids):
+        expected = {
+            row['_id']: row for row in get_listing_values(Product.objects.filter(_id__in=product_ids))
+        }
+        actual = {
+            row['_id']: row for row in ProductListing.objects.filter(_id__in=product_ids).values(*SOURCE_COLUMNS)
+        }
+        mismatched = [product_id for product_id, row in expected.items() if actual.get(product_id) != row]
+        for product_id in mismatched:
+            self.stderr.write(f'Product {product_id}: listing row is missing or stale')
+        return len(mismatched)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from base.recommendations import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored follow recommendations of every user from the whole follow graph, ' \
+           'meant to run on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Maximum number of users written per transaction')
+        parser.add_argument('--max-paths', type=int, default=2000000,
+                            help='Maximum number of two-hop paths expanded in memory at once')
+
+    def handle(self, *args, batch_size=1000, max_paths=2000000, **options):
+        users = rebuild_recommendations(batch_size=batch_size, max_paths=max_paths)
+        self.stdout.write(self.style.SUCCESS(f'Recommendations rebuilt for {users} users'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from base.follows import get_follow_counts
+from base.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized followers_count/following_count columns from the follow rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the drifted users without writing anything')
+
+    def handle(self, *args, batch_size=1000, dry_run=False, **options):
+        processed = 0
+        fixed = 0
+        for users in self.iter_users(batch_size):
+            counts = get_follow_counts([user.id for user in users])
+            stale = []
+            for user in users:
+                followers_count, following_count = counts[user.id]
+                if (user.followers_count, user.following_count) != (followers_count, following_count):
+                    self.stderr.write(f'User {user.id}: {user.followers_count}/{user.following_count} stored, '
+                                      f'{followers_count}/{following_count} counted')
+                    user.followers_count = followers_count
+                    user.following_count = following_count
+                    stale.append(user)
+            if stale and not dry_run:
+                User.objects.bulk_update(stale, ['followers_count', 'following_count'])
+            processed += len(users)
+            fixed += len(stale)
+
+        action = 'drifted' if dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{processed} users checked, {fixed} {action}'))
+
+    @staticmethod
+    def iter_users(batch_size):
+        last_id = 0
+        while True:
+            users = list(
+                User.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'followers_count', 'following_count')[:batch_size]
+            )
+            if not users:
+                return
+            yield users
+            last_id = users[-1].id
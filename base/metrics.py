@@ -0,0 +1,30 @@
+import threading
+
+# Process local metrics, exposed through `MetricsAPIView`.
+# Counters are plain numbers, gauges are callables evaluated on read.
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def value(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def register_gauge(name, func):
+    _gauges[name] = func
+
+
+def snapshot():
+    with _lock:
+        data = dict(_counters)
+    for name, func in _gauges.items():
+        data[name] = func()
+    return data
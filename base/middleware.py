@@ -1,12 +1,18 @@
+import logging
 from urllib.parse import parse_qs
 
 from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.db import close_old_connections
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import close_old_connections, connection
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from base.instrumentation import QueryRecorder
 from base.models import User
 
+sql_logger = logging.getLogger('base.sql')
+
 
 class JwtTokenAuthMiddleware:
     """
@@ -49,3 +55,32 @@ class AuthTokenAuthMiddleware:
             print(e)
             scope['user'] = AnonymousUser()
         return await self.inner(dict(scope), receive, send)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the SQL executed by every request and reports it through
+    `X-DB-*` response headers and a `base.sql` log line.
+    Enabled with the `SQL_INSTRUMENTATION` setting.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(settings.SQL_REPEATED_QUERY_THRESHOLD)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        repeated = recorder.repeated()
+        response['X-DB-Query-Count'] = str(recorder.count)
+        response['X-DB-Time-Ms'] = str(recorder.duration_ms)
+        response['X-DB-Repeated-Queries'] = str(len(repeated))
+
+        log = sql_logger.warning if repeated else sql_logger.info
+        log('%s %s queries=%d db_time_ms=%s repeated=%s',
+            request.method, request.path, recorder.count, recorder.duration_ms,
+            '; '.join(f'{count}x {sql}' for sql, count in repeated) or '-')
+        return response
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# the DDL `base.search` installed when this migration was written, kept here
+# so later changes to the search backends don't change what it runs
+SEARCH_CONFIG = 'simple'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+CONTAINS_COLUMNS = ('category', 'announcement_code')
+FULLTEXT_COLUMNS = ('name',)
+
+
+def install_search_indexes_sql(vendor, table):
+    if vendor == 'postgresql':
+        return [
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            f'ALTER TABLE "{table}" ADD COLUMN "{SEARCH_VECTOR_COLUMN}" tsvector '
+            f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', coalesce(\"name\", ''))) STORED",
+            f'CREATE INDEX "{table}_search_vector_idx" ON "{table}" USING GIN ("{SEARCH_VECTOR_COLUMN}")',
+            f'CREATE INDEX "{table}_name_trgm_idx" ON "{table}" USING GIN ("name" gin_trgm_ops)',
+        ] + [
+            f'CREATE INDEX "{table}_{column}_trgm_idx" ON "{table}" USING GIN (UPPER("{column}"::text) gin_trgm_ops)'
+            for column in CONTAINS_COLUMNS
+        ]
+    if vendor == 'mysql':
+        return [
+            f'CREATE FULLTEXT INDEX `{table}_{column}_fulltext_idx` ON `{table}` (`{column}`)'
+            for column in FULLTEXT_COLUMNS
+        ]
+    return []
+
+
+def uninstall_search_indexes_sql(vendor, table):
+    if vendor == 'postgresql':
+        return [f'DROP INDEX IF EXISTS "{table}_{column}_trgm_idx"' for column in CONTAINS_COLUMNS] + [
+            f'DROP INDEX IF EXISTS "{table}_name_trgm_idx"',
+            f'DROP INDEX IF EXISTS "{table}_search_vector_idx"',
+            f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "{SEARCH_VECTOR_COLUMN}"',
+        ]
+    if vendor == 'mysql':
+        return [f'DROP INDEX `{table}_{column}_fulltext_idx` ON `{table}`' for column in FULLTEXT_COLUMNS]
+    return []
+
+
+def install_search_indexes(apps, schema_editor):
+    table = apps.get_model('base', 'Product')._meta.db_table
+    for sql in install_search_indexes_sql(schema_editor.connection.vendor, table):
+        schema_editor.execute(sql)
+
+
+def uninstall_search_indexes(apps, schema_editor):
+    table = apps.get_model('base', 'Product')._meta.db_table
+    for sql in uninstall_search_indexes_sql(schema_editor.connection.vendor, table):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0025_product_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_indexes, uninstall_search_indexes),
+    ]
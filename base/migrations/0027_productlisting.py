@@ -0,0 +1,169 @@
+# Generated by Django 4.0 on 2026-10-18 05:11
+
+from django.db import migrations, models
+
+# the DDL `base.search` installed when this migration was written, kept here
+# so later changes to the search backends don't change what it runs
+SEARCH_CONFIG = 'simple'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+CONTAINS_COLUMNS = ('category', 'announcement_code')
+FULLTEXT_COLUMNS = ('name',)
+
+
+def install_search_indexes_sql(vendor, table):
+    if vendor == 'postgresql':
+        return [
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            f'ALTER TABLE "{table}" ADD COLUMN "{SEARCH_VECTOR_COLUMN}" tsvector '
+            f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', coalesce(\"name\", ''))) STORED",
+            f'CREATE INDEX "{table}_search_vector_idx" ON "{table}" USING GIN ("{SEARCH_VECTOR_COLUMN}")',
+            f'CREATE INDEX "{table}_name_trgm_idx" ON "{table}" USING GIN ("name" gin_trgm_ops)',
+        ] + [
+            f'CREATE INDEX "{table}_{column}_trgm_idx" ON "{table}" USING GIN (UPPER("{column}"::text) gin_trgm_ops)'
+            for column in CONTAINS_COLUMNS
+        ]
+    if vendor == 'mysql':
+        return [
+            f'CREATE FULLTEXT INDEX `{table}_{column}_fulltext_idx` ON `{table}` (`{column}`)'
+            for column in FULLTEXT_COLUMNS
+        ]
+    return []
+
+
+def uninstall_search_indexes_sql(vendor, table):
+    if vendor == 'postgresql':
+        return [f'DROP INDEX IF EXISTS "{table}_{column}_trgm_idx"' for column in CONTAINS_COLUMNS] + [
+            f'DROP INDEX IF EXISTS "{table}_name_trgm_idx"',
+            f'DROP INDEX IF EXISTS "{table}_search_vector_idx"',
+            f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "{SEARCH_VECTOR_COLUMN}"',
+        ]
+    if vendor == 'mysql':
+        return [f'DROP INDEX `{table}_{column}_fulltext_idx` ON `{table}`' for column in FULLTEXT_COLUMNS]
+    return []
+
+
+def install_search_indexes(apps, schema_editor):
+    table = apps.get_model('base', 'ProductListing')._meta.db_table
+    for sql in install_search_indexes_sql(schema_editor.connection.vendor, table):
+        schema_editor.execute(sql)
+
+
+def uninstall_search_indexes(apps, schema_editor):
+    table = apps.get_model('base', 'ProductListing')._meta.db_table
+    for sql in uninstall_search_indexes_sql(schema_editor.connection.vendor, table):
+        schema_editor.execute(sql)
+
+
+# the listing columns `base.listing` copied when this migration was written,
+# listing column -> `Product` lookup
+USER_RELATIONS = ('user', 'buyer', 'provider', 'transiter')
+USER_FIELDS = ('id_number', 'name', 'email', 'is_provider', 'is_buyer', 'is_transiter', 'about', 'location')
+NAMED_RELATIONS = ('product_list', 'location', 'live_location')
+PRODUCT_FIELDS = ('_id', 'created_at', 'name', 'image', 'description', 'rating', 'category', 'year', 'price',
+                  'announcement_code', 'customs_clearance', 'seen_count')
+SOURCE_COLUMNS = dict(
+    [(field, field) for field in PRODUCT_FIELDS]
+    + [(f'{relation}_id', f'{relation}_id') for relation in USER_RELATIONS + NAMED_RELATIONS]
+    + [(f'{relation}_{field}', f'{relation}__{field}') for relation in USER_RELATIONS for field in USER_FIELDS]
+    + [(f'{relation}_name', f'{relation}__name') for relation in NAMED_RELATIONS]
+)
+
+
+def fill_product_listing(apps, schema_editor):
+    Product = apps.get_model('base', 'Product')
+    ProductListing = apps.get_model('base', 'ProductListing')
+    # only the columns the listing had at this point of the migration history
+    fields = {field.attname for field in ProductListing._meta.concrete_fields}
+    columns = [(column, lookup) for column, lookup in SOURCE_COLUMNS.items() if column in fields]
+    rows = (
+        ProductListing(**{column: row[lookup] for column, lookup in columns})
+        for row in Product.objects.values(*(lookup for _, lookup in columns)).iterator()
+    )
+    ProductListing.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0026_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('name', models.CharField(max_length=200)),
+                ('image', models.CharField(blank=True, max_length=100, null=True)),
+                ('description', models.TextField()),
+                ('rating', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('category', models.CharField(max_length=512)),
+                ('year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('announcement_code', models.CharField(max_length=64)),
+                ('customs_clearance', models.BooleanField()),
+                ('seen_count', models.IntegerField(default=0)),
+                ('user_id', models.BigIntegerField(db_index=True)),
+                ('user_id_number', models.CharField(blank=True, max_length=52, null=True)),
+                ('user_name', models.CharField(max_length=512)),
+                ('user_email', models.EmailField(max_length=254)),
+                ('user_is_provider', models.BooleanField()),
+                ('user_is_buyer', models.BooleanField()),
+                ('user_is_transiter', models.BooleanField()),
+                ('user_about', models.TextField(blank=True, null=True)),
+                ('user_location', models.CharField(blank=True, max_length=256, null=True)),
+                ('buyer_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('buyer_id_number', models.CharField(blank=True, max_length=52, null=True)),
+                ('buyer_name', models.CharField(blank=True, max_length=512, null=True)),
+                ('buyer_email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('buyer_is_provider', models.BooleanField(blank=True, null=True)),
+                ('buyer_is_buyer', models.BooleanField(blank=True, null=True)),
+                ('buyer_is_transiter', models.BooleanField(blank=True, null=True)),
+                ('buyer_about', models.TextField(blank=True, null=True)),
+                ('buyer_location', models.CharField(blank=True, max_length=256, null=True)),
+                ('provider_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('provider_id_number', models.CharField(blank=True, max_length=52, null=True)),
+                ('provider_name', models.CharField(blank=True, max_length=512, null=True)),
+                ('provider_email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('provider_is_provider', models.BooleanField(blank=True, null=True)),
+                ('provider_is_buyer', models.BooleanField(blank=True, null=True)),
+                ('provider_is_transiter', models.BooleanField(blank=True, null=True)),
+                ('provider_about', models.TextField(blank=True, null=True)),
+                ('provider_location', models.CharField(blank=True, max_length=256, null=True)),
+                ('transiter_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('transiter_id_number', models.CharField(blank=True, max_length=52, null=True)),
+                ('transiter_name', models.CharField(blank=True, max_length=512, null=True)),
+                ('transiter_email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('transiter_is_provider', models.BooleanField(blank=True, null=True)),
+                ('transiter_is_buyer', models.BooleanField(blank=True, null=True)),
+                ('transiter_is_transiter', models.BooleanField(blank=True, null=True)),
+                ('transiter_about', models.TextField(blank=True, null=True)),
+                ('transiter_location', models.CharField(blank=True, max_length=256, null=True)),
+                ('product_list_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('product_list_name', models.CharField(blank=True, max_length=512, null=True)),
+                ('location_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('location_name', models.CharField(blank=True, max_length=200, null=True)),
+                ('live_location_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('live_location_name', models.CharField(blank=True, max_length=200, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['created_at', '_id'], name='listing_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['price', '_id'], name='listing_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['year', '_id'], name='listing_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['seen_count', '_id'], name='listing_seen_count_idx'),
+        ),
+        migrations.RunPython(install_search_indexes, uninstall_search_indexes),
+        migrations.RunPython(fill_product_listing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-18 05:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0027_productlisting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='image_thumbnails',
+            field=models.JSONField(default=dict),
+        ),
+    ]
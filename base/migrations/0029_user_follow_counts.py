@@ -0,0 +1,34 @@
+# Generated by Django 4.0 on 2026-10-18 05:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_follow_counts(apps, schema_editor):
+    User = apps.get_model('base', 'User')
+    UserFollowers = apps.get_model('base', 'UserFollowers')
+    for field, column in (('user', 'followers_count'), ('follower', 'following_count')):
+        rows = UserFollowers.objects.order_by().values(field).annotate(count=Count('id'))
+        for row in rows.iterator():
+            User.objects.filter(id=row[field]).update(**{column: row['count']})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0028_product_image_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_follow_counts, migrations.RunPython.noop),
+    ]
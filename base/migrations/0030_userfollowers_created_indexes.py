@@ -0,0 +1,21 @@
+# Generated by Django 4.0 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0029_user_follow_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userfollowers',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='followers_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userfollowers',
+            index=models.Index(fields=['follower', 'created_at', 'id'], name='followers_follower_created_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# the columns and DDL `base.typeahead` had when this migration was written,
+# kept here so later changes to the typeahead backends don't change what it runs
+PREFIX_COLUMNS = (
+    ('User', 'name'),
+    ('User', 'email'),
+    ('ProductListing', 'name'),
+)
+COLLATION = 'C'
+
+
+def get_index_name(model, column):
+    return f'{model._meta.db_table}_{column}_prefix_idx'
+
+
+def install_prefix_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name, column in PREFIX_COLUMNS:
+        model = apps.get_model('base', model_name)
+        table = model._meta.db_table
+        if vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX "{get_index_name(model, column)}" ON "{table}" '
+                f'((UPPER("{column}"::text) COLLATE "{COLLATION}"), "{model._meta.pk.column}")'
+            )
+        elif vendor == 'mysql' and not model._meta.get_field(column).unique:
+            schema_editor.execute(f'CREATE INDEX `{get_index_name(model, column)}` ON `{table}` (`{column}`)')
+
+
+def uninstall_prefix_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name, column in PREFIX_COLUMNS:
+        model = apps.get_model('base', model_name)
+        table = model._meta.db_table
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{get_index_name(model, column)}"')
+        elif vendor == 'mysql' and not model._meta.get_field(column).unique:
+            schema_editor.execute(f'DROP INDEX `{get_index_name(model, column)}` ON `{table}`')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0031_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_prefix_indexes, uninstall_prefix_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-18 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0032_typeahead_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('follower_id', models.BigIntegerField()),
+                ('user_id', models.BigIntegerField()),
+                ('followed', models.BooleanField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,30 +1,97 @@
 import uuid
-from abc import abstractmethod
 
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
+from django.db.models import Prefetch
 from django.contrib.auth.models import AbstractUser
 
 
+class BaseQuerySet(models.QuerySet):
+    def bare(self):
+        """
+        Drops the `select_related`/`prefetch_related` lookups, the model's
+        defaults included.
+        """
+        return self.select_related(None).prefetch_related(None)
+
+
+class BaseManager(models.Manager.from_queryset(BaseQuerySet)):
+    """
+    Applies the default relations declared by the model to every queryset.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # `select_related()` without names would follow every foreign key
+        select_related = self.model.get_default_select_related_fields()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        prefetch_related = self.model.get_default_prefetch_related_fields()
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
 class BaseModel(models.Model):
+    objects = BaseManager()
+
     class Meta:
         abstract = True
 
-    @abstractmethod
-    def get_default_select_related_fields(self):
+    @classmethod
+    def get_default_select_related_fields(cls):
+        """
+        Forward foreign keys or one-to-one relations (either side) joined by
+        `objects` querysets, `__` chains included.
+        """
         raise NotImplementedError
 
-    @abstractmethod
-    def get_default_prefetch_related_fields(self):
+    @classmethod
+    def get_default_prefetch_related_fields(cls):
+        """
+        Relations of any kind, or `Prefetch` objects, prefetched by `objects`
+        querysets.
+        """
         raise NotImplementedError
 
-    @property
-    def objects(self):
-        # TODO this approach doesn't work here
-        # we need to implement this logic in `get_queryset` method of the view
-        objects = super().objects
-        return objects \
-            .select_related(*self.get_default_select_related_fields()) \
-            .prefetch_related(*self.get_default_prefetch_related_fields())
+    @classmethod
+    def check(cls, **kwargs):
+        errors = super().check(**kwargs)
+        errors += cls._check_default_relations()
+        return errors
+
+    @classmethod
+    def _check_default_relations(cls):
+        errors = []
+        lookups = [('get_default_select_related_fields', lookup, 'base.E001', True)
+                   for lookup in cls.get_default_select_related_fields()]
+        lookups += [('get_default_prefetch_related_fields',
+                     lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup, 'base.E002', False)
+                    for lookup in cls.get_default_prefetch_related_fields()]
+        for method, lookup, error_id, single_valued in lookups:
+            error = cls._check_relation_path(lookup, single_valued)
+            if error:
+                errors.append(checks.Error(f"'{lookup}' in {method}() {error}.", obj=cls, id=error_id))
+        return errors
+
+    @classmethod
+    def _check_relation_path(cls, lookup, single_valued):
+        opts = cls._meta
+        for name in lookup.split('__'):
+            if opts is None:
+                return f"traverses a generic relation at '{name}'"
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                return f"names no field '{name}' of {opts.label}"
+            if not field.is_relation:
+                return f"names '{name}' of {opts.label}, which is not a relation"
+            if single_valued and not (field.many_to_one and field.concrete or field.one_to_one):
+                return f"names '{name}' of {opts.label}, which is not a forward foreign key or a " \
+                       f"one-to-one relation"
+            opts = field.related_model._meta if field.related_model else None
+        return None
 
 
 class TimestampFields(models.Model):
@@ -52,6 +119,10 @@ class User(AbstractUser):
     about = models.TextField(null=True, blank=True)
     location = models.CharField(max_length=256, null=True, blank=True)
 
+    # denormalized from `UserFollowers`, see `base.follows`
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
     class Meta:
         db_table = "users"
 
@@ -79,6 +150,8 @@ class Product(TimestampFields, BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False)
     name = models.CharField(max_length=200, null=False, blank=False, default="name")
     image = models.ImageField(null=True, blank=True, default="/images/placeholder.png", upload_to="images/")
+    # derived sizes of `image`, see `base.thumbnails`
+    image_thumbnails = models.JSONField(null=False, blank=True, default=dict)
     description = models.TextField(null=False, blank=False, default="description")
     rating = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
 
@@ -100,25 +173,146 @@ class Product(TimestampFields, BaseModel):
     seen_count = models.IntegerField(null=False, blank=False, default=0)
     _id = models.AutoField(primary_key=True, editable=False)
 
+    class Meta:
+        # composite indexes backing the cursor pagination sort orders
+        indexes = [
+            models.Index(fields=['created_at', '_id'], name='product_created_at_idx'),
+            models.Index(fields=['price', '_id'], name='product_price_idx'),
+            models.Index(fields=['year', '_id'], name='product_year_idx'),
+            models.Index(fields=['seen_count', '_id'], name='product_seen_count_idx'),
+        ]
+
     def __str__(self):
         return self.name + " | " + str(self.price)
 
-    @abstractmethod
-    def get_default_select_related_fields(self):
-        # TODO test this
-        return ['buyer', 'provider', 'transiter', 'product_list',
+    @classmethod
+    def get_default_select_related_fields(cls):
+        return ['user', 'buyer', 'provider', 'transiter', 'product_list',
                 'location', 'live_location']
 
-    def get_default_prefetch_related_fields(self):
+    @classmethod
+    def get_default_prefetch_related_fields(cls):
         return []
 
 
+class ProductListing(models.Model):
+    """
+    Denormalized copy of the catalog rows with the display columns of the
+    joined users, locations and product list, so list queries read a single
+    table. Maintained from the source rows by `base.listing`, never written
+    to directly. Columns keep the names of `Product` attributes, so the
+    product filters and pagination work on both.
+    """
+    _id = models.IntegerField(primary_key=True)
+    created_at = models.DateTimeField()
+    name = models.CharField(max_length=200)
+    image = models.CharField(max_length=100, null=True, blank=True)
+    image_thumbnails = models.JSONField(default=dict)
+    description = models.TextField()
+    rating = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    category = models.CharField(max_length=512)
+    year = models.PositiveSmallIntegerField(null=True, blank=True)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    announcement_code = models.CharField(max_length=64)
+    customs_clearance = models.BooleanField()
+    seen_count = models.IntegerField(default=0)
+
+    user_id = models.BigIntegerField(db_index=True)
+    user_id_number = models.CharField(max_length=52, null=True, blank=True)
+    user_name = models.CharField(max_length=512)
+    user_email = models.EmailField()
+    user_is_provider = models.BooleanField()
+    user_is_buyer = models.BooleanField()
+    user_is_transiter = models.BooleanField()
+    user_about = models.TextField(null=True, blank=True)
+    user_location = models.CharField(max_length=256, null=True, blank=True)
+
+    buyer_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    buyer_id_number = models.CharField(max_length=52, null=True, blank=True)
+    buyer_name = models.CharField(max_length=512, null=True, blank=True)
+    buyer_email = models.EmailField(null=True, blank=True)
+    buyer_is_provider = models.BooleanField(null=True, blank=True)
+    buyer_is_buyer = models.BooleanField(null=True, blank=True)
+    buyer_is_transiter = models.BooleanField(null=True, blank=True)
+    buyer_about = models.TextField(null=True, blank=True)
+    buyer_location = models.CharField(max_length=256, null=True, blank=True)
+
+    provider_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    provider_id_number = models.CharField(max_length=52, null=True, blank=True)
+    provider_name = models.CharField(max_length=512, null=True, blank=True)
+    provider_email = models.EmailField(null=True, blank=True)
+    provider_is_provider = models.BooleanField(null=True, blank=True)
+    provider_is_buyer = models.BooleanField(null=True, blank=True)
+    provider_is_transiter = models.BooleanField(null=True, blank=True)
+    provider_about = models.TextField(null=True, blank=True)
+    provider_location = models.CharField(max_length=256, null=True, blank=True)
+
+    transiter_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    transiter_id_number = models.CharField(max_length=52, null=True, blank=True)
+    transiter_name = models.CharField(max_length=512, null=True, blank=True)
+    transiter_email = models.EmailField(null=True, blank=True)
+    transiter_is_provider = models.BooleanField(null=True, blank=True)
+    transiter_is_buyer = models.BooleanField(null=True, blank=True)
+    transiter_is_transiter = models.BooleanField(null=True, blank=True)
+    transiter_about = models.TextField(null=True, blank=True)
+    transiter_location = models.CharField(max_length=256, null=True, blank=True)
+
+    product_list_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    product_list_name = models.CharField(max_length=512, null=True, blank=True)
+    location_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    location_name = models.CharField(max_length=200, null=True, blank=True)
+    live_location_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    live_location_name = models.CharField(max_length=200, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', '_id'], name='listing_created_at_idx'),
+            models.Index(fields=['price', '_id'], name='listing_price_idx'),
+            models.Index(fields=['year', '_id'], name='listing_year_idx'),
+            models.Index(fields=['seen_count', '_id'], name='listing_seen_count_idx'),
+        ]
+
+
 class UserFollowers(TimestampFields, BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False, related_name="followers")
     follower = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False, related_name="following")
 
-    def get_default_select_related_fields(self):
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='followers_user_created_idx'),
+            models.Index(fields=['follower', 'created_at', 'id'], name='followers_follower_created_idx'),
+        ]
+
+    @classmethod
+    def get_default_select_related_fields(cls):
         return []
 
-    def get_default_prefetch_related_fields(self):
+    @classmethod
+    def get_default_prefetch_related_fields(cls):
         return []
+
+
+class UserRecommendation(models.Model):
+    """
+    Precomputed "followed by people you follow" candidates, see `base.recommendations`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    mutual_count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-score', '-id'], name='recommendation_user_score_idx'),
+        ]
+
+
+class FollowEvent(models.Model):
+    """
+    Append-only log of follows and unfollows, replayed by every process on top
+    of the social graph file until the next compaction, see `base.social_graph`.
+    """
+    follower_id = models.BigIntegerField()
+    user_id = models.BigIntegerField()
+    followed = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,303 @@
+import heapq
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from base.utils import parse_positive_int
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset pagination over `(ordering field, tie_breaker)`.
+
+    Every page is a `WHERE (field, pk) > (value, pk) ORDER BY field, pk LIMIT n`
+    range scan, so the cost of a page doesn't depend on how deep it is, as long
+    as a composite index on `(field, tie_breaker)` exists.
+
+    Cursor mode is opt-in: it's used only when the request carries `cursor` or
+    `page_size`, otherwise the view gets the old list response back, with
+    every row. With a `legacy_limit` that list is the first page, and the
+    cursor of the next one is sent in a `Link` header.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    page_size = 20
+    max_page_size = 100
+
+    tie_breaker = 'id'
+    default_ordering = '-created_at'
+    orderings = ('-created_at', 'created_at')
+
+    # number of rows returned when the request is not in cursor mode,
+    # `None` keeps the whole result set
+    legacy_limit = None
+
+    invalid_cursor_message = _('Invalid cursor')
+
+    def is_cursor_mode(self, request):
+        return self.cursor_query_param in request.query_params \
+            or self.page_size_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_mode = self.is_cursor_mode(request)
+        if self.cursor_mode:
+            self.page_size = self.get_page_size(request)
+        else:
+            self.page_size = self.legacy_limit
+        self.ordering = self.get_ordering(request, queryset)
+        field, descending = self.ordering.lstrip('-'), self.ordering.startswith('-')
+        nullable = self.get_field(queryset, field).null
+        cursor = self.decode_cursor(request, queryset, field, nullable)
+
+        reverse = self.reverse = cursor is not None and cursor['r']
+        # going backwards walks the same index in the opposite direction
+        scan_descending = descending != reverse
+        # nulls keep the place the database gives them in the index, so both
+        # directions stay plain index scans
+        nulls_last = scan_descending != self.nulls_are_largest(queryset.db)
+
+        queryset = queryset.order_by(*self.get_order_by(field, scan_descending))
+        if cursor is not None:
+            queryset = queryset.filter(
+                self.get_seek_filter(field, scan_descending, nullable, nulls_last, cursor['v'], cursor['k'])
+            )
+
+        if self.page_size is None:
+            rows, has_more = list(queryset), False
+        else:
+            rows = list(queryset[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.field = field
+        self.rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            next_link = self.get_next_link()
+            return Response(data, headers={'Link': f'<{next_link}>; rel="next"'} if next_link else None)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            return parse_positive_int(request.query_params[self.page_size_query_param], cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, queryset):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering in self.orderings:
+            return ordering
+        return self.default_ordering
+
+    @staticmethod
+    def get_field(queryset, name):
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return queryset.query.annotations[name].output_field
+
+    @staticmethod
+    def nulls_are_largest(using):
+        # PostgreSQL and Oracle sort nulls after every value, MySQL and SQLite before
+        return connections[using].vendor in ('postgresql', 'oracle')
+
+    def get_order_by(self, field, descending):
+        prefix = '-' if descending else ''
+        return prefix + field, prefix + self.tie_breaker
+
+    def get_seek_filter(self, field, descending, nullable, nulls_last, value, key):
+        lookup = 'lt' if descending else 'gt'
+        after_key = Q(**{f'{self.tie_breaker}__{lookup}': key})
+        if value is None:
+            seek = Q(**{f'{field}__isnull': True}) & after_key
+            if not nulls_last:
+                seek |= Q(**{f'{field}__isnull': False})
+            return seek
+        seek = Q(**{f'{field}__{lookup}': value}) | (Q(**{field: value}) & after_key)
+        if nullable and nulls_last:
+            seek |= Q(**{f'{field}__isnull': True})
+        return seek
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return row[self.field], row[self.tie_breaker]
+        return getattr(row, self.field), getattr(row, self.tie_breaker)
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        value, key = self.get_position(self.rows[-1])
+        return self.encode_cursor(value, key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        value, key = self.get_position(self.rows[0])
+        return self.encode_cursor(value, key, reverse=True)
+
+    def decode_cursor(self, request, queryset, field, nullable):
+        """
+        The cursor of the request with its value converted for `field`. A
+        cursor of another ordering, or one that doesn't fit the fields, is
+        rejected with a 404.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if not isinstance(cursor, dict) or not {'o', 'v', 'k', 'r'} <= cursor.keys() \
+                    or cursor['o'] != self.ordering or type(cursor['k']) is not int:
+                raise ValueError
+            if cursor['v'] is not None:
+                cursor['v'] = self.get_field(queryset, field).to_python(cursor['v'])
+            if cursor['v'] is None and not nullable:
+                raise ValueError
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        cursor['r'] = bool(cursor['r'])
+        return cursor
+
+    def encode_cursor(self, value, key, reverse):
+        if hasattr(value, 'isoformat'):
+            # keep microseconds, DjangoJSONEncoder would truncate them
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = json.dumps({'o': self.ordering, 'v': value, 'k': key, 'r': reverse})
+        encoded = b64encode(payload.encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+class ProductCursorPagination(KeysetCursorPagination):
+    """
+    Search results come ranked by the search backend, see `base.search`, and
+    keep that order in cursor mode unless the request asks for another one.
+    """
+    tie_breaker = '_id'
+    default_ordering = '-created_at'
+    orderings = (
+        '-created_at', 'created_at',
+        '-price', 'price',
+        '-year', 'year',
+        '-seen_count', 'seen_count',
+    )
+    rank_field = 'search_rank'
+
+    def get_ordering(self, request, queryset):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering not in self.orderings and self.rank_field in queryset.query.annotations:
+            return '-' + self.rank_field
+        return super().get_ordering(request, queryset)
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """
+    Newest first over `(created_at, id)`. Requests without a cursor still get
+    the whole list.
+    """
+    orderings = ('-created_at',)
+
+
+class MergedCursorPagination(CreatedAtCursorPagination):
+    """
+    Pages through several querysets of the same model at once, newest first.
+    Every queryset is a keyset range scan of its own, the pages are merged on
+    `(field, tie_breaker)` and rows found by more than one queryset are kept once.
+    Without a `legacy_limit`, requests out of cursor mode get every row merged.
+    """
+
+    def paginate_queryset(self, querysets, request, view=None):
+        if self.legacy_limit is None and not self.is_cursor_mode(request):
+            return self.merge_all(querysets, request)
+        pages = []
+        has_more = False
+        for queryset in querysets:
+            page = super().paginate_queryset(queryset, request, view)
+            pages.append(page)
+            has_more |= self.has_previous if self.reverse else self.has_next
+
+        rows = self.merge(pages)
+        has_more |= len(rows) > self.page_size
+        if self.reverse:
+            rows = rows[-self.page_size:]
+            self.has_next, self.has_previous = True, has_more
+        else:
+            rows = rows[:self.page_size]
+            self.has_next = has_more
+        self.rows = rows
+        return rows
+
+    def merge_all(self, querysets, request):
+        self.request = request
+        self.cursor_mode = False
+        self.has_next = self.has_previous = False
+        self.field = self.get_ordering(request, querysets[0]).lstrip('-')
+        order_by = self.get_order_by(self.field, descending=True)
+        self.rows = self.merge([queryset.order_by(*order_by) for queryset in querysets])
+        return self.rows
+
+    def merge(self, pages):
+        rows = []
+        for row in heapq.merge(*pages, key=self.get_merge_key, reverse=True):
+            if not rows or row.pk != rows[-1].pk:
+                rows.append(row)
+        return rows
+
+    def get_merge_key(self, row):
+        return getattr(row, self.field), getattr(row, self.tie_breaker)
+
+
+class FeedCursorPagination(MergedCursorPagination):
+    """
+    Pages the home feed querysets of `posts.feed` by the position they
+    annotate, the timeline entry's for timeline posts.
+    """
+    tie_breaker = 'feed_id'
+    default_ordering = '-feed_created_at'
+    orderings = ('-feed_created_at',)
+    # the feed has no clients from before the cursors, so a plain list is
+    # only its first page, with the next one linked in the `Link` header
+    legacy_limit = KeysetCursorPagination.max_page_size
+
+
+class DialogsPagination(MergedCursorPagination):
+    """
+    Dialogs with the latest message first, merged from the `user1` and `user2`
+    sides of the user. Requests without a cursor still get every dialog.
+    """
+    page_size = settings.DIALOGS_PAGINATION
+    default_ordering = '-modified'
+    orderings = ('-modified',)
+    legacy_limit = None
+
+
+class RecommendedUsersPagination(KeysetCursorPagination):
+    default_ordering = '-score'
+    orderings = ('-score',)
+    legacy_limit = 5
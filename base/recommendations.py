@@ -0,0 +1,208 @@
+import time
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from base.background import BackgroundQueue
+from base.models import User, UserFollowers, UserRecommendation
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# one follow edge of `FollowGraph.load`, 24 bytes instead of three Python objects
+EDGE_DTYPE = np.dtype([('source', np.int64), ('target', np.int64), ('time', np.float64)])
+
+
+def recency_weight(age_seconds):
+    """
+    Halves every `USER_RECOMMENDATIONS_HALF_LIFE_DAYS`, works on scalars and
+    numpy arrays alike.
+    """
+    half_life = settings.USER_RECOMMENDATIONS_HALF_LIFE_DAYS * SECONDS_PER_DAY
+    return 0.5 ** (np.clip(age_seconds, 0, None) / half_life)
+
+
+def score(mutual_count, latest_age_seconds):
+    """
+    The number of followed users that follow the candidate, the recency of the
+    latest of those follows breaks ties (it's always in `(0, 1]`).
+    """
+    return mutual_count + recency_weight(latest_age_seconds)
+
+
+def expand_ranges(starts, counts):
+    """
+    Concatenation of `range(start, start + count)` for every pair.
+    """
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total, dtype=np.int64)
+
+
+class FollowGraph:
+    """
+    The follow edges as CSR arrays: row `i` lists the nodes node `i` follows,
+    with the time every follow was made. Nodes are indexes into `node_ids`.
+    """
+
+    def __init__(self, sources, targets, times):
+        self.node_ids = np.unique(np.concatenate([sources, targets]))
+        sources = np.searchsorted(self.node_ids, sources)
+        targets = np.searchsorted(self.node_ids, targets)
+        order = np.lexsort((targets, sources))
+
+        self.indices = targets[order]
+        self.times = times[order]
+        self.indptr = np.zeros(len(self.node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self.node_ids)), out=self.indptr[1:])
+        self.degrees = np.diff(self.indptr)
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        rows = UserFollowers.objects.order_by() \
+            .values_list('follower_id', 'user_id', 'created_at') \
+            .iterator(chunk_size=chunk_size)
+        chunks = [np.empty(0, dtype=EDGE_DTYPE)]
+        while chunk := list(islice(rows, chunk_size)):
+            chunks.append(np.array([(follower_id, user_id, created_at.timestamp())
+                                    for follower_id, user_id, created_at in chunk], dtype=EDGE_DTYPE))
+        edges = np.concatenate(chunks)
+        return cls(edges['source'], edges['target'], edges['time'])
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def two_hop_sizes(self):
+        """
+        Number of two-hop paths starting at every node.
+        """
+        paths = np.zeros(len(self.indices) + 1, dtype=np.int64)
+        np.cumsum(self.degrees[self.indices], out=paths[1:])
+        return paths[self.indptr[1:]] - paths[self.indptr[:-1]]
+
+    def iter_blocks(self, max_rows, max_paths):
+        """
+        Yields ranges of nodes with outgoing edges, small enough for the two-hop
+        expansion of a range to stay around `max_paths` elements.
+        """
+        sizes = self.two_hop_sizes()
+        rows = []
+        paths = 0
+        for row in np.flatnonzero(self.degrees):
+            if rows and (len(rows) >= max_rows or paths + sizes[row] > max_paths):
+                yield np.array(rows, dtype=np.int64)
+                rows, paths = [], 0
+            rows.append(row)
+            paths += sizes[row]
+        if rows:
+            yield np.array(rows, dtype=np.int64)
+
+    def recommend(self, rows, now, limit):
+        """
+        Returns `(user_ids, candidate_ids, scores, mutual_counts)` with the best
+        `limit` candidates of every row: nodes two hops away that aren't
+        followed yet.
+        """
+        size = len(self)
+        counts = self.degrees[rows]
+        first_hop = self.indices[expand_ranges(self.indptr[rows], counts)]
+        origins = np.repeat(rows, counts)
+        followed = origins * size + first_hop
+
+        second_counts = self.degrees[first_hop]
+        positions = expand_ranges(self.indptr[first_hop], second_counts)
+        origins = np.repeat(origins, second_counts)
+        candidates = self.indices[positions]
+        keys = origins * size + candidates
+
+        keep = (candidates != origins) & ~np.isin(keys, followed)
+        keys, times = keys[keep], self.times[positions][keep]
+        if not len(keys):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0), empty
+
+        order = np.argsort(keys, kind='stable')
+        keys, times = keys[order], times[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        keys = keys[starts]
+        mutual_counts = np.diff(np.r_[starts, len(order)])
+        scores = score(mutual_counts, now - np.maximum.reduceat(times, starts))
+
+        # keys are sorted, so ties keep the candidates in id order
+        origins, candidates = keys // size, keys % size
+        order = np.lexsort((-scores, origins))
+        origins, candidates = origins[order], candidates[order]
+        scores, mutual_counts = scores[order], mutual_counts[order]
+        ranks = np.arange(len(origins)) - np.searchsorted(origins, origins)
+        top = ranks < limit
+        return (self.node_ids[origins[top]], self.node_ids[candidates[top]],
+                scores[top], mutual_counts[top])
+
+
+def rebuild_recommendations(batch_size=1000, max_paths=2000000):
+    """
+    Recomputes the stored candidates of every user from the whole follow graph.
+    Returns the number of users that have candidates.
+    """
+    UserRecommendation.objects.exclude(user_id__in=UserFollowers.objects.values('follower_id')).delete()
+
+    graph = FollowGraph.load()
+    now = time.time()
+    limit = settings.USER_RECOMMENDATIONS_LIMIT
+    users = 0
+    for rows in graph.iter_blocks(batch_size, max_paths):
+        user_ids, candidate_ids, scores, mutual_counts = graph.recommend(rows, now, limit)
+        recommendations = [
+            UserRecommendation(user_id=user_id, candidate_id=candidate_id, score=candidate_score,
+                               mutual_count=mutual_count)
+            for user_id, candidate_id, candidate_score, mutual_count
+            in zip(user_ids.tolist(), candidate_ids.tolist(), scores.tolist(), mutual_counts.tolist())
+        ]
+        with transaction.atomic():
+            UserRecommendation.objects.filter(user_id__in=graph.node_ids[rows].tolist()).delete()
+            UserRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+        users += len(np.unique(user_ids))
+    return users
+
+
+def refresh_user_recommendations(user_id):
+    """
+    Recomputes the candidates of one user with a grouped query over the follows
+    of the users they follow. Users whose two hops span more than
+    `USER_RECOMMENDATIONS_REFRESH_MAX_PATHS` follows are left to the scheduled
+    rebuild. Returns whether the candidates were recomputed.
+    """
+    max_paths = settings.USER_RECOMMENDATIONS_REFRESH_MAX_PATHS
+    if not User.objects.filter(id=user_id, following_count__lte=max_paths).exists():
+        return False
+    following = UserFollowers.objects.filter(follower_id=user_id).values('user_id')
+    paths = User.objects.filter(id__in=following).aggregate(paths=Sum('following_count'))['paths'] or 0
+    if paths > max_paths:
+        return False
+
+    rows = UserFollowers.objects \
+        .filter(follower_id__in=following) \
+        .exclude(user_id=user_id) \
+        .exclude(user_id__in=following) \
+        .order_by() \
+        .values('user_id') \
+        .annotate(mutual_count=Count('id'), latest=Max('created_at')) \
+        .order_by('-mutual_count', '-latest', 'user_id')[:settings.USER_RECOMMENDATIONS_LIMIT]
+    now = time.time()
+    recommendations = [
+        UserRecommendation(user_id=user_id, candidate_id=row['user_id'], mutual_count=row['mutual_count'],
+                           score=float(score(row['mutual_count'], now - row['latest'].timestamp())))
+        for row in rows
+    ]
+    with transaction.atomic():
+        UserRecommendation.objects.filter(user_id=user_id).delete()
+        UserRecommendation.objects.bulk_create(recommendations)
+    return True
+
+
+# refreshes after follows and unfollows, see `base.signals`
+recommendations_queue = BackgroundQueue('recommendations')
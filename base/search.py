@@ -0,0 +1,103 @@
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+# the column and indexes are created by the `0026_product_search_indexes` and
+# `0027_productlisting` migrations
+SEARCH_CONFIG = 'simple'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def get_search_terms(value):
+    return TERM_PATTERN.findall(value)
+
+
+class BaseSearchBackend:
+    """
+    Fallback backend, used by engines we don't have a dedicated backend for.
+    Keeps the old `icontains` behaviour.
+
+    The dedicated backends match `search` terms as word prefixes rather than
+    substrings, and annotate the results with a `search_rank` the product
+    pagination orders by.
+    """
+
+    def search(self, queryset, value):
+        return queryset.filter(name__icontains=value)
+
+    def contains(self, queryset, field, value):
+        return queryset.filter(**{f'{field}__icontains': value})
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    `search` matches a stored, generated tsvector column (GIN indexed) with
+    prefix terms and falls back to trigram similarity for typos, results are
+    ranked by both. `contains` keeps `icontains` semantics, but the trigram
+    indexes on `UPPER(category)` and `UPPER(announcement_code)` turn the
+    `LIKE '%x%'` into an index scan.
+    """
+
+    def search(self, queryset, value):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity
+
+        terms = get_search_terms(value)
+        if not terms:
+            return super().search(queryset, value)
+
+        table = queryset.model._meta.db_table
+        query = SearchQuery(' & '.join(f'{term}:*' for term in terms), config=SEARCH_CONFIG, search_type='raw')
+        return queryset \
+            .alias(_search_vector=RawSQL(f'"{table}"."{SEARCH_VECTOR_COLUMN}"', [],
+                                         output_field=SearchVectorField())) \
+            .filter(Q(_search_vector=query) | Q(name__trigram_similar=value)) \
+            .annotate(search_rank=SearchRank(F('_search_vector'), query) + TrigramSimilarity('name', value)) \
+            .order_by('-search_rank')
+
+
+class MySQLSearchBackend(BaseSearchBackend):
+    """
+    `search` uses a FULLTEXT index on the name in boolean mode with prefix
+    terms, InnoDB keeps it up to date on write. `contains` keeps `icontains`:
+    FULLTEXT only matches word prefixes and skips short words and stopwords,
+    which would drop category and announcement code substrings.
+    """
+
+    def search(self, queryset, value):
+        rank = self._match(queryset, 'name', value)
+        if rank is None:
+            return super().search(queryset, value)
+        return queryset.annotate(search_rank=rank) \
+            .filter(search_rank__gt=0) \
+            .order_by('-search_rank')
+
+    @staticmethod
+    def _match(queryset, field, value):
+        terms = get_search_terms(value)
+        if not terms:
+            return None
+
+        table = queryset.model._meta.db_table
+        return RawSQL(
+            f'MATCH (`{table}`.`{field}`) AGAINST (%s IN BOOLEAN MODE)',
+            [' '.join(f'+{term}*' for term in terms)],
+            output_field=FloatField(),
+        )
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'mysql': MySQLSearchBackend,
+}
+
+
+def get_search_backend(queryset):
+    """
+    The backend of the database `queryset` reads from.
+    """
+    vendor = connections[queryset.db].vendor
+    return SEARCH_BACKENDS.get(vendor, BaseSearchBackend)()
@@ -1,7 +1,7 @@
 from abc import ABC
 
-from django.contrib.auth.hashers import make_password
 from django.templatetags.static import static
+from django.db import IntegrityError, transaction
 from django.utils.crypto import get_random_string
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
@@ -10,7 +10,14 @@ from django.contrib.auth.models import User
 from django.utils.translation import gettext as _
 
 from backend import settings
+from .hashing import hash_password
 from .models import *
+from .social_graph import social_graph
+from .thumbnails import get_thumbnail_urls
+
+
+def generate_announcement_code():
+    return "AC" + get_random_string(12, "0123456789")
 
 
 class ExpandSerializer(serializers.Serializer):
@@ -70,7 +77,21 @@ class UserSerializer(serializers.ModelSerializer):
                   'is_transiter', 'about', 'location']
 
 
-class UserProfileUpdateSerializer(serializers.ModelSerializer):
+class UpdateFieldsSerializerMixin:
+    """
+    Saves only the validated fields. A full save would write back the stale
+    values of columns updated in the database meanwhile, like the follow
+    counters.
+    """
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class UserProfileUpdateSerializer(UpdateFieldsSerializerMixin, serializers.ModelSerializer):
     def update(self, instance, validated_data):
         validated_data['id_number'] = validated_data.get('id_number', None) or None
         return super().update(instance, validated_data)
@@ -80,7 +101,7 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
         fields = ['id_number', 'name', 'is_provider', 'is_buyer', 'is_transiter', 'about', 'location']
 
 
-class UserCredentialsUpdateSerializer(serializers.ModelSerializer):
+class UserCredentialsUpdateSerializer(UpdateFieldsSerializerMixin, serializers.ModelSerializer):
     email = serializers.EmailField(required=False, min_length=1)
     password = serializers.CharField(required=False, min_length=8)
 
@@ -91,7 +112,7 @@ class UserCredentialsUpdateSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         if 'password' in validated_data:
-            validated_data['password'] = make_password(validated_data['password'])
+            validated_data['password'] = hash_password(validated_data['password'])
         return super().update(instance, validated_data)
 
     class Meta:
@@ -101,52 +122,67 @@ class UserCredentialsUpdateSerializer(serializers.ModelSerializer):
 
 class UserProfileDetailsSerializer(serializers.ModelSerializer):
     following = serializers.SerializerMethodField(read_only=True)
-    followers_count = serializers.SerializerMethodField(read_only=True)
-    following_count = serializers.SerializerMethodField(read_only=True)
 
     def get_following(self, obj):
-        return UserFollowers.objects.filter(follower=self.context['request'].user, user=obj).exists()
-
-    def get_followers_count(self, obj):
-        return User.objects.filter(following__user=obj).count()
-
-    def get_following_count(self, obj):
-        return User.objects.filter(followers__follower=obj).count()
+        user = self.context['request'].user
+        following = social_graph.is_following(user.id, obj.id)
+        if following is None:
+            following = UserFollowers.objects.filter(follower=user, user=obj).exists()
+        return following
 
     class Meta:
         model = User
         fields = ['id', 'id_number', 'name', 'email',
                   'is_provider', 'is_buyer', 'is_transiter', 'date_joined', 'following',
                   'about', 'location', 'followers_count', 'following_count']
+        read_only_fields = ['followers_count', 'following_count']
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
+    """
+    Uniqueness of email and id_number is left to the unique constraints, a
+    violation is reported as the same field error the validators gave.
+    """
     email = serializers.EmailField(required=True)
     password = serializers.CharField(min_length=8, write_only=True)
 
-    def validate_id_number(self, id_number):
-        if User.objects.filter(id_number=id_number).exists():
-            raise serializers.ValidationError(_("Identification number already exists"))
-        return id_number
-
-    def validate_email(self, email):
-        if User.objects.filter(email=email).exists():
-            raise serializers.ValidationError(_("Email already exists"))
-        return email
-
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data['password'])
-        user = User.objects.create(**validated_data)
-        Token.objects.create(user=user)
+        validated_data['password'] = hash_password(validated_data['password'])
+        try:
+            with transaction.atomic():
+                user = User.objects.create(**validated_data)
+                Token.objects.create(user=user)
+        except IntegrityError:
+            errors = self.get_unique_errors(validated_data)
+            if not errors:
+                raise
+            raise serializers.ValidationError(errors)
         return user
 
+    @staticmethod
+    def get_unique_errors(validated_data):
+        # only runs after a failed insert, to tell which constraint it was
+        unique_errors = {
+            'email': _("Email already exists"),
+            'id_number': _("Identification number already exists"),
+        }
+        return {
+            field: [message] for field, message in unique_errors.items()
+            if validated_data.get(field) is not None
+            and User.objects.filter(**{field: validated_data[field]}).exists()
+        }
+
     class Meta:
         model = User
         fields = ['id_number', 'name', 'password', 'email', 'is_buyer', 'is_provider', 'is_transiter']
+        extra_kwargs = {
+            'id_number': {'validators': []},
+        }
 
 
 class ProductSerializer(ExpandSerializer, serializers.ModelSerializer):
     image = serializers.SerializerMethodField(read_only=True)
+    image_srcset = serializers.SerializerMethodField(read_only=True)
     product_list = serializers.PrimaryKeyRelatedField(queryset=ProductList.objects.all())
     buyer = serializers.PrimaryKeyRelatedField(required=False, allow_null=True,
                                                queryset=User.objects.filter(is_buyer=True).all())
@@ -165,16 +201,9 @@ class ProductSerializer(ExpandSerializer, serializers.ModelSerializer):
     location_data = serializers.SerializerMethodField(read_only=True)
     live_location_data = serializers.SerializerMethodField(read_only=True)
 
-    def to_representation(self, instance):
-        from django.db import connection
-        print(len(connection.queries))
-        x = super().to_representation(instance)
-        print(len(connection.queries))
-        return x
-
     class Meta:
         model = Product
-        read_only_fields = ("_id", "user", "image",
+        read_only_fields = ("_id", "user", "image", "image_srcset",
                             "rating", "buyer_data", "provider_data", "transiter_data",
                             "product_list_data", "announcement_code", "location_data",
                             "user_data", "created_at", "live_location_data", "seen_count")
@@ -189,12 +218,155 @@ class ProductSerializer(ExpandSerializer, serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        validated_data["announcement_code"] = "AC" + get_random_string(12, "0123456789")
+        validated_data["announcement_code"] = generate_announcement_code()
         return super().create(validated_data)
 
     def get_image(self, obj: Product):
         return settings.DOMAIN_URL + static(obj.image)
 
+    def get_image_srcset(self, obj: Product):
+        return get_thumbnail_urls(obj.image_thumbnails)
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves ids against `context['related_objects'][field_name]`, which holds
+    the objects of a whole batch of items fetched with one `IN` query.
+    """
+
+    def to_internal_value(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.context['related_objects'][self.field_name][int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class BulkProductItemSerializer(ProductSerializer):
+    product_list = PrefetchedPrimaryKeyRelatedField(queryset=ProductList.objects.all())
+    buyer = PrefetchedPrimaryKeyRelatedField(required=False, allow_null=True,
+                                             queryset=User.objects.filter(is_buyer=True).all())
+    provider = PrefetchedPrimaryKeyRelatedField(required=False, allow_null=True,
+                                                queryset=User.objects.filter(is_provider=True).all())
+    transiter = PrefetchedPrimaryKeyRelatedField(required=False, allow_null=True,
+                                                 queryset=User.objects.filter(is_transiter=True).all())
+    location = PrefetchedPrimaryKeyRelatedField(queryset=Location.objects.all())
+    live_location = PrefetchedPrimaryKeyRelatedField(queryset=LiveLocation.objects.all())
+
+    relation_fields = ('product_list', 'buyer', 'provider', 'transiter', 'location', 'live_location')
+
+    @classmethod
+    def prefetch_related_objects(cls, items):
+        """One `IN` query per relation for every id referenced by `items`"""
+        fields = cls().fields
+        related_objects = {}
+        for name in cls.relation_fields:
+            ids = set()
+            for item in items:
+                value = item.get(name) if isinstance(item, dict) else None
+                if isinstance(value, (int, str)) and not isinstance(value, bool) and str(value).isdigit():
+                    ids.add(int(value))
+            related_objects[name] = fields[name].get_queryset().in_bulk(ids) if ids else {}
+        return related_objects
+
+
+class FlatProductSerializer:
+    """
+    Read only equivalent of `ProductSerializer(many=True).data`, built from a
+    `values()` projection of the product and its joined relations.
+
+    The getters are compiled once from the fields of `ProductSerializer`, so
+    the output keeps the same keys, order and formatting, without building a
+    field set and nested serializers for every row.
+    """
+    relation_separator = '__'
+    user_relations = ('user', 'buyer', 'provider', 'transiter')
+    named_relations = ('product_list', 'location', 'live_location')
+    # field types whose `to_representation` is a no-op for database values
+    passthrough_fields = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+    def __init__(self):
+        self.user_fields = tuple(UserSerializer.Meta.fields)
+        self.named_fields = tuple(LocationSerializer.Meta.fields)
+        self._columns = []
+        self._getters = []
+        for name, field in ProductSerializer().fields.items():
+            self._getters.append((name, self._compile(name, field)))
+
+    def _column(self, relation, field):
+        if field == 'id':
+            return relation + '_id'
+        return relation + self.relation_separator + field
+
+    def _add_columns(self, *columns):
+        for column in columns:
+            if column not in self._columns:
+                self._columns.append(column)
+
+    def _compile(self, name, field):
+        relation = name[:-len('_data')] if name.endswith('_data') else None
+        if relation in self.user_relations:
+            return self._compile_relation(relation, self.user_fields)
+        if relation in self.named_relations:
+            return self._compile_relation(relation, self.named_fields)
+        if name == 'image':
+            return self._compile_image()
+        if name == 'image_srcset':
+            self._add_columns('image_thumbnails')
+            return lambda row: get_thumbnail_urls(row['image_thumbnails'])
+        if isinstance(field, serializers.RelatedField):
+            column = name + '_id'
+            self._add_columns(column)
+            return lambda row: row[column]
+
+        self._add_columns(name)
+        if type(field) in self.passthrough_fields:
+            return lambda row: row[name]
+        to_representation = field.to_representation
+        return lambda row: None if row[name] is None else to_representation(row[name])
+
+    def _compile_relation(self, relation, fields):
+        key = self._column(relation, 'id')
+        pairs = tuple((field, self._column(relation, field)) for field in fields)
+        self._add_columns(*(column for _, column in pairs))
+
+        def get_relation_data(row):
+            if row[key] is None:
+                return None
+            return {field: row[column] for field, column in pairs}
+
+        return get_relation_data
+
+    def _compile_image(self):
+        self._add_columns('image')
+        domain_url = settings.DOMAIN_URL
+        return lambda row: domain_url + static(row['image'])
+
+    @property
+    def columns(self):
+        return tuple(self._columns)
+
+    def values(self, queryset):
+        # annotations such as the search rank stay available to the pagination
+        return queryset.values(*self.columns, *queryset.query.annotation_select)
+
+    def to_representation(self, row):
+        return {name: getter(row) for name, getter in self._getters}
+
+    def serialize(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class FlatProductListingSerializer(FlatProductSerializer):
+    """`FlatProductSerializer` reading the pre-joined columns of `ProductListing`"""
+    relation_separator = '_'
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from rest_framework.authtoken.models import Token
+
+from base.authentication import token_cache
+from base.cache import product_settings_cache
+from base.follows import user_followed, user_unfollowed
+from base.listing import USER_FIELDS, sync_product_listings, delete_product_listings, update_user_columns, \
+    update_named_columns
+from base.models import ProductCategory, Location, LiveLocation, ProductList, Product, User
+from base.recommendations import recommendations_queue, refresh_user_recommendations
+from base.thumbnails import needs_thumbnails, generate_product_thumbnails, thumbnail_queue
+
+
+def invalidate_product_settings(sender, **kwargs):
+    # bump after commit, otherwise a concurrent read could cache the old rows under the new version
+    transaction.on_commit(product_settings_cache.bump)
+
+
+for model in (ProductCategory, Location, LiveLocation, ProductList):
+    post_save.connect(invalidate_product_settings, sender=model, dispatch_uid=f'product_settings_{model.__name__}_save')
+    post_delete.connect(invalidate_product_settings, sender=model,
+                        dispatch_uid=f'product_settings_{model.__name__}_delete')
+
+
+# product listing read model, see `base.listing`
+
+def sync_product_listing(sender, instance, **kwargs):
+    sync_product_listings([instance.pk])
+
+
+def delete_product_listing(sender, instance, **kwargs):
+    delete_product_listings([instance.pk])
+
+
+def sync_listing_user_columns(sender, instance, created, update_fields=None, **kwargs):
+    # a new user has no products yet, and e.g. `update_last_login` or the
+    # follow counters touch nothing the listing shows
+    if created or update_fields is not None and not set(update_fields) & set(USER_FIELDS):
+        return
+    update_user_columns(instance)
+
+
+def sync_listing_named_columns(relation):
+    def receiver(sender, instance, **kwargs):
+        update_named_columns(relation, instance)
+    return receiver
+
+
+post_save.connect(sync_product_listing, sender=Product, dispatch_uid='product_listing_product_save')
+post_delete.connect(delete_product_listing, sender=Product, dispatch_uid='product_listing_product_delete')
+post_save.connect(sync_listing_user_columns, sender=User, dispatch_uid='product_listing_user_save')
+
+for relation, model in (('product_list', ProductList), ('location', Location), ('live_location', LiveLocation)):
+    post_save.connect(sync_listing_named_columns(relation), sender=model, weak=False,
+                      dispatch_uid=f'product_listing_{relation}_save')
+
+
+def schedule_product_thumbnails(sender, instance, **kwargs):
+    image_name = instance.image.name
+    if needs_thumbnails(image_name, instance.image_thumbnails):
+        transaction.on_commit(
+            lambda: thumbnail_queue.schedule(generate_product_thumbnails, instance.pk, image_name))
+
+
+post_save.connect(schedule_product_thumbnails, sender=Product, dispatch_uid='product_thumbnails_save')
+
+
+# cached token authentication, see `base.authentication`
+
+def invalidate_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: token_cache.delete(instance.key))
+
+
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # credentials, activation and everything else on the cached user
+    if created:
+        return
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(lambda: token_cache.delete(*keys))
+
+
+post_delete.connect(invalidate_deleted_token, sender=Token, dispatch_uid='auth_token_delete')
+post_save.connect(invalidate_user_tokens, sender=User, dispatch_uid='auth_token_user_save')
+
+
+# follow recommendations, see `base.recommendations`
+
+def refresh_follow_recommendations(sender, follower_id, user_id, **kwargs):
+    def schedule():
+        recommendations_queue.schedule(refresh_user_recommendations, follower_id)
+        recommendations_queue.schedule(refresh_user_recommendations, user_id)
+    transaction.on_commit(schedule)
+
+
+user_followed.connect(refresh_follow_recommendations, dispatch_uid='recommendations_follow')
+user_unfollowed.connect(refresh_follow_recommendations, dispatch_uid='recommendations_unfollow')
@@ -0,0 +1,335 @@
+import logging
+import os
+import struct
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections
+
+from base import metrics
+from base.models import FollowEvent, UserFollowers
+
+logger = logging.getLogger('base.social_graph')
+
+MAGIC = b'CSRG'
+FORMAT_VERSION = 1
+# magic, format version, last event id, node count, edge count
+HEADER = struct.Struct('<4sIqqq')
+INDPTR_DTYPE = np.dtype('<i8')
+INDEX_DTYPE = np.dtype('<i4')
+
+# events are re-read from a bit before the last one seen, so follows that
+# committed out of id order are not missed. Replaying is idempotent.
+EVENT_OVERLAP = 100
+
+
+def build_csr(sources, targets, nodes):
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(nodes + 1, dtype=INDPTR_DTYPE)
+    np.cumsum(np.bincount(sources, minlength=nodes), out=indptr[1:])
+    return indptr, targets[order].astype(INDEX_DTYPE)
+
+
+def write_graph(path, followers, users, last_event_id):
+    """
+    Writes the edges as two CSR matrices indexed by user id, the followed users
+    of every user and the followers of every user, with sorted rows. The file
+    is replaced atomically, readers keep their mapping of the old one.
+    """
+    nodes = int(max(followers.max(initial=0), users.max(initial=0))) + 1
+    if nodes > np.iinfo(INDEX_DTYPE).max:
+        raise ValueError(f'User ids above {np.iinfo(INDEX_DTYPE).max} do not fit the graph file')
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, last_event_id, nodes, len(followers)))
+        for sources, targets in ((followers, users), (users, followers)):
+            indptr, indices = build_csr(sources, targets, nodes)
+            file.write(indptr.tobytes())
+            file.write(indices.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        magic, version, last_event_id, nodes, edges = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f'{path} is not a social graph file')
+    return last_event_id, nodes, edges
+
+
+def load_edges():
+    rows = UserFollowers.objects.order_by().values_list('follower_id', 'user_id').distinct()
+    followers, users = [], []
+    for follower_id, user_id in rows.iterator(chunk_size=10000):
+        followers.append(follower_id)
+        users.append(user_id)
+    return np.array(followers, dtype=np.int64), np.array(users, dtype=np.int64)
+
+
+class GraphFile:
+    """
+    Read-only memory mapping of a graph file.
+    """
+
+    def __init__(self, path):
+        self.last_event_id, nodes, edges = read_header(path)
+        self.nodes = nodes
+        offset = HEADER.size
+        arrays = []
+        for dtype, size in ((INDPTR_DTYPE, nodes + 1), (INDEX_DTYPE, edges)) * 2:
+            arrays.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(size,))
+                          if size else np.empty(0, dtype=dtype))
+            offset += dtype.itemsize * size
+        self.following_indptr, self.following_indices, self.followers_indptr, self.followers_indices = arrays
+
+    @staticmethod
+    def _row(indptr, indices, node):
+        if not 0 <= node < len(indptr) - 1:
+            return indices[:0]
+        return indices[indptr[node]:indptr[node + 1]]
+
+    def following(self, user_id):
+        return self._row(self.following_indptr, self.following_indices, user_id)
+
+    def followers(self, user_id):
+        return self._row(self.followers_indptr, self.followers_indices, user_id)
+
+    def has_edge(self, follower_id, user_id):
+        row = self.following(follower_id)
+        position = np.searchsorted(row, user_id)
+        return bool(position < len(row) and row[position] == user_id)
+
+
+class GraphDelta:
+    """
+    Latest follow state of the pairs changed since the graph file was written.
+    """
+
+    def __init__(self, last_event_id=0):
+        self.pairs = {}
+        self.changed_following = defaultdict(set)
+        self.changed_followers = defaultdict(set)
+        self.last_event_id = last_event_id
+
+    def apply(self, events):
+        for event_id, follower_id, user_id, followed in events:
+            self.last_event_id = max(self.last_event_id, event_id)
+            previous = self.pairs.get((follower_id, user_id))
+            if previous is not None and previous[0] >= event_id:
+                continue
+            self.pairs[(follower_id, user_id)] = (event_id, followed)
+            self.changed_following[follower_id].add(user_id)
+            self.changed_followers[user_id].add(follower_id)
+
+
+def fetch_events(after_id):
+    return list(
+        FollowEvent.objects.filter(id__gt=after_id - EVENT_OVERLAP)
+        .order_by('id')
+        .values_list('id', 'follower_id', 'user_id', 'followed')
+    )
+
+
+class GraphView:
+    """
+    Lookups over a graph file patched with a delta.
+    """
+
+    def __init__(self, graph_file, delta):
+        self.file = graph_file
+        self.delta = delta
+
+    @classmethod
+    def load(cls, path):
+        graph_file = GraphFile(path)
+        delta = GraphDelta(graph_file.last_event_id)
+        delta.apply(fetch_events(delta.last_event_id))
+        return cls(graph_file, delta)
+
+    def is_following(self, follower_id, user_id):
+        change = self.delta.pairs.get((follower_id, user_id))
+        if change is not None:
+            return change[1]
+        return self.file.has_edge(follower_id, user_id)
+
+    def _patch(self, row, changed, pair):
+        if not changed:
+            return row.tolist()
+        user_ids = set(row.tolist())
+        for other_id in changed:
+            if self.delta.pairs[pair(other_id)][1]:
+                user_ids.add(other_id)
+            else:
+                user_ids.discard(other_id)
+        return sorted(user_ids)
+
+    def following(self, user_id):
+        return self._patch(self.file.following(user_id), self.delta.changed_following.get(user_id),
+                           lambda other_id: (user_id, other_id))
+
+    def followers(self, user_id):
+        return self._patch(self.file.followers(user_id), self.delta.changed_followers.get(user_id),
+                           lambda other_id: (other_id, user_id))
+
+
+class SocialGraph:
+    """
+    The `UserFollowers` graph, read from the CSR file written by
+    `compact_social_graph` and patched with the `FollowEvent` rows written
+    since. A thread per process polls new events and reopens the file after a
+    compaction, so lookups only read memory.
+
+    Users who just followed or unfollowed someone are marked in the shared
+    cache for `own_writes_timeout` seconds, long enough for every process to
+    poll the change. Their own lookups read the database until then.
+
+    Lookups return `None` while there is no graph file, callers fall back to
+    the database then.
+    """
+
+    def __init__(self, path, poll_interval, own_writes_timeout):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.own_writes_timeout = own_writes_timeout
+        self.pid = None
+        self._reset()
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.view = None
+        self.file_id = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # forked worker, the mapping and the thread belong to the parent
+                self._reset()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='social-graph-poll', daemon=True)
+            self.thread.start()
+        self._poll()
+
+    def _run(self):
+        while not self.stopped.wait(self.poll_interval):
+            close_old_connections()
+            self._poll()
+
+    def _poll(self):
+        try:
+            self.poll()
+        except (DatabaseError, OSError, ValueError):
+            logger.exception('Failed to refresh the social graph')
+
+    def poll(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id != self.file_id:
+            view = GraphView.load(self.path)
+            with self.lock:
+                self.view, self.file_id = view, file_id
+            metrics.increment('social_graph.reloads')
+        elif self.view is not None:
+            events = fetch_events(self.view.delta.last_event_id)
+            with self.lock:
+                self.view.delta.apply(events)
+
+    @staticmethod
+    def own_writes_key(user_id):
+        return f'social_graph:own_writes:{user_id}'
+
+    def mark_own_writes(self, user_id):
+        """
+        Called by `base.follows` when `user_id` follows or unfollows someone.
+        """
+        cache.set(self.own_writes_key(user_id), True, self.own_writes_timeout)
+
+    def has_own_writes(self, user_id):
+        return cache.get(self.own_writes_key(user_id), False)
+
+    def is_following(self, follower_id, user_id):
+        """
+        Whether `follower_id` follows `user_id`. For a follower with recent
+        writes, a change of the pair this process hasn't polled yet is read
+        from the events first, so users see their own follows right away,
+        whichever process served them.
+        """
+        self._ensure_started()
+        own_writes = self.has_own_writes(follower_id)
+        with self.lock:
+            if self.view is None:
+                return None
+            if not own_writes:
+                return self.view.is_following(follower_id, user_id)
+            after_id = self.view.delta.last_event_id
+        followed = FollowEvent.objects \
+            .filter(id__gt=after_id - EVENT_OVERLAP, follower_id=follower_id, user_id=user_id) \
+            .order_by('-id') \
+            .values_list('followed', flat=True) \
+            .first()
+        if followed is not None:
+            return followed
+        with self.lock:
+            return self.view.is_following(follower_id, user_id)
+
+    def following(self, user_id):
+        """
+        Ids of the users `user_id` follows, sorted. `None` as well while the
+        user has recent writes.
+        """
+        self._ensure_started()
+        if self.has_own_writes(user_id):
+            return None
+        with self.lock:
+            return None if self.view is None else self.view.following(user_id)
+
+    def followers(self, user_id):
+        """
+        Ids of the followers of `user_id`, sorted.
+        """
+        self._ensure_started()
+        with self.lock:
+            return None if self.view is None else self.view.followers(user_id)
+
+    def pending_events(self):
+        view = self.view
+        return 0 if view is None else len(view.delta.pairs)
+
+
+def compact_social_graph(path=None):
+    """
+    Writes a new graph file from the follow table and drops the events the
+    previous file already covered. Returns `(edge count, last event id)`.
+    """
+    path = path or settings.SOCIAL_GRAPH_PATH
+    previous_event_id = read_header(path)[0] if os.path.exists(path) else None
+    # taken before the edges are read, replaying events already in the
+    # file is harmless while missing one is not
+    last_event_id = FollowEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    followers, users = load_edges()
+    write_graph(path, followers, users, last_event_id)
+    if previous_event_id is not None:
+        FollowEvent.objects.filter(id__lte=previous_event_id - EVENT_OVERLAP).delete()
+    return len(followers), last_event_id
+
+
+social_graph = SocialGraph(settings.SOCIAL_GRAPH_PATH, settings.SOCIAL_GRAPH_POLL_INTERVAL,
+                           settings.SOCIAL_GRAPH_OWN_WRITES_TIMEOUT)
+
+metrics.register_gauge('social_graph.pending_events', social_graph.pending_events)
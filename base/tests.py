@@ -1,3 +1,774 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import Throttled
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from base.models import User, Product, Location, LiveLocation, ProductList, ProductListing, UserFollowers, \
+    UserRecommendation, ProductCategory
+from base.authentication import CachedTokenAuthentication
+from base.counters import ViewCountBuffer
+from base.follows import follow_user, unfollow_user
+from base.hashing import PasswordHashingSlots
+from base.instrumentation import QueryRecorder, fingerprint
+from base.pagination import ProductCursorPagination, CreatedAtCursorPagination
+from base.recommendations import rebuild_recommendations, recommendations_queue, refresh_user_recommendations
+from base.serializers import ProductSerializer, FlatProductSerializer, FlatProductListingSerializer
+from base.social_graph import SocialGraph, compact_social_graph
+from base.thumbnails import THUMBNAIL_SIZES, thumbnail_queue
+
+
+class FlatProductSerializerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user', id_number='01001',
+                                        is_provider=True, about='about', location='Tbilisi')
+        self.buyer = User.objects.create(email='buyer@example.com', name='buyer', is_buyer=True)
+        location = Location.objects.create(name='Poti')
+        live_location = LiveLocation.objects.create(name='Batumi')
+        product_list = ProductList.objects.create(name='Cars')
+
+        Product.objects.create(user=self.user, name='full', price=Decimal('10.5'), rating=Decimal('4'),
+                               year=2012, category='sedan', announcement_code='AC000000000001',
+                               buyer=self.buyer, provider=self.user, transiter=self.buyer,
+                               location=location, live_location=live_location, product_list=product_list)
+        Product.objects.create(user=self.buyer, name='empty', price=Decimal('0'), image='',
+                               announcement_code='AC000000000002', customs_clearance=False)
+
+    def test_output_matches_product_serializer(self):
+        queryset = Product.objects.order_by('_id').select_related(
+            'user', 'buyer', 'provider', 'transiter',
+            'location', 'live_location', 'product_list'
+        )
+        flat_serializer = FlatProductSerializer()
+
+        expected = JSONRenderer().render(ProductSerializer(queryset, many=True).data)
+        actual = JSONRenderer().render(flat_serializer.serialize(flat_serializer.values(queryset)))
+        self.assertEqual(expected, actual)
+
+    def test_listing_output_matches_product_serializer(self):
+        self.buyer.name = 'renamed buyer'
+        self.buyer.save()
+        queryset = Product.objects.order_by('_id').select_related(
+            'user', 'buyer', 'provider', 'transiter',
+            'location', 'live_location', 'product_list'
+        )
+        flat_serializer = FlatProductListingSerializer()
+
+        expected = JSONRenderer().render(ProductSerializer(queryset, many=True).data)
+        actual = JSONRenderer().render(
+            flat_serializer.serialize(flat_serializer.values(ProductListing.objects.order_by('_id')))
+        )
+        self.assertEqual(expected, actual)
+
+    def test_list_endpoint_uses_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/all/')
+        self.assertEqual(len(response.json()), 2)
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SQL_REPEATED_QUERY_THRESHOLD=2)
+class QueryInstrumentationTestCase(TestCase):
+    def test_fingerprints_ignore_parameters(self):
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b = 10.5 AND c IN (%s, %s, %s)"),
+                         'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)')
+
+    def test_recorder_reports_repeated_queries(self):
+        recorder = QueryRecorder(repeat_threshold=2)
+        with connection.execute_wrapper(recorder):
+            for email in ('a@example.com', 'b@example.com'):
+                User.objects.filter(email=email).exists()
+            Product.objects.exists()
+        self.assertEqual(recorder.count, 3)
+        self.assertEqual([count for _, count in recorder.repeated()], [2])
+        self.assertIn(User._meta.db_table, recorder.repeated()[0][0])
+
+    def test_responses_report_their_queries(self):
+        with self.assertLogs('base.sql', 'INFO') as logs:
+            response = self.client.get('/api/products/all/')
+        self.assertEqual((response['X-DB-Query-Count'], response['X-DB-Repeated-Queries']), ('1', '0'))
+        self.assertGreaterEqual(float(response['X-DB-Time-Ms']), 0)
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertIn('GET /api/products/all/ queries=1', logs.output[0])
+
+    @override_settings(SQL_INSTRUMENTATION=False)
+    def test_disabled_by_default(self):
+        self.assertNotIn('X-DB-Query-Count', self.client.get('/api/products/all/'))
+
+
+class ProductSettingsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        ProductCategory.objects.create(name='sedan')
+
+    def test_unchanged_settings_are_not_sent_again(self):
+        response = self.client.get('/api/products/settings/')
+        etag = response['ETag']
+        self.assertEqual([category['name'] for category in response.json()['result']['categories']], ['sedan'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/settings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+    def test_category_changes_invalidate_the_settings(self):
+        etag = self.client.get('/api/products/settings/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            category = ProductCategory.objects.create(name='truck')
+
+        response = self.client.get('/api/products/settings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([category['name'] for category in response.json()['result']['categories']],
+                         ['sedan', 'truck'])
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        response = self.client.get('/api/products/settings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([category['name'] for category in response.json()['result']['categories']], ['sedan'])
+
+
+class ProductFacetsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(email='user@example.com', name='user')
+        self.poti = Location.objects.create(name='Poti')
+        batumi = Location.objects.create(name='Batumi')
+        rows = [
+            ('sedan', self.poti, 2001, '10', True),
+            ('sedan', self.poti, 2003, '20', False),
+            ('truck', batumi, 2007, '30', True),
+            ('sedan', None, None, '110', True),
+        ]
+        for index, (category, location, year, price, customs_clearance) in enumerate(rows):
+            Product.objects.create(user=user, name=f'product {index}', category=category, location=location,
+                                   year=year, price=Decimal(price), customs_clearance=customs_clearance,
+                                   announcement_code=f'AC00000000000{index}')
+
+    def get_facets(self, **params):
+        response = self.client.get('/api/products/facets/', params).json()
+        self.assertTrue(response['ok'])
+        return response['result']
+
+    def test_counts_and_buckets(self):
+        facets = self.get_facets()
+        self.assertEqual(facets['category'], [{'value': 'sedan', 'count': 3}, {'value': 'truck', 'count': 1}])
+        self.assertEqual(facets['location'][0], {'value': self.poti.id, 'count': 2})
+        self.assertEqual(sorted(row['count'] for row in facets['location']), [1, 1, 2])
+        self.assertEqual(facets['customs_clearance'], [{'value': True, 'count': 3}, {'value': False, 'count': 1}])
+        self.assertEqual(facets['year'], [{'from': 2000, 'to': 2004, 'count': 2},
+                                          {'from': 2005, 'to': 2009, 'count': 1}])
+
+        prices = facets['price']
+        self.assertEqual(len(prices), 10)
+        self.assertEqual((prices[0]['from'], prices[-1]['to']), ('10.00', '110.00'))
+        self.assertEqual([row['count'] for row in prices], [1, 1, 1, 0, 0, 0, 0, 0, 0, 1])
+
+    def test_counts_follow_the_filters(self):
+        facets = self.get_facets(category='sedan', price_to='100')
+        self.assertEqual(facets['category'], [{'value': 'sedan', 'count': 2}])
+        self.assertEqual(facets['year'], [{'from': 2000, 'to': 2004, 'count': 2}])
+        prices = facets['price']
+        self.assertEqual(prices[0], {'from': '10.00', 'to': '11.00', 'count': 1})
+        self.assertEqual(prices[-1], {'from': '19.00', 'to': '20.00', 'count': 1})
+
+        facets = self.get_facets(category='bus')
+        self.assertEqual((facets['category'], facets['year'], facets['price']), ([], [], []))
+
+    def test_single_price_is_one_bucket(self):
+        facets = self.get_facets(category='truck')
+        self.assertEqual(facets['price'], [{'from': '30.00', 'to': '30.00', 'count': 1}])
+
+    def test_invalid_filters_are_reported(self):
+        response = self.client.get('/api/products/facets/', {'price_from': 'x'}).json()
+        self.assertEqual((response['ok'], list(response['errors'])), (False, ['price_from']))
+
+
+class RegistrationTestCase(TestCase):
+    def setUp(self):
+        User.objects.create(email='taken@example.com', name='taken', id_number='01001')
+
+    def register(self, **data):
+        return self.client.post('/api/user/register/', {
+            'email': 'new@example.com', 'name': 'new', 'password': 'password123', **data
+        }).json()
+
+    def test_registration_creates_the_user_and_token(self):
+        response = self.register(id_number='01002')
+        self.assertTrue(response['ok'])
+        user = User.objects.get(email='new@example.com')
+        self.assertEqual(response['result']['access_token'], Token.objects.get(user=user).key)
+        self.assertTrue(check_password('password123', user.password))
+
+    def test_unique_violations_are_field_errors(self):
+        for data, field in (({'email': 'taken@example.com'}, 'email'), ({'id_number': '01001'}, 'id_number')):
+            with self.subTest(field=field):
+                response = self.register(**data)
+                self.assertEqual((response['ok'], list(response['errors'])), (False, [field]))
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+        self.assertEqual(Token.objects.count(), 0)
+
+
+class BulkImportUsersTestCase(TestCase):
+    def setUp(self):
+        User.objects.create(email='taken@example.com', name='taken', id_number='01001')
+
+    def import_users(self, *rows, header='email,name,id_number,password,is_buyer', **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write('\n'.join((header,) + rows))
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('bulk_import_users', file.name, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_users_are_created_with_tokens(self):
+        password = make_password('password123')
+        stdout, stderr = self.import_users(
+            f'one@example.com,one,02001,{password},yes',
+            'two@example.com,,,,',
+            'TAKEN@example.com,taken again,,,',
+            'three@example.com,three,01001,,',
+            'ONE@example.com,duplicate,,,',
+            'four@example.com,four,,,1',
+            batch_size=2,
+        )
+        self.assertIn('3 users created, 3 skipped', stdout)
+        self.assertEqual(stderr.count('skipped'), 3)
+
+        users = {user.email: user for user in User.objects.filter(auth_token__isnull=False)}
+        self.assertEqual(sorted(users), ['four@example.com', 'one@example.com', 'two@example.com'])
+        self.assertTrue(check_password('password123', users['one@example.com'].password))
+        self.assertFalse(users['two@example.com'].has_usable_password())
+        self.assertEqual((users['one@example.com'].is_buyer, users['two@example.com'].is_buyer), (True, False))
+        self.assertEqual((users['two@example.com'].name, users['two@example.com'].id_number), ('name', None))
+
+    def test_invalid_rows_stop_the_import(self):
+        for rows, header in ((('one@example.com,one,,not-a-hash,',), None), ((',one,,,',), None),
+                             (('one@example.com',), 'email')):
+            with self.subTest(rows=rows), self.assertRaises(CommandError):
+                self.import_users(*rows, **({'header': header} if header else {}))
+        self.assertFalse(User.objects.filter(email='one@example.com').exists())
+
+
+class ProductViewsTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create(email='user@example.com', name='user')
+        self.products = [
+            Product.objects.create(user=user, name=f'product {index}', price=Decimal('1'), seen_count=index,
+                                   announcement_code=f'AC00000000000{index}')
+            for index in range(3)
+        ]
+        self.buffer = ViewCountBuffer(flush_interval=60)
+        patcher = mock.patch('base.views.product_views.product_views_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.buffer.stopped.set)
+
+    def test_views_are_flushed_as_increments(self):
+        for product, views in zip(self.products, (3, 1, 1)):
+            for _ in range(views):
+                response = self.client.get(f'/api/products/{product.pk}/')
+                self.assertEqual(response.json()['_id'], product.pk)
+        self.assertEqual(response.json()['seen_count'], 3)
+        self.assertEqual(self.buffer.pending_count(), 5)
+        # nothing is written on the request path
+        self.assertEqual(list(Product.objects.order_by('_id').values_list('seen_count', flat=True)), [0, 1, 2])
+
+        # one update per distinct count and table, and the savepoint around them
+        with self.assertNumQueries(6):
+            self.buffer.flush()
+        self.assertEqual(self.buffer.pending_count(), 0)
+        for model in (Product, ProductListing):
+            self.assertEqual(list(model.objects.order_by('_id').values_list('seen_count', flat=True)), [3, 2, 3])
+
+
+class ProductThumbnailsTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root.name, 'images'))
+        Image.new('RGB', (3000, 1500), 'red').save(os.path.join(media_root.name, 'images', 'car.jpg'))
+        self.user = User.objects.create(email='user@example.com', name='user')
+
+    def test_thumbnails_are_generated_after_commit(self):
+        with mock.patch.object(thumbnail_queue, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                product = Product.objects.create(user=self.user, name='car', price=Decimal('1'),
+                                                 image='images/car.jpg', announcement_code='AC000000000001')
+            schedule.assert_called_once()
+        # run the queued job here, it'd run on the queue's thread
+        function, *args = schedule.call_args.args
+        function(*args)
+
+        for model in (Product, ProductListing):
+            thumbnails = model.objects.get(_id=product.pk).image_thumbnails
+            self.assertEqual(thumbnails['source'], 'images/car.jpg')
+            self.assertEqual(set(thumbnails) - {'source'}, set(THUMBNAIL_SIZES))
+        with Image.open(os.path.join(settings.MEDIA_ROOT, thumbnails['card'])) as image:
+            self.assertEqual(image.size, (THUMBNAIL_SIZES['card'], THUMBNAIL_SIZES['card'] // 2))
+
+        # up to date thumbnails aren't generated again
+        with mock.patch.object(thumbnail_queue, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.get(_id=product.pk).save()
+        schedule.assert_not_called()
+
+
+class BulkProductsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user')
+        self.other = User.objects.create(email='other@example.com', name='other')
+        self.location = Location.objects.create(name='Poti')
+        self.live_location = LiveLocation.objects.create(name='Batumi')
+        self.product_list = ProductList.objects.create(name='Cars')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def item(self, index, **fields):
+        return {'name': f'product {index}', 'price': '10.00', 'product_list': self.product_list.id,
+                'location': self.location.id, 'live_location': self.live_location.id, **fields}
+
+    def create_products(self, user, count):
+        return [Product.objects.create(user=user, name=f'product {index}', price=Decimal('1'),
+                                       announcement_code=f'AC10000000000{index}') for index in range(count)]
+
+    def test_create(self):
+        with mock.patch('base.bulk.generate_announcement_code',
+                        side_effect=['AC000000000001', 'AC000000000002', 'AC000000000003', 'AC000000000004']):
+            Product.objects.create(user=self.other, name='taken', price=Decimal('1'),
+                                   announcement_code='AC000000000002')
+            response = self.client.post('/api/user/products/bulk/', [self.item(0), self.item(1), self.item(2)],
+                                        format='json').json()
+        self.assertTrue(response['ok'])
+        products = Product.objects.filter(user=self.user).order_by('_id')
+        self.assertEqual([product['_id'] for product in response['result']], [product.pk for product in products])
+        # the taken code is replaced by a fresh one
+        self.assertEqual(sorted(product.announcement_code for product in products),
+                         ['AC000000000001', 'AC000000000003', 'AC000000000004'])
+        listings = ProductListing.objects.filter(user_id=self.user.id).order_by('_id')
+        self.assertEqual(list(listings.values_list('name', 'location_name')),
+                         [(f'product {index}', 'Poti') for index in range(3)])
+
+    def test_create_without_returned_ids(self):
+        bulk_create = Product.objects.bulk_create
+
+        def bulk_create_without_ids(products):
+            # what mysql gives back
+            bulk_create(products)
+            for product in products:
+                product._id = None
+            return products
+
+        with mock.patch.object(Product.objects, 'bulk_create', bulk_create_without_ids):
+            response = self.client.post('/api/user/products/bulk/', [self.item(0), self.item(1)],
+                                        format='json').json()
+        ids = list(Product.objects.filter(user=self.user).order_by('_id').values_list('_id', flat=True))
+        self.assertEqual(sorted(product['_id'] for product in response['result']), ids)
+        self.assertEqual(ProductListing.objects.filter(_id__in=ids).count(), 2)
+
+    def test_create_reports_errors_by_index(self):
+        items = [self.item(0), self.item(1, price='x', location=0), self.item(2), self.item(3, name='')]
+        response = self.client.post('/api/user/products/bulk/', items, format='json').json()
+        self.assertFalse(response['ok'])
+        self.assertEqual(sorted(response['errors']), ['1', '3'])
+        self.assertEqual(sorted(response['errors']['1']), ['location', 'price'])
+        self.assertEqual(list(response['errors']['3']), ['name'])
+        self.assertFalse(Product.objects.filter(user=self.user).exists())
+
+        for items in ({}, [], [self.item(0)] * 501):
+            response = self.client.post('/api/user/products/bulk/', items, format='json').json()
+            self.assertEqual(list(response['errors']), ['non_field_errors'])
+
+    def test_update(self):
+        products = self.create_products(self.user, 2)
+        response = self.client.patch('/api/user/products/bulk/', [
+            {'_id': products[0].pk, 'name': 'renamed', 'location': self.location.id},
+            {'_id': str(products[1].pk), 'price': '20.50'},
+        ], format='json').json()
+        self.assertTrue(response['ok'])
+        self.assertEqual(
+            list(ProductListing.objects.order_by('_id').values_list('name', 'price', 'location_name')),
+            [('renamed', Decimal('1'), 'Poti'), ('product 1', Decimal('20.5'), None)]
+        )
+
+    def test_update_reports_invalid_and_unknown_ids(self):
+        products = self.create_products(self.user, 1)
+        other_product = self.create_products(self.other, 2)[1]
+        response = self.client.patch('/api/user/products/bulk/', [
+            {'_id': products[0].pk, 'name': 'renamed'},
+            {'_id': 'x'},
+            {'name': 'no id'},
+            {'_id': other_product.pk},
+            {'_id': products[0].pk + 1000},
+        ], format='json').json()
+        self.assertFalse(response['ok'])
+        self.assertEqual(response['errors'], {
+            '1': {'_id': 'A valid integer is required.'},
+            '2': {'_id': 'This field is required.'},
+            '3': {'_id': 'Product not found'},
+            '4': {'_id': 'Product not found'},
+        })
+        self.assertEqual(Product.objects.get(_id=products[0].pk).name, 'product 0')
+
+
+class ProductSearchPaginationTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create(email='user@example.com', name='user')
+        for index, seen_count in enumerate((3, 1, 3, 2)):
+            Product.objects.create(user=user, name=f'product {index}', price=Decimal('1'), seen_count=seen_count,
+                                   announcement_code=f'AC00000000000{index}')
+
+    def paginate(self, queryset, **params):
+        pagination = ProductCursorPagination()
+        flat_serializer = FlatProductListingSerializer()
+        request = Request(APIRequestFactory().get('/api/products/all/', params))
+        rows = pagination.paginate_queryset(flat_serializer.values(queryset), request)
+        return [row['_id'] for row in rows], pagination.get_next_link()
+
+    def test_ranked_results_keep_rank_order_across_pages(self):
+        # stands in for the rank the postgres and mysql backends annotate
+        ranked = ProductListing.objects.annotate(search_rank=F('seen_count'))
+        expected = list(ranked.order_by('-search_rank', '-_id').values_list('_id', flat=True))
+
+        ids, next_link = self.paginate(ranked, page_size=3)
+        cursor = parse_qs(urlsplit(next_link).query)['cursor'][0]
+        next_ids, next_link = self.paginate(ranked, page_size=3, cursor=cursor)
+        self.assertEqual(ids + next_ids, expected)
+        self.assertIsNone(next_link)
+
+        ids, _ = self.paginate(ranked, page_size=4, ordering='price')
+        self.assertEqual(ids, list(ProductListing.objects.order_by('price', '_id').values_list('_id', flat=True)))
+
+    def test_tampered_cursors_are_rejected(self):
+        def encode(**payload):
+            return b64encode(json.dumps({'o': '-created_at', 'r': False, **payload}).encode()).decode()
+
+        cursors = [
+            ('price', encode(o='price', v='abc', k=1)),
+            ('-created_at', encode(v='abc', k=1)),
+            ('-created_at', encode(v='2026-01-01T00:00:00+00:00', k='x')),
+            ('-created_at', encode(v=None, k=None)),
+            ('-created_at', encode(v=None, k=1)),
+            ('-created_at', encode(v=[], k=1)),
+            ('-created_at', 'not base64'),
+            # a cursor of another ordering
+            ('price', encode(v='2026-01-01T00:00:00+00:00', k=1)),
+        ]
+        for ordering, cursor in cursors:
+            with self.subTest(ordering=ordering, cursor=cursor):
+                response = self.client.get('/api/products/all/', {'ordering': ordering, 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+        response = self.client.get('/api/products/all/', {'ordering': 'price', 'cursor': encode(o='price', v='1', k=1)})
+        self.assertEqual(response.status_code, 200)
+
+
+class FollowCountsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user')
+        self.other = User.objects.create(email='other@example.com', name='other')
+        self.client = APIClient()
+        # the same instance on every request, like a cached authentication
+        self.client.force_authenticate(self.user)
+
+    def test_profile_updates_keep_follow_counts(self):
+        response = self.client.post(f'/api/user/follow/{self.other.id}/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.put('/api/user/profile/', {'name': 'renamed'}, format='json')
+        self.assertTrue(response.json()['ok'])
+        response = self.client.put('/api/user/credentials/', {'password': 'new password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual((user.name, user.following_count), ('renamed', 1))
+        self.assertEqual(User.objects.get(id=self.other.id).followers_count, 1)
+
+    def test_cached_token_users_read_follow_counts_from_the_database(self):
+        key = Token.objects.create(user=self.user).key
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(key)
+        follow_user(self.other, self.user.id)
+
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate_credentials(key)
+        self.assertEqual(user.followers_count, 1)
+        user, _ = authentication.authenticate_credentials(key)
+        user.name = 'renamed'
+        user.save()
+        self.assertEqual(User.objects.get(id=self.user.id).followers_count, 1)
+
+
+class RecommendationsTestCase(TestCase):
+    def setUp(self):
+        self.user, self.first, self.second, self.third = [
+            User.objects.create(email=f'user{index}@example.com', name=f'user{index}') for index in range(4)
+        ]
+        for follower, user in ((self.first, self.second), (self.first, self.third), (self.second, self.third)):
+            follow_user(follower, user.id)
+        # run the queued refreshes right away, and leave the home feeds out
+        for patcher in (mock.patch.object(recommendations_queue, 'schedule', lambda function, *args: function(*args)),
+                        mock.patch('posts.feed.fan_out_queue.schedule')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_recommendations(self):
+        return set(UserRecommendation.objects.filter(user=self.user).values_list('candidate_id', 'mutual_count'))
+
+    def test_follows_refresh_the_recommendations_like_the_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_user(self.user, self.first.id)
+        expected = {(self.second.id, 1), (self.third.id, 1)}
+        self.assertEqual(self.get_recommendations(), expected)
+
+        UserRecommendation.objects.all().delete()
+        rebuild_recommendations()
+        self.assertEqual(self.get_recommendations(), expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_user(self.user, self.second.id)
+        self.assertEqual(self.get_recommendations(), {(self.third.id, 2)})
+
+    @override_settings(USER_RECOMMENDATIONS_REFRESH_MAX_PATHS=2)
+    def test_users_with_many_two_hop_follows_are_left_to_the_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_user(self.user, self.first.id)
+        self.assertEqual(len(self.get_recommendations()), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_user(self.user, self.second.id)
+        self.assertFalse(refresh_user_recommendations(self.user.id))
+        self.assertEqual(len(self.get_recommendations()), 2)
+
+
+class SocialGraphTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user')
+        self.other = User.objects.create(email='other@example.com', name='other')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'social_graph.csr')
+        compact_social_graph(self.path)
+        # never polls during the test, like a worker that hasn't caught up yet
+        self.graph = SocialGraph(self.path, poll_interval=3600, own_writes_timeout=60)
+        self.addCleanup(lambda: self.graph.stopped.set())
+        cache.clear()
+
+    def test_own_follows_are_seen_before_the_next_poll(self):
+        self.assertFalse(self.graph.is_following(self.user.id, self.other.id))
+        follow_user(self.user, self.other.id)
+        self.assertTrue(self.graph.is_following(self.user.id, self.other.id))
+        self.assertFalse(self.graph.is_following(self.other.id, self.user.id))
+        unfollow_user(self.user, self.other.id)
+        self.assertFalse(self.graph.is_following(self.user.id, self.other.id))
+
+    def test_other_lookups_read_memory_only(self):
+        self.assertFalse(self.graph.is_following(self.user.id, self.other.id))
+        follow_user(self.user, self.other.id)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.graph.is_following(self.other.id, self.user.id))
+        # once the own writes expire, the follow is seen from the next poll on
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertFalse(self.graph.is_following(self.user.id, self.other.id))
+        self.graph.poll()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.graph.is_following(self.user.id, self.other.id))
+
+    def test_follow_lists_read_the_graph(self):
+        users = [User.objects.create(email=f'user{index}@example.com', name=f'user{index}') for index in range(3)]
+        for user in users:
+            follow_user(self.user, user.id)
+            follow_user(user, self.other.id)
+        compact_social_graph(self.path)
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        expected = sorted(user.id for user in users)
+        # opens the graph file
+        self.graph.followers(self.other.id)
+        with mock.patch('base.views.user_views.social_graph', self.graph):
+            for url in (f'/api/user/{self.user.id}/following/', f'/api/user/{self.other.id}/followers/'):
+                with self.subTest(url=url), self.assertNumQueries(1):
+                    self.assertEqual([user['id'] for user in client.get(url).json()], expected)
+
+            # the own writes of the user are read from the table
+            unfollow_user(self.user, users[0].id)
+            response = client.get(f'/api/user/{self.user.id}/following/')
+            self.assertEqual(sorted(user['id'] for user in response.json()), expected[1:])
+
+
+class PasswordHashingSlotsTestCase(TestCase):
+    def test_hashing_past_the_slots_is_rejected(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # two instances stand for two worker processes of the same host
+        slots, other_worker_slots = PasswordHashingSlots(directory.name, 1), PasswordHashingSlots(directory.name, 1)
+        with slots.acquire():
+            with self.assertRaises(Throttled):
+                with other_worker_slots.acquire():
+                    pass
+        with other_worker_slots.acquire():
+            self.assertEqual(other_worker_slots.in_flight, 1)
+
+    def test_queued_hashing_waits_for_a_slot(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        workers = [PasswordHashingSlots(directory.name, 1, queue_size=1, timeout=5) for _ in range(3)]
+        acquired = threading.Event()
+
+        def wait_for_the_slot():
+            with workers[1].acquire():
+                acquired.set()
+
+        with workers[0].acquire():
+            thread = threading.Thread(target=wait_for_the_slot)
+            thread.start()
+            while not workers[1].waiting:
+                time.sleep(0.001)
+            # the queue is full
+            with self.assertRaises(Throttled):
+                with workers[2].acquire():
+                    pass
+            self.assertFalse(acquired.is_set())
+        thread.join()
+        self.assertTrue(acquired.is_set())
+
+    def test_waiting_past_the_timeout_is_rejected(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        slots = PasswordHashingSlots(directory.name, 1, queue_size=1, timeout=0.05)
+        other_worker_slots = PasswordHashingSlots(directory.name, 1, queue_size=1, timeout=0.05)
+        with slots.acquire():
+            with self.assertRaises(Throttled):
+                with other_worker_slots.acquire():
+                    pass
+            self.assertEqual(other_worker_slots.waiting, 0)
+
+
+class DefaultRelationsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user', is_provider=True)
+        self.buyer = User.objects.create(email='buyer@example.com', name='buyer', is_buyer=True)
+        self.product = Product.objects.create(
+            user=self.user, name='full', price=Decimal('10.5'), announcement_code='AC000000000001',
+            buyer=self.buyer, provider=self.user, transiter=self.buyer,
+            location=Location.objects.create(name='Poti'),
+            live_location=LiveLocation.objects.create(name='Batumi'),
+            product_list=ProductList.objects.create(name='Cars'),
+        )
+        for index in range(3):
+            other = User.objects.create(email=f'other{index}@example.com', name=f'other {index}')
+            UserFollowers.objects.create(user=self.user, follower=other)
+            UserFollowers.objects.create(user=other, follower=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_product_views_queries(self):
+        for url in (f'/api/user/products/{self.product.pk}/', f'/api/products/{self.product.pk}/'):
+            with self.subTest(url=url), self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_follow_views_queries(self):
+        for url in (f'/api/user/{self.user.id}/following/', f'/api/user/{self.user.id}/followers/'):
+            with self.subTest(url=url), self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(len(response.json()), 3)
+
+    def test_bare_drops_default_relations(self):
+        self.assertTrue(Product.objects.all().query.select_related)
+        self.assertFalse(Product.objects.bare().query.select_related)
+
+    def test_check_rejects_invalid_default_relations(self):
+        self.assertEqual(Product.check(), [])
+        select_related = Product.get_default_select_related_fields
+        try:
+            Product.get_default_select_related_fields = classmethod(lambda cls: ['user', 'user__followers', 'name'])
+            self.assertEqual([error.id for error in Product.check()], ['base.E001', 'base.E001'])
+        finally:
+            Product.get_default_select_related_fields = select_related
+
+
+class FollowListsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user')
+        for index in range(3):
+            other = User.objects.create(email=f'other{index}@example.com', name=f'other {index}')
+            UserFollowers.objects.create(user=self.user, follower=other)
+            UserFollowers.objects.create(user=other, follower=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @mock.patch.object(CreatedAtCursorPagination, 'page_size', 2)
+    @mock.patch.object(CreatedAtCursorPagination, 'max_page_size', 2)
+    def test_legacy_lists_stay_complete(self):
+        response = self.client.get(f'/api/user/{self.user.id}/followers/')
+        self.assertEqual(len(response.json()), 3)
+        self.assertNotIn('Link', response)
+
+        response = self.client.get(f'/api/user/{self.user.id}/followers/', {'page_size': 5})
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNotNone(response.json()['next'])
+
+    @mock.patch.object(CreatedAtCursorPagination, 'legacy_limit', 2)
+    def test_capped_legacy_list_links_the_next_page(self):
+        response = self.client.get(f'/api/user/{self.user.id}/followers/')
+        self.assertEqual(len(response.json()), 2)
+        next_link = response['Link'].split('>')[0].lstrip('<')
+
+        response = self.client.get(next_link)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNone(response.json()['next'])
+
+    def test_recommendations_skip_users_the_viewer_follows(self):
+        followed, other = User.objects.filter(email__startswith='other')[:2]
+        viewer = User.objects.create(email='viewer@example.com', name='viewer')
+        UserFollowers.objects.create(user=followed, follower=viewer)
+        for candidate, score in ((followed, 2), (other, 1), (viewer, 3)):
+            UserRecommendation.objects.create(user=self.user, candidate=candidate, score=score, mutual_count=1)
+
+        self.client.force_authenticate(viewer)
+        response = self.client.get(f'/api/user/{self.user.id}/recommended/')
+        self.assertEqual([user['id'] for user in response.json()], [other.id])
+
+
+class UserTypeaheadTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user')
+        for index in range(3):
+            User.objects.create(email=f'other{index}@example.com', name=f'other {index}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_user_typeahead_requires_authentication(self):
+        url = '/api/general/typeahead/users/?query=other&limit=2'
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('other0@example.com', response.content.decode())
+
+        response = self.client.get(url)
+        self.assertEqual([user['email'] for user in response.json()['result']],
+                         ['other0@example.com', 'other1@example.com'])
@@ -0,0 +1,76 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from base.background import BackgroundQueue
+from base.models import Product, ProductListing
+
+THUMBNAIL_DIR = 'thumbnails'
+# name -> bounding box of the derived image
+THUMBNAIL_SIZES = {
+    'card': 320,
+    'detail': 1024,
+    'retina': 2048,
+}
+
+
+def generate_thumbnails(source_path, output_dir):
+    """
+    Writes every size of `source_path` into `output_dir` under names derived
+    from the content hash, so a name never points to different bytes and can
+    be cached forever. It doesn't touch the database, so the
+    `generate_thumbnails` command runs it in worker processes.
+    """
+    from PIL import Image, ImageOps
+
+    with open(source_path, 'rb') as file:
+        digest = hashlib.sha256(file.read()).hexdigest()[:16]
+
+    os.makedirs(output_dir, exist_ok=True)
+    names = {}
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for size, box in THUMBNAIL_SIZES.items():
+            name = f'{digest}_{size}.jpg'
+            path = os.path.join(output_dir, name)
+            if not os.path.exists(path):
+                thumbnail = image.copy()
+                thumbnail.thumbnail((box, box), Image.LANCZOS)
+                thumbnail.save(path + '.tmp', format='JPEG', quality=85, optimize=True, progressive=True)
+                os.replace(path + '.tmp', path)
+            names[size] = f'{THUMBNAIL_DIR}/{name}'
+    return names
+
+
+def get_thumbnail_urls(thumbnails):
+    if not thumbnails:
+        return {}
+    return {
+        size: settings.DOMAIN_URL + default_storage.url(thumbnails[size])
+        for size in THUMBNAIL_SIZES if size in thumbnails
+    }
+
+
+def needs_thumbnails(image_name, thumbnails):
+    default_image = Product._meta.get_field('image').default
+    return bool(image_name) and image_name != default_image \
+        and (thumbnails or {}).get('source') != image_name
+
+
+def save_thumbnails(product_id, image_name, names):
+    thumbnails = dict(names, source=image_name)
+    for model in (Product, ProductListing):
+        # the image may have been replaced while the thumbnails were generated
+        model.objects.filter(_id=product_id, image=image_name).update(image_thumbnails=thumbnails)
+
+
+def generate_product_thumbnails(product_id, image_name):
+    names = generate_thumbnails(default_storage.path(image_name), default_storage.path(THUMBNAIL_DIR))
+    save_thumbnails(product_id, image_name, names)
+
+
+# thumbnails of saved products are generated off the request path, one at a
+# time, `generate_thumbnails` backfills the existing ones
+thumbnail_queue = BackgroundQueue('thumbnails')
@@ -0,0 +1,104 @@
+import sys
+
+from django.db import connections
+from django.db.models import TextField
+from django.db.models.functions import Cast, Collate, Upper
+
+from base.models import User, ProductListing
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+USER_ROLES = ('is_provider', 'is_buyer', 'is_transiter')
+
+
+def get_prefix_upper_bound(prefix):
+    """
+    The smallest string greater than every string starting with `prefix`, in
+    code point order. `None` when there is none.
+    """
+    for index in reversed(range(len(prefix))):
+        if ord(prefix[index]) < sys.maxunicode:
+            return prefix[:index] + chr(ord(prefix[index]) + 1)
+    return None
+
+
+class BaseTypeaheadBackend:
+    """
+    Fallback backend, a case-insensitive prefix match that isn't index backed.
+    """
+
+    def prefix(self, queryset, field, value, *tie_breakers):
+        """
+        Filters the rows whose `field` starts with `value`, ignoring case, and
+        orders them by that column, then by `tie_breakers`.
+        """
+        return queryset.filter(**{f'{field}__istartswith': value}).order_by(Upper(field), *tie_breakers)
+
+
+class PostgresTypeaheadBackend(BaseTypeaheadBackend):
+    """
+    Matches a range over `UPPER(column)` in the "C" collation, where prefixes
+    are contiguous, so the expression index `0032_typeahead_indexes` creates
+    serves both the filter and the `ORDER BY ... LIMIT`.
+    """
+    collation = 'C'
+
+    def key(self, field):
+        return Collate(Upper(Cast(field, output_field=TextField())), self.collation)
+
+    def prefix(self, queryset, field, value, *tie_breakers):
+        alias = f'_{field}_prefix'
+        lower_bound = value.upper()
+        upper_bound = get_prefix_upper_bound(lower_bound)
+        queryset = queryset.alias(**{alias: self.key(field)}).filter(**{f'{alias}__gte': lower_bound})
+        if upper_bound is not None:
+            queryset = queryset.filter(**{f'{alias}__lt': upper_bound})
+        return queryset.order_by(alias, *tie_breakers)
+
+
+class MySQLTypeaheadBackend(BaseTypeaheadBackend):
+    """
+    Columns use case-insensitive collations, so a plain `LIKE 'x%'` over a
+    BTREE index on the column is already a prefix range scan. InnoDB appends
+    the primary key to secondary indexes, which keeps the ordering stable.
+    """
+
+    def prefix(self, queryset, field, value, *tie_breakers):
+        return queryset.filter(**{f'{field}__istartswith': value}).order_by(field, *tie_breakers)
+
+
+TYPEAHEAD_BACKENDS = {
+    'postgresql': PostgresTypeaheadBackend,
+    'mysql': MySQLTypeaheadBackend,
+}
+
+
+def get_typeahead_backend(queryset):
+    """
+    The backend of the database `queryset` reads from.
+    """
+    vendor = connections[queryset.db].vendor
+    return TYPEAHEAD_BACKENDS.get(vendor, BaseTypeaheadBackend)()
+
+
+def suggest_users(value, roles=(), limit=DEFAULT_LIMIT):
+    """
+    Users whose name, then email, starts with `value`. Every column is a
+    separate `LIMIT` query on its own index.
+    """
+    queryset = User.objects.filter(**{role: True for role in roles})
+    backend = get_typeahead_backend(queryset)
+    users = {}
+    for field in ('name', 'email'):
+        for user in backend.prefix(queryset, field, value, 'pk')[:limit]:
+            users.setdefault(user.pk, user)
+    return list(users.values())[:limit]
+
+
+def suggest_product_names(value, limit=DEFAULT_LIMIT):
+    queryset = ProductListing.objects.all()
+    names = get_typeahead_backend(queryset).prefix(queryset, 'name', value) \
+        .values_list('name', flat=True) \
+        .distinct()
+    return list(names[:limit])
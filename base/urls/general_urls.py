@@ -1,9 +1,13 @@
 from django.urls import path
 
-from base.views.general_views import ProvidersAPIView, BuyersAPIView, TransitersAPIView
+from base.views.general_views import ProvidersAPIView, BuyersAPIView, TransitersAPIView, MetricsAPIView, \
+    UserTypeaheadAPIView, ProductTypeaheadAPIView
 
 urlpatterns = [
     path('buyers/', BuyersAPIView.as_view(), name="buyers"),
     path('providers/', ProvidersAPIView.as_view(), name="providers"),
     path('transiters/', TransitersAPIView.as_view(), name="transiters"),
+    path('metrics/', MetricsAPIView.as_view(), name="metrics"),
+    path('typeahead/users/', UserTypeaheadAPIView.as_view(), name="typeahead_users"),
+    path('typeahead/products/', ProductTypeaheadAPIView.as_view(), name="typeahead_products"),
 ]
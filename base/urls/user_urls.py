@@ -7,6 +7,7 @@ urlpatterns = [
     path('login/', views.login, name='login'),
     path('register/', views.register_user, name='register'),
     path('products/', views.ListCreateProductsAPIView.as_view(), name="create_get_products"),
+    path('products/bulk/', views.BulkProductsAPIView.as_view(), name="bulk_products"),
     path('products/<str:pk>/', views.ProductAPIView.as_view(), name="get_update_delete_product"),
     path('posts/', views.UserPostsCreateAPIView.as_view(), name="user_create_post"),
     path('posts/<str:pk>/', views.UserPostsAPIView.as_view(), name="user_posts"),
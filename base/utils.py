@@ -8,3 +8,14 @@ def normalize_serializer_errors(errors: Dict[str, List[ErrorDetail]]):
         field: str(errors_list[0] if len(errors_list) else None)
         for field, errors_list in errors.items()
     }
+
+
+def parse_positive_int(value, cutoff=None):
+    """
+    `value` as an integer above zero, capped to `cutoff`. Raises `ValueError`
+    for anything else.
+    """
+    number = int(value)
+    if number <= 0:
+        raise ValueError(value)
+    return min(number, cutoff) if cutoff else number
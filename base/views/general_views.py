@@ -1,45 +1,94 @@
+import os
+
+from django.conf import settings
+from django.views.static import serve
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from base import metrics, typeahead
 
 from base.filters import UsersFilter
 from base.models import User
 from base.serializers import UserSerializer
+from base.thumbnails import THUMBNAIL_DIR
+from base.utils import parse_positive_int
 
 
-class ProvidersAPIView(ListAPIView):
+class RoleUsersAPIView(ListAPIView):
     serializer_class = UserSerializer
-    queryset = User.objects.filter(is_provider=True)
     filter_backends = [DjangoFilterBackend]
     filterset_class = UsersFilter
+    # pickers only show the first matches, like the typeahead
+    limit = 5
 
-    def finalize_response(self, request, response, *args, **kwargs):
-        response = super().finalize_response(request, response, *args, **kwargs)
-        # TODO Use pagination
-        response.data = response.data[:5]
-        return response
+    def filter_queryset(self, queryset):
+        return super().filter_queryset(queryset)[:self.limit]
 
 
-class BuyersAPIView(ListAPIView):
-    serializer_class = UserSerializer
-    queryset = User.objects.filter(is_buyer=True)
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = UsersFilter
+class ProvidersAPIView(RoleUsersAPIView):
+    queryset = User.objects.filter(is_provider=True)
 
-    def finalize_response(self, request, response, *args, **kwargs):
-        response = super().finalize_response(request, response, *args, **kwargs)
-        # TODO Use pagination
-        response.data = response.data[:5]
-        return response
 
+class BuyersAPIView(RoleUsersAPIView):
+    queryset = User.objects.filter(is_buyer=True)
 
-class TransitersAPIView(ListAPIView):
-    serializer_class = UserSerializer
+
+class TransitersAPIView(RoleUsersAPIView):
     queryset = User.objects.filter(is_transiter=True)
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = UsersFilter
 
-    def finalize_response(self, request, response, *args, **kwargs):
-        response = super().finalize_response(request, response, *args, **kwargs)
-        # TODO Use pagination
-        response.data = response.data[:5]
-        return response
+
+def get_typeahead_limit(request):
+    try:
+        return parse_positive_int(request.query_params['limit'], cutoff=typeahead.MAX_LIMIT)
+    except (KeyError, ValueError):
+        return typeahead.DEFAULT_LIMIT
+
+
+class UserTypeaheadAPIView(APIView):
+    """
+    Users whose name or email starts with `query`, optionally only the ones
+    with the given roles (`?is_provider=true`).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('query', '').strip()
+        roles = [role for role in typeahead.USER_ROLES if request.query_params.get(role) in ('true', '1')]
+        users = typeahead.suggest_users(query, roles, get_typeahead_limit(request)) if query else []
+        return Response({
+            'ok': True,
+            'result': UserSerializer(users, many=True).data,
+        })
+
+
+class ProductTypeaheadAPIView(APIView):
+    """
+    Distinct product names starting with `query`, public like the product list.
+    """
+
+    def get(self, request):
+        query = request.query_params.get('query', '').strip()
+        names = typeahead.suggest_product_names(query, get_typeahead_limit(request)) if query else []
+        return Response({
+            'ok': True,
+            'result': names,
+        })
+
+
+class MetricsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'ok': True,
+            'result': metrics.snapshot(),
+        })
+
+
+def serve_thumbnail(request, path):
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, THUMBNAIL_DIR))
+    response['Cache-Control'] = f'public, max-age={settings.THUMBNAIL_CACHE_MAX_AGE}, immutable'
+    return response
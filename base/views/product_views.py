@@ -11,41 +11,76 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from base.cache import product_settings_cache
+from base.counters import product_views_buffer
+from base.facets import get_product_facets
 from base.filters import ProductsFilter
 from base.models import *
-from base.serializers import ProductSerializer, ProductSettingsSerializer
+from base.pagination import ProductCursorPagination
+from base.serializers import ProductSerializer, FlatProductSerializer, FlatProductListingSerializer
+from django.utils.cache import parse_etags
 from django.utils.translation import gettext as _
 
 from base.utils import normalize_serializer_errors
 
 
+class FlatProductListMixin:
+    """
+    Serves `list` through `FlatProductSerializer`, the response is the same
+    as the one `ProductSerializer` would produce.
+    """
+    flat_serializer_class = FlatProductSerializer
+    _flat_serializers = {}
+
+    def get_flat_serializer(self):
+        serializer_class = self.flat_serializer_class
+        if serializer_class not in self._flat_serializers:
+            self._flat_serializers[serializer_class] = serializer_class()
+        return self._flat_serializers[serializer_class]
+
+    def list(self, request, *args, **kwargs):
+        flat_serializer = self.get_flat_serializer()
+        queryset = flat_serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(flat_serializer.serialize(page))
+        return Response(flat_serializer.serialize(queryset))
+
+
 # Get all the products with query
 
-class GetAllProductsAPIView(generics.ListAPIView):
+class GetAllProductsAPIView(FlatProductListMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
-    queryset = Product.objects.order_by('-created_at')
+    flat_serializer_class = FlatProductListingSerializer
+    queryset = ProductListing.objects.order_by('-created_at')
     permission_classes = []
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProductsFilter
+    pagination_class = ProductCursorPagination
 
-    def get_queryset(self):
-        return self.queryset.select_related(
-            'user', 'buyer', 'provider', 'transiter',
-            'location', 'live_location', 'product_list'
-        )
+
+class ProductFacetsAPIView(APIView):
+    permission_classes = []
+
+    def get(self, request):
+        filterset = ProductsFilter(request.query_params, queryset=ProductListing.objects.all(), request=request)
+        if not filterset.is_valid():
+            return Response({
+                'ok': False,
+                'errors': normalize_serializer_errors(filterset.errors),
+            })
+        return Response({
+            'ok': True,
+            'result': get_product_facets(filterset),
+        })
 
 
 class GetProductAPIView(generics.RetrieveAPIView):
     serializer_class = ProductSerializer
-    queryset = Product.objects
+    queryset = Product.objects.all()
     permission_classes = []
 
-    def get_queryset(self):
-        return self.queryset.select_related(
-            'user', 'buyer', 'provider', 'transiter',
-            'location', 'live_location', 'product_list'
-        )
-
     def retrieve(self, request, *args, **kwargs):
         product = self.get_queryset().filter(_id=self.kwargs.get('pk')).first()
         if not product:
@@ -55,8 +90,8 @@ class GetProductAPIView(generics.RetrieveAPIView):
                     'non_field_errors': [_('Product not found')]
                 },
             })
+        product_views_buffer.increment(product.pk)
         product.seen_count += 1
-        product.save()
         return Response({
             'ok': True,
             'result': ProductSerializer(product).data,
@@ -64,11 +99,19 @@ class GetProductAPIView(generics.RetrieveAPIView):
 
 
 class ProductSettingsAPIView(APIView):
+    # public data, skipping authentication keeps the cached path free of queries
+    authentication_classes = []
+    permission_classes = []
+
     def get(self, request):
+        payload, etag = product_settings_cache.get()
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
         return Response({
             'ok': True,
-            'result': ProductSettingsSerializer().to_representation({}),
-        })
+            'result': payload,
+        }, headers=headers)
 
     # Update single products
 
@@ -77,13 +120,14 @@ class GetProductDetailsAPIVIew(generics.RetrieveAPIView):
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
 
-    def get_queryset(self):
-        return self.queryset.select_related(
-            'user', 'buyer', 'provider', 'transiter',
-            'location', 'live_location', 'product_list'
-        )
-
     def get_object(self):
         return self.get_queryset().filter(
             _id=self.kwargs.get('pk'),
-        ).first()
\ No newline at end of file
+        ).first()
+
+    def retrieve(self, request, *args, **kwargs):
+        product = self.get_object()
+        if product is not None:
+            product_views_buffer.increment(product.pk)
+            product.seen_count += 1
+        return Response(self.get_serializer(product).data)
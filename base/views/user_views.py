@@ -1,20 +1,28 @@
 # Django Import
 import rest_framework.generics
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django_filters.rest_framework import DjangoFilterBackend
 
 # Rest Framework Import
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.views import APIView
 
-from base.models import User, Product, UserFollowers
+from base.bulk import bulk_create_products, bulk_update_products
+from base.follows import follow_user, unfollow_user
+from base.models import User, Product, UserFollowers, ProductListing, UserRecommendation
+from base.pagination import ProductCursorPagination, CreatedAtCursorPagination, RecommendedUsersPagination
+from base.views.product_views import FlatProductListMixin
 # Local Import
 from base.serializers import UserSerializer, UserRegistrationSerializer, LoginSerializer, \
-    ProductSerializer, UserProfileDetailsSerializer, UserProfileUpdateSerializer, UserCredentialsUpdateSerializer
-from base.utils import normalize_serializer_errors
+    ProductSerializer, UserProfileDetailsSerializer, UserProfileUpdateSerializer, UserCredentialsUpdateSerializer, \
+    FlatProductListingSerializer
+from base.social_graph import social_graph
+from base.utils import normalize_serializer_errors, parse_positive_int
 from django.utils.translation import gettext as _
 
 from base.filters import UsersFilter
@@ -56,7 +64,13 @@ def register_user(request):
     data = request.data
     serializer = UserRegistrationSerializer(data=data)
     if serializer.is_valid():
-        serializer.save()
+        try:
+            serializer.save()
+        except ValidationError as e:
+            return Response({
+                'ok': False,
+                'errors': normalize_serializer_errors(e.detail)
+            })
         return Response({
             'ok': True,
             'result': {
@@ -107,10 +121,7 @@ class ProductAPIView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.order_by('-created_at').all()
 
     def get_queryset(self):
-        return self.queryset.select_related(
-            'user', 'buyer', 'provider', 'transiter',
-            'location', 'live_location', 'product_list'
-        ).filter(user=self.request.user)
+        return self.queryset.filter(user=self.request.user)
 
     def get_object(self):
         # TODO if records doesn't exist it returns null which causes errors later, (null.delete())
@@ -126,11 +137,57 @@ class ProductAPIView(generics.RetrieveUpdateDestroyAPIView):
         serializer.save(user=self.request.user)
 
 
-class ListCreateProductsAPIView(generics.ListAPIView, generics.CreateAPIView, ProductAPIView):
+class ListCreateProductsAPIView(FlatProductListMixin, generics.ListAPIView, generics.CreateAPIView, ProductAPIView):
+    pagination_class = ProductCursorPagination
+    flat_serializer_class = FlatProductListingSerializer
+
+    def get_queryset(self):
+        return ProductListing.objects.filter(user_id=self.request.user.id).order_by('-created_at')
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
+class BulkProductsAPIView(APIView):
+    """
+    Creates (POST) or updates (PATCH, items identified by `_id`) a list of
+    products in one transaction. Either every item is written, or the
+    response lists the errors of the invalid items by their index.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return self.write(request, bulk_create_products)
+
+    def patch(self, request):
+        return self.write(request, bulk_update_products)
+
+    def write(self, request, bulk_write):
+        items = request.data
+        max_items = settings.PRODUCT_BULK_MAX_ITEMS
+        if not isinstance(items, list) or not 0 < len(items) <= max_items:
+            return Response({
+                'ok': False,
+                'errors': {
+                    'non_field_errors': [_('Expected a list of 1 to %(max_items)d products') % {
+                        'max_items': max_items
+                    }]
+                }
+            })
+
+        products, errors = bulk_write(items, request.user)
+        if errors:
+            return Response({
+                'ok': False,
+                'errors': errors,
+            })
+        return Response({
+            'ok': True,
+            'result': ProductSerializer(products, many=True).data,
+            'errors': None
+        })
+
+
 class UserAPIView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = UserProfileDetailsSerializer
@@ -138,7 +195,7 @@ class UserAPIView(generics.RetrieveAPIView):
 
 
 class UserPostsCreateAPIView(generics.CreateAPIView):
-    # TODO explore if we need to do validation for rich editor text
+    # rich editor HTML, sanitized into `rendered_content` on save, see `posts.rendering`
     permission_classes = [IsAuthenticated]
     serializer_class = PostSerializer
 
@@ -150,17 +207,18 @@ class UserPostsCreateAPIView(generics.CreateAPIView):
 
 
 class UserPostsAPIView(generics.GenericAPIView):
-    # TODO explore if we need to do validation for rich editor text
+    # rich editor HTML, sanitized into `rendered_content` on save, see `posts.rendering`
     permission_classes = [IsAuthenticated]
     serializer_class = PostSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        return Post.objects.select_related('user').prefetch_related('comments')
+        return Post.objects.all()
 
     def get(self, request, pk):
-        posts = self.get_queryset().filter(user=pk).order_by('-created_at')
+        posts = self.paginate_queryset(self.get_queryset().filter(user=pk).order_by('-created_at'))
         serializer = self.serializer_class(posts, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     def put(self, request, pk):
         post = Post.objects.filter(id=pk, user=request.user).first()
@@ -220,7 +278,7 @@ class UserFollowAPIView(generics.GenericAPIView):
                 }
             })
 
-        UserFollowers.objects.create(user_id=pk, follower=request.user)
+        follow_user(request.user, pk)
         return Response()
 
 
@@ -228,7 +286,7 @@ class UserUnfollowAPIView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
-        UserFollowers.objects.filter(user_id=pk, follower=request.user).delete()
+        unfollow_user(request.user, pk)
         return Response()
 
 
@@ -262,36 +320,70 @@ class UserCredentialsUpdateAPIView(generics.UpdateAPIView):
         return self.request.user
 
 
-class UserFollowingAPIView(generics.ListAPIView):
+class FollowEdgeListAPIView(generics.ListAPIView):
+    """
+    Lists users through the rows pointing at them (follows, recommendations),
+    so the pages are range scans over the indexes of those rows.
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = UserSerializer
+    pagination_class = CreatedAtCursorPagination
+    # the user of the row that's listed
+    edge_user_field = None
+    # `social_graph` method listing the ids of the whole list, by user id,
+    # cursor pages need the time of the rows and always read the table
+    graph_lookup = None
+    users_batch_size = 1000
+
+    def list(self, request, *args, **kwargs):
+        user_ids = None if self.paginator.is_cursor_mode(request) else self.get_graph_user_ids()
+        if user_ids is not None:
+            return Response(self.get_serializer(self.get_users(user_ids), many=True).data)
+        edges = self.paginate_queryset(self.get_queryset().select_related(self.edge_user_field))
+        users = [getattr(edge, self.edge_user_field) for edge in edges]
+        return self.get_paginated_response(self.get_serializer(users, many=True).data)
+
+    def get_graph_user_ids(self):
+        if self.graph_lookup is None:
+            return None
+        try:
+            user_id = parse_positive_int(self.kwargs.get('pk'))
+        except ValueError:
+            return None
+        return getattr(social_graph, self.graph_lookup)(user_id)
+
+    def get_users(self, user_ids):
+        users = []
+        for start in range(0, len(user_ids), self.users_batch_size):
+            users += User.objects.filter(id__in=user_ids[start:start + self.users_batch_size]).order_by('id')
+        return users
+
+
+class UserFollowingAPIView(FollowEdgeListAPIView):
+    edge_user_field = 'user'
+    graph_lookup = 'following'
 
     def get_queryset(self):
-        pk = self.kwargs.get('pk')
-        return User.objects.filter(followers__follower_id=pk).all()
+        return UserFollowers.objects.filter(follower_id=self.kwargs.get('pk')).order_by('-created_at')
 
 
-class UserFollowersAPIView(generics.ListAPIView):
-    permission_classes = [IsAuthenticated]
-    serializer_class = UserSerializer
+class UserFollowersAPIView(FollowEdgeListAPIView):
+    edge_user_field = 'follower'
+    graph_lookup = 'followers'
 
     def get_queryset(self):
-        pk = self.kwargs.get('pk')
-        return User.objects.filter(following__user_id=pk).all()
+        return UserFollowers.objects.filter(user_id=self.kwargs.get('pk')).order_by('-created_at')
 
 
-class UserRecommendedAPIView(generics.ListAPIView):
-    permission_classes = [IsAuthenticated]
-    serializer_class = UserSerializer
+class UserRecommendedAPIView(FollowEdgeListAPIView):
+    edge_user_field = 'candidate'
+    pagination_class = RecommendedUsersPagination
 
     def get_queryset(self):
-        pk = self.kwargs.get('pk')
-        return User.objects.filter(followers__follower_id=pk) \
-            .exclude(followers__follower_id=self.request.user.id) \
-            .exclude(id=self.request.user.id)
-
-    def finalize_response(self, request, response, *args, **kwargs):
-        # TODO we are only returning 5 users for now, we need to implement pagination
-        response = super().finalize_response(request, response, *args, **kwargs)
-        response.data = response.data[:5]
-        return response
+        # candidates of `pk` the viewer doesn't follow yet, that also drops the
+        # ones followed since the last `rebuild_recommendations` run
+        user_id = self.request.user.id
+        return UserRecommendation.objects.filter(user_id=self.kwargs.get('pk')) \
+            .exclude(candidate_id__in=UserFollowers.objects.filter(follower_id=user_id).values('user_id')) \
+            .exclude(candidate_id=user_id) \
+            .order_by('-score')
@@ -39,12 +39,15 @@ def get_message_by_id(mid: int) -> Awaitable[Optional[Tuple[str, str]]]:
 
 @database_sync_to_async
 def mark_message_as_read(mid: int) -> Awaitable[None]:
-    return MessageModel.objects.filter(id=mid).update(read=True)
+    authors = MessageModel.objects.filter(id=mid).values_list('recipient_id', 'sender_id').first()
+    if authors is None:
+        return 0
+    return MessageModel.mark_as_read(*authors, id=mid)
 
 
 @database_sync_to_async
 def mark_message_as_read_with_authors(recipient_id, sender_id, mid) -> Awaitable[None]:
-    return MessageModel.objects.filter(recipient_id=recipient_id, sender_id=sender_id, id=mid).update(read=True)
+    return MessageModel.mark_as_read(recipient_id, sender_id, id=mid)
 
 
 @database_sync_to_async
@@ -0,0 +1,103 @@
+import heapq
+from operator import attrgetter
+
+from .models import MessageModel
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 100
+
+get_id = attrgetter('id')
+
+
+def get_conversation_querysets(user_id, other_id):
+    """
+    The messages between two users as one queryset per direction, each a range
+    of the `(sender, recipient, id)` index.
+    """
+    messages = MessageModel.objects.select_related('sender', 'file')
+    sent = messages.filter(sender_id=user_id, recipient_id=other_id)
+    if str(user_id) == str(other_id):
+        return [sent]
+    return [sent, messages.filter(sender_id=other_id, recipient_id=user_id)]
+
+
+def get_user_querysets(user_id):
+    """
+    The messages of a user as a queryset of the sent and one of the received
+    ones, each a range of the `(sender, id)` or `(recipient, id)` index.
+    """
+    messages = MessageModel.objects.select_related('sender', 'file')
+    return [messages.filter(sender_id=user_id), messages.filter(recipient_id=user_id)]
+
+
+def merge(pages, reverse=False):
+    """
+    Merges `pages` sorted by id, a message found by more than one queryset,
+    one sent to oneself, is kept once.
+    """
+    messages = []
+    for message in heapq.merge(*pages, key=get_id, reverse=reverse):
+        if not messages or message.id != messages[-1].id:
+            messages.append(message)
+    return messages
+
+
+def get_all(querysets):
+    """
+    Every message, newest first, for requests that don't page.
+    """
+    return merge([queryset.order_by('-id') for queryset in querysets], reverse=True)
+
+
+def get_older(querysets, before, limit):
+    """
+    Up to `limit` messages with an id below `before` (any, when `None`),
+    newest first, and whether there are older ones.
+    """
+    pages = []
+    for queryset in querysets:
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        pages.append(list(queryset.order_by('-id')[:limit + 1]))
+    messages = merge(pages, reverse=True)
+    return messages[:limit], len(messages) > limit
+
+
+def get_newer(querysets, after, limit):
+    """
+    Up to `limit` messages with an id above `after`, the ones right after it,
+    newest first, and whether there are newer ones.
+    """
+    pages = [list(queryset.filter(id__gt=after).order_by('id')[:limit + 1]) for queryset in querysets]
+    messages = merge(pages)
+    return messages[:limit][::-1], len(messages) > limit
+
+
+def get_around(querysets, anchor, limit):
+    """
+    The message `anchor` and the ones around it, half of `limit` newer than
+    it. Returns `(messages, has_older, has_newer)`, newest first.
+    """
+    newer, has_newer = get_newer(querysets, anchor, limit // 2)
+    older, has_older = get_older(querysets, anchor + 1, limit - len(newer))
+    return newer + older, has_older, has_newer
+
+
+def has_older(querysets, before):
+    return any(queryset.filter(id__lt=before).exists() for queryset in querysets)
+
+
+def has_newer(querysets, after):
+    return any(queryset.filter(id__gt=after).exists() for queryset in querysets)
+
+
+def get_first_unread_id(user_id, other_id):
+    """
+    Oldest unread message `other_id` sent to `user_id`, read from the
+    `(recipient, sender, read, id)` index.
+    """
+    return MessageModel.objects \
+        .filter(recipient_id=user_id, sender_id=other_id, read=False) \
+        .order_by('id') \
+        .values_list('id', flat=True) \
+        .first()
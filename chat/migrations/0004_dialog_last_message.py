@@ -0,0 +1,73 @@
+# Generated by Django 4.0 on 2026-10-18 05:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Q
+
+
+def fill_dialog_counters(apps, schema_editor):
+    DialogsModel = apps.get_model('chat', 'DialogsModel')
+    MessageModel = apps.get_model('chat', 'MessageModel')
+    # (sender, recipient) -> (last message id, unread count)
+    pairs = {
+        (row['sender_id'], row['recipient_id']): (row['last_id'], row['unread'])
+        for row in MessageModel.all_objects.filter(is_removed=False).order_by()
+        .values('sender_id', 'recipient_id')
+        .annotate(last_id=Max('id'), unread=Count('id', filter=Q(read=False)))
+    }
+    dialogs = []
+    for dialog in DialogsModel.objects.iterator(chunk_size=1000):
+        last_id, user2_unread = pairs.get((dialog.user1_id, dialog.user2_id), (None, 0))
+        other_last_id, user1_unread = pairs.get((dialog.user2_id, dialog.user1_id), (None, 0))
+        dialog.last_message_id = max(filter(None, (last_id, other_last_id)), default=None)
+        dialog.user1_unread_count = user1_unread
+        dialog.user2_unread_count = user2_unread
+        dialogs.append(dialog)
+        if len(dialogs) >= 1000:
+            save_dialogs(MessageModel, DialogsModel, dialogs)
+            dialogs = []
+    save_dialogs(MessageModel, DialogsModel, dialogs)
+
+
+def save_dialogs(MessageModel, DialogsModel, dialogs):
+    # `modified` orders the dialog list, it becomes the time of the last message
+    created = dict(MessageModel.all_objects.filter(id__in=[dialog.last_message_id for dialog in dialogs])
+                   .values_list('id', 'created'))
+    for dialog in dialogs:
+        dialog.modified = created.get(dialog.last_message_id, dialog.modified)
+    DialogsModel.objects.bulk_update(dialogs, ['last_message', 'user1_unread_count', 'user2_unread_count',
+                                               'modified'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_messagemodel_is_call'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dialogsmodel',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.messagemodel', verbose_name='Last message'),
+        ),
+        migrations.AddField(
+            model_name='dialogsmodel',
+            name='user1_unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='User1 unread count'),
+        ),
+        migrations.AddField(
+            model_name='dialogsmodel',
+            name='user2_unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='User2 unread count'),
+        ),
+        migrations.AddIndex(
+            model_name='dialogsmodel',
+            index=models.Index(fields=['user1', 'modified', 'id'], name='dialog_user1_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dialogsmodel',
+            index=models.Index(fields=['user2', 'modified', 'id'], name='dialog_user2_modified_idx'),
+        ),
+        migrations.RunPython(fill_dialog_counters, migrations.RunPython.noop),
+    ]
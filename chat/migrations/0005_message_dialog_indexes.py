@@ -0,0 +1,21 @@
+# Generated by Django 4.0 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_dialog_last_message'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['sender', 'recipient', 'id'], name='message_dialog_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['recipient', 'sender', 'read', 'id'], name='message_dialog_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0 on 2026-10-18 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_dialog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['sender', 'id'], name='message_sender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['recipient', 'id'], name='message_recipient_idx'),
+        ),
+    ]
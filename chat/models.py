@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.utils.timezone import localtime
@@ -8,7 +8,9 @@ from model_utils.models import TimeStampedModel, SoftDeletableModel, SoftDeletab
 from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.auth import get_user_model
 from typing import Optional, Any
-from django.db.models import Q
+from django.db.models import Q, F, Case, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
 import uuid
 
 UserModel: AbstractBaseUser = get_user_model()
@@ -36,18 +38,33 @@ class DialogsModel(TimeStampedModel):
                               related_name="+", db_index=True)
     user2 = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name=_("User2"),
                               related_name="+", db_index=True)
+    # denormalized from `MessageModel`, kept up to date by `MessageModel.save`,
+    # `MessageModel.mark_as_read` and `MessageModel.delete`. `modified` is the
+    # time of the last message.
+    last_message = models.ForeignKey('MessageModel', on_delete=models.SET_NULL, verbose_name=_("Last message"),
+                                     related_name='+', null=True, blank=True)
+    user1_unread_count = models.PositiveIntegerField(verbose_name=_("User1 unread count"), default=0)
+    user2_unread_count = models.PositiveIntegerField(verbose_name=_("User2 unread count"), default=0)
 
     class Meta:
         unique_together = (('user1', 'user2'), ('user2', 'user1'))
+        indexes = [
+            models.Index(fields=['user1', 'modified', 'id'], name='dialog_user1_modified_idx'),
+            models.Index(fields=['user2', 'modified', 'id'], name='dialog_user2_modified_idx'),
+        ]
         verbose_name = _("Dialog")
         verbose_name_plural = _("Dialogs")
 
     def __str__(self):
         return _("Dialog between ") + f"{self.user1_id}, {self.user2_id}"
 
+    @staticmethod
+    def between(u1, u2):
+        return DialogsModel.objects.filter(Q(user1=u1, user2=u2) | Q(user1=u2, user2=u1))
+
     @staticmethod
     def dialog_exists(u1: AbstractBaseUser, u2: AbstractBaseUser) -> Optional[Any]:
-        return DialogsModel.objects.filter(Q(user1=u1, user2=u2) | Q(user1=u2, user2=u1)).first()
+        return DialogsModel.between(u1, u2).first()
 
     @staticmethod
     def create_if_not_exists(u1: AbstractBaseUser, u2: AbstractBaseUser):
@@ -59,6 +76,69 @@ class DialogsModel(TimeStampedModel):
     def get_dialogs_for_user(user: AbstractBaseUser):
         return DialogsModel.objects.filter(Q(user1=user) | Q(user2=user)).values_list('user1__pk', 'user2__pk')
 
+    def get_unread_count(self, user_id) -> int:
+        return self.user1_unread_count if self.user1_id == user_id else self.user2_unread_count
+
+    @staticmethod
+    def add_unread(recipient_id, count):
+        """
+        Unread counter updates of the side of `recipient_id`, a negative
+        `count` never takes a counter below zero.
+        """
+        return {
+            f'{side}_unread_count': Case(
+                When(**{f'{side}_id': recipient_id}, then=Greatest(F(f'{side}_unread_count') + count, 0)),
+                default=F(f'{side}_unread_count'),
+            )
+            for side in ('user1', 'user2')
+        }
+
+    @staticmethod
+    def record_message(message):
+        """
+        Makes `message` the last message of its dialog, creating the dialog
+        when there is none yet.
+        """
+        unread = 0 if message.read else 1
+        updates = dict(last_message=message, modified=timezone.now(),
+                       **DialogsModel.add_unread(message.recipient_id, unread))
+        if DialogsModel.between(message.sender_id, message.recipient_id).update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                DialogsModel.objects.create(
+                    user1_id=message.sender_id, user2_id=message.recipient_id, last_message=message,
+                    user2_unread_count=unread,
+                    # a dialog with oneself counts on both sides
+                    user1_unread_count=unread if message.sender_id == message.recipient_id else 0,
+                )
+        except IntegrityError:
+            # created concurrently
+            DialogsModel.between(message.sender_id, message.recipient_id).update(**updates)
+
+    @staticmethod
+    def forget_message(message, unread):
+        """
+        Takes `message`, about to be deleted, off its dialog: off the unread
+        counter of its recipient when `unread` and, when it's the last message,
+        points the dialog at the newest message left.
+        """
+        dialog = DialogsModel.between(message.sender_id, message.recipient_id)
+        if unread:
+            dialog.update(**DialogsModel.add_unread(message.recipient_id, -1))
+        if not dialog.filter(last_message_id=message.id).exists():
+            return
+        # one range of the `(sender, recipient, id)` index per direction
+        directions = {(message.sender_id, message.recipient_id), (message.recipient_id, message.sender_id)}
+        previous_ids = [
+            MessageModel.objects.filter(sender_id=sender_id, recipient_id=recipient_id).exclude(id=message.id)
+            .order_by('-id').values_list('id', flat=True).first()
+            for sender_id, recipient_id in directions
+        ]
+        # a message recorded meanwhile already took its place
+        dialog.filter(last_message_id=message.id) \
+            .update(last_message_id=max(filter(None, previous_ids), default=None))
+
 
 class MessageModel(TimeStampedModel, SoftDeletableModel):
     id = models.BigAutoField(primary_key=True, verbose_name=_("Id"))
@@ -75,7 +155,26 @@ class MessageModel(TimeStampedModel, SoftDeletableModel):
 
     @staticmethod
     def get_unread_count_for_dialog_with_user(sender, recipient):
-        return MessageModel.objects.filter(sender_id=sender, recipient_id=recipient, read=False).count()
+        dialog = DialogsModel.between(sender, recipient) \
+            .values('user1_id', 'user1_unread_count', 'user2_unread_count').first()
+        if dialog is None:
+            return 0
+        if dialog['user1_id'] == int(recipient):
+            return dialog['user1_unread_count']
+        return dialog['user2_unread_count']
+
+    @staticmethod
+    def mark_as_read(recipient_id, sender_id, **filters):
+        """
+        Marks the matching unread messages from `sender_id` to `recipient_id`
+        as read and takes them off the unread counter of their dialog.
+        """
+        with transaction.atomic():
+            read = MessageModel.objects.filter(recipient_id=recipient_id, sender_id=sender_id, read=False,
+                                               **filters).update(read=True)
+            if read:
+                DialogsModel.between(sender_id, recipient_id).update(**DialogsModel.add_unread(recipient_id, -read))
+        return read
 
     @staticmethod
     def get_last_message_for_dialog(sender, recipient):
@@ -96,11 +195,32 @@ class MessageModel(TimeStampedModel, SoftDeletableModel):
         return str(self.pk)
 
     def save(self, *args, **kwargs):
-        super(MessageModel, self).save(*args, **kwargs)
-        DialogsModel.create_if_not_exists(self.sender, self.recipient)
+        created = self._state.adding
+        with transaction.atomic():
+            super(MessageModel, self).save(*args, **kwargs)
+            if created:
+                DialogsModel.record_message(self)
+
+    def delete(self, using=None, *args, soft=True, **kwargs):
+        # `MessageModel.objects.filter(...).delete()` soft-deletes in one update
+        # and leaves the dialog as it is
+        with transaction.atomic(using=using):
+            # a concurrent `mark_as_read` waits for the lock and then skips the removed message
+            state = MessageModel.all_objects.select_for_update().filter(id=self.id) \
+                .values_list('read', 'is_removed').first()
+            if state is not None and not state[1]:
+                DialogsModel.forget_message(self, unread=not state[0])
+            return super(MessageModel, self).delete(using, *args, soft=soft, **kwargs)
 
     class Meta:
         ordering = ('-created',)
+        # the ranges read by `chat.history`
+        indexes = [
+            models.Index(fields=['sender', 'recipient', 'id'], name='message_dialog_idx'),
+            models.Index(fields=['recipient', 'sender', 'read', 'id'], name='message_dialog_unread_idx'),
+            models.Index(fields=['sender', 'id'], name='message_sender_idx'),
+            models.Index(fields=['recipient', 'id'], name='message_recipient_idx'),
+        ]
         verbose_name = _("Message")
         verbose_name_plural = _("Messages")
 
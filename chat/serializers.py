@@ -10,7 +10,7 @@ def serialize_file_model(m: UploadedFile) -> Dict[str, str]:
 
 
 def serialize_message_model(m: MessageModel, user_id):
-    sender_pk = m.sender.pk
+    sender_pk = m.sender_id
     is_out = sender_pk == user_id
     # TODO: add forwards
     # TODO: add replies
@@ -24,30 +24,29 @@ def serialize_message_model(m: MessageModel, user_id):
         "read": m.read,
         "file": serialize_file_model(m.file) if m.file else None,
         "sender": str(sender_pk),
-        "recipient": str(m.recipient.pk),
+        "recipient": str(m.recipient_id),
         "out": is_out,
         "sender_name": m.sender.name
     }
     return obj
 
 
+DIALOG_RELATED_FIELDS = ('user1', 'user2', 'last_message__sender', 'last_message__file')
+
+
 def serialize_dialog_model(m: DialogsModel, user_id):
-    other_user_pk, other_user_name = UserModel.objects.filter(pk=m.user1.pk) \
-        .values_list('pk', 'name').first() \
-        if m.user2.pk == user_id \
-        else UserModel.objects.filter(pk=m.user2.pk).values_list('pk', 'name').first()
-
-    unread_count = MessageModel.get_unread_count_for_dialog_with_user(sender=other_user_pk, recipient=user_id)
-    last_message: Optional[MessageModel] = MessageModel.get_last_message_for_dialog(sender=other_user_pk,
-                                                                                    recipient=user_id)
-    last_message_ser = serialize_message_model(last_message, user_id) if last_message else None
+    # expects `DIALOG_RELATED_FIELDS` to be selected
+    other_user = m.user1 if m.user2_id == user_id else m.user2
+    last_message: Optional[MessageModel] = m.last_message
+    last_message_ser = serialize_message_model(last_message, user_id) \
+        if last_message and not last_message.is_removed else None
     obj = {
         "id": m.id,
         "created": int(m.created.timestamp()),
         "modified": int(m.modified.timestamp()),
-        "other_user_id": str(other_user_pk),
-        "unread_count": unread_count,
-        "name": other_user_name,
+        "other_user_id": str(other_user.pk),
+        "unread_count": m.get_unread_count(user_id),
+        "name": other_user.name,
         "last_message": last_message_ser
     }
     return obj
@@ -0,0 +1,145 @@
+from urllib.parse import parse_qs, urlsplit
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from base.models import User
+from chat.models import DialogsModel, MessageModel
+
+
+class DialogsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user')
+        self.other = User.objects.create(email='other@example.com', name='other')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, sender, recipient, **kwargs):
+        return MessageModel.objects.create(sender=sender, recipient=recipient, text='text', **kwargs)
+
+    def get_dialog(self):
+        return DialogsModel.between(self.user, self.other).get()
+
+    def test_deleted_messages_leave_the_dialog(self):
+        first = self.send(self.other, self.user)
+        second = self.send(self.user, self.other)
+        third = self.send(self.other, self.user)
+        dialog = self.get_dialog()
+        self.assertEqual((dialog.last_message_id, dialog.get_unread_count(self.user.id)), (third.id, 2))
+
+        third.delete()
+        dialog = self.get_dialog()
+        self.assertEqual((dialog.last_message_id, dialog.get_unread_count(self.user.id)), (second.id, 1))
+        # deleted twice, counted once
+        MessageModel.all_objects.get(id=third.id).delete()
+        self.assertEqual(self.get_dialog().get_unread_count(self.user.id), 1)
+
+        MessageModel.mark_as_read(self.user.id, self.other.id)
+        first.refresh_from_db()
+        first.delete()
+        dialog = self.get_dialog()
+        self.assertEqual((dialog.last_message_id, dialog.get_unread_count(self.user.id)), (second.id, 0))
+
+        second.delete(soft=False)
+        self.assertIsNone(self.get_dialog().last_message_id)
+
+    def test_deleting_an_older_message_keeps_the_last_one(self):
+        first = self.send(self.other, self.user, read=True)
+        second = self.send(self.other, self.user)
+        first.delete()
+        dialog = self.get_dialog()
+        self.assertEqual((dialog.last_message_id, dialog.get_unread_count(self.user.id)), (second.id, 1))
+
+    def test_dialog_list_pages(self):
+        users = [User.objects.create(email=f'user{index}@example.com', name=f'user{index}') for index in range(5)]
+        for index, user in enumerate(users):
+            # the user is on either side of its dialogs
+            if index % 2:
+                self.send(self.user, user)
+            else:
+                self.send(user, self.user)
+        self.send(self.user, self.user)
+        self.send(users[0], self.user)
+        expected = [users[0].id, self.user.id, users[4].id, users[3].id, users[2].id, users[1].id]
+
+        response = self.client.get('/chat/dialogs/').json()
+        self.assertEqual((response['page'], response['pages']), (0, 0))
+        self.assertEqual([int(dialog['other_user_id']) for dialog in response['data']], expected)
+
+        ids, params = [], {'page_size': 2}
+        while params:
+            page = self.client.get('/chat/dialogs/', params).json()
+            ids += [int(dialog['other_user_id']) for dialog in page['results']]
+            params = page['next'] and parse_qs(urlsplit(page['next']).query)
+        self.assertEqual(ids, expected)
+
+    def test_dialog_to_oneself_is_created(self):
+        response = self.client.get('/chat/dialogs/').json()
+        self.assertEqual([dialog['other_user_id'] for dialog in response['data']], [str(self.user.id)])
+
+
+class MessagesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com', name='user')
+        self.other = User.objects.create(email='other@example.com', name='other')
+        self.third = User.objects.create(email='third@example.com', name='third')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # ten messages of the dialog, one to oneself and three the user isn't in
+        self.outside = MessageModel.objects.create(sender=self.third, recipient=self.other, text='text')
+        self.messages = []
+        for index in range(10):
+            sender, recipient = (self.user, self.other) if index % 3 else (self.other, self.user)
+            self.messages.append(MessageModel.objects.create(sender=sender, recipient=recipient, text='text'))
+            if index == 4:
+                self.own = MessageModel.objects.create(sender=self.user, recipient=self.user, text='text')
+                MessageModel.objects.create(sender=self.other, recipient=self.third, text='text')
+                MessageModel.objects.create(sender=self.third, recipient=self.other, text='text')
+        self.ids = [message.id for message in reversed(self.messages)]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params).json()
+        return [message['id'] for message in response.pop('data')], response
+
+    def test_requests_without_page_params_get_every_message(self):
+        ids, response = self.get('/chat/messages/')
+        self.assertEqual(ids, sorted(self.ids + [self.own.id], reverse=True))
+        self.assertEqual(response, {'page': 0, 'pages': 0})
+
+        ids, response = self.get(f'/chat/messages/{self.other.id}/')
+        self.assertEqual(ids, self.ids)
+        self.assertEqual(response, {'page': 0, 'pages': 0})
+
+    def test_pages_of_the_user(self):
+        expected = sorted(self.ids + [self.own.id], reverse=True)
+        ids, response = self.get('/chat/messages/', limit=4)
+        self.assertEqual((ids, response['has_older'], response['has_newer']), (expected[:4], True, False))
+
+        ids, response = self.get('/chat/messages/', limit=4, before=ids[-1])
+        self.assertEqual((ids, response['has_older'], response['has_newer']), (expected[4:8], True, True))
+
+        ids, response = self.get('/chat/messages/', limit=4, before=ids[-1])
+        self.assertEqual((ids, response['has_older'], response['has_newer']), (expected[8:], False, True))
+
+    def test_pages_after_a_message(self):
+        ids, response = self.get(f'/chat/messages/{self.other.id}/', limit=3, after=self.ids[-1])
+        self.assertEqual((ids, response['has_older'], response['has_newer']), (self.ids[-4:-1], True, True))
+
+        ids, response = self.get(f'/chat/messages/{self.other.id}/', limit=3, after=self.ids[2])
+        self.assertEqual((ids, response['has_older'], response['has_newer']), (self.ids[:2], True, False))
+
+        # no message of the dialog is older than `self.outside`
+        ids, response = self.get(f'/chat/messages/{self.other.id}/', limit=3, after=self.outside.id)
+        self.assertEqual((ids, response['has_older'], response['has_newer']), (self.ids[-3:], False, True))
+
+    def test_page_around_the_first_unread_message(self):
+        MessageModel.mark_as_read(self.user.id, self.other.id, id__lte=self.messages[3].id)
+        ids, response = self.get(f'/chat/messages/{self.other.id}/', limit=4, first_unread=1)
+        self.assertEqual(response['first_unread_id'], self.messages[6].id)
+        self.assertEqual(ids, [message.id for message in reversed(self.messages[5:9])])
+        self.assertEqual((response['has_older'], response['has_newer']), (True, True))
+
+    def test_invalid_ids(self):
+        for params in ({'before': 'x'}, {'after': '0'}, {'around': '-1'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/chat/messages/', params).status_code, 404)
@@ -15,17 +15,23 @@ from rest_framework.generics import (
 )
 
 from rest_framework.decorators import permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 
 from base.models import User
+from base.pagination import DialogsPagination
+from base.utils import parse_positive_int
+from . import history
 from .filters import UsersFilter
 from .models import (
     MessageModel,
     DialogsModel,
     UploadedFile
 )
-from .serializers import serialize_message_model, serialize_dialog_model, serialize_file_model, UserSerializer
+from .serializers import serialize_message_model, serialize_dialog_model, serialize_file_model, UserSerializer, \
+    DIALOG_RELATED_FIELDS
 from django.db.models import Q
+from django.utils.translation import gettext as _
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 
@@ -39,53 +45,101 @@ import json
 
 
 class MessagesModelList(ListAPIView):
+    """
+    Messages newest first. Requests with `limit`, `before`, `after`, `around`
+    or, in a dialog, `first_unread=1` get up to `limit` of them: the latest
+    ones, the ones before or after a message id, the ones around one or around
+    the first unread message of the dialog. Those read a `LIMIT` range of an
+    index per queryset of `chat.history`. Requests without any of them still
+    get every message.
+    """
     permission_classes = [IsAuthenticated]
+    page_query_params = ('limit', 'before', 'after', 'around', 'first_unread')
 
-    def get_queryset(self):
+    def get_querysets(self):
         if self.kwargs.get('dialog_with'):
-            qs = MessageModel.objects \
-                .filter(Q(recipient=self.request.user, sender=self.kwargs['dialog_with']) |
-                        Q(sender=self.request.user, recipient=self.kwargs['dialog_with'])) \
-                .select_related('sender', 'recipient')
-        else:
-            qs = MessageModel.objects.filter(Q(recipient=self.request.user) |
-                                             Q(sender=self.request.user)).prefetch_related('sender', 'recipient',
-                                                                                           'file')
-
-        return qs.order_by('-created')
+            return history.get_conversation_querysets(self.request.user.pk, self.get_id('dialog_with', self.kwargs))
+        return history.get_user_querysets(self.request.user.pk)
 
     def get(self, request, *args, **kwargs):
         user_pk = self.request.user.pk
-        data = [serialize_message_model(i, user_pk) for i in self.get_queryset()]
-        # page: Page = context.pop('page_obj')
-        # paginator: Paginator = context.pop('paginator')
-        return_data = {
-            'page': 0,
-            'pages': 0,
-            'data': data
-        }
-        return JsonResponse(return_data)
+        querysets = self.get_querysets()
+        if not any(name in request.query_params for name in self.page_query_params):
+            # page: Page = context.pop('page_obj')
+            # paginator: Paginator = context.pop('paginator')
+            return_data = {
+                'page': 0,
+                'pages': 0,
+                'data': [serialize_message_model(i, user_pk) for i in history.get_all(querysets)]
+            }
+            return JsonResponse(return_data)
+
+        limit = self.get_limit()
+        before, after, around = (self.get_id(name, request.query_params) for name in ('before', 'after', 'around'))
+
+        first_unread_id = None
+        if around is None and self.kwargs.get('dialog_with') \
+                and request.query_params.get('first_unread', '').lower() in ('1', 'true'):
+            first_unread_id = history.get_first_unread_id(user_pk, self.get_id('dialog_with', self.kwargs))
+            around = first_unread_id
+
+        if around is not None:
+            messages, has_older, has_newer = history.get_around(querysets, around, limit)
+        elif after is not None:
+            messages, has_newer = history.get_newer(querysets, after, limit)
+            # the page starts right after `after`
+            has_older = history.has_older(querysets, after + 1)
+        else:
+            messages, has_older = history.get_older(querysets, before, limit)
+            has_newer = before is not None and history.has_newer(querysets, before - 1)
+
+        return JsonResponse({
+            'data': [serialize_message_model(i, user_pk) for i in messages],
+            'has_older': has_older,
+            'has_newer': has_newer,
+            'first_unread_id': first_unread_id,
+        })
+
+    def get_limit(self):
+        try:
+            return parse_positive_int(self.request.query_params['limit'], cutoff=history.MAX_LIMIT)
+        except (KeyError, ValueError):
+            return history.DEFAULT_LIMIT
+
+    @staticmethod
+    def get_id(name, params):
+        if params.get(name) is None:
+            return None
+        try:
+            return parse_positive_int(params[name])
+        except ValueError:
+            raise NotFound(_('Invalid %(name)s') % {'name': name})
 
 
 class DialogsModelList(ListAPIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = DialogsPagination
 
-    # paginate_by = getattr(settings, 'DIALOGS_PAGINATION', 20)
-
-    def get_queryset(self):
-        qs = DialogsModel.objects.filter(Q(user1_id=self.request.user.pk) | Q(user2_id=self.request.user.pk)) \
-            .select_related('user1', 'user2')
-        return qs.order_by('-created')
+    def get_querysets(self):
+        """
+        The dialogs of the user as one queryset per side, each a range of its
+        `(user, modified, id)` index.
+        """
+        dialogs = DialogsModel.objects.select_related(*DIALOG_RELATED_FIELDS)
+        return [dialogs.filter(user1_id=self.request.user.pk), dialogs.filter(user2_id=self.request.user.pk)]
 
     def get(self, request, *args, **kwargs):
         # TODO: add online status
         user_pk = self.request.user.pk
-        queryset = self.get_queryset()
-        if queryset.count() == 0:
+        dialogs = self.get_dialogs()
+        if not dialogs and not request.query_params.get(self.paginator.cursor_query_param):
             # we should always have dialog opened to ourselves
             DialogsModel.objects.create(user1_id=user_pk, user2_id=user_pk)
+            dialogs = self.get_dialogs()
 
-        data = [serialize_dialog_model(i, user_pk) for i in queryset]
+        data = [serialize_dialog_model(i, user_pk) for i in dialogs]
+        if self.paginator.cursor_mode:
+            return self.get_paginated_response(data)
         # page: Page = context.pop('page_obj')
         # paginator: Paginator = context.pop('paginator')
         return_data = {
@@ -95,6 +149,9 @@ class DialogsModelList(ListAPIView):
         }
         return JsonResponse(return_data)
 
+    def get_dialogs(self):
+        return self.paginate_queryset(self.get_querysets())
+
 
 class SelfInfoView(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
@@ -114,9 +171,8 @@ class UsersAPIView(ListAPIView):
     queryset = User.objects.all()
     filterset_class = UsersFilter
 
-    def finalize_response(self, request, response, *args, **kwargs):
-        response.data = response.data[:5]
-        return super().finalize_response(request, response, *args, **kwargs)
+    def filter_queryset(self, queryset):
+        return super().filter_queryset(queryset)[:5]
 
 
 # 2.5MB - 2621440
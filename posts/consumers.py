@@ -0,0 +1,60 @@
+import json
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from posts.live import get_comments_group
+from posts.models import Post
+
+logger = logging.getLogger('posts.consumers')
+UNAUTH_REJECT_CODE = 4001
+NOT_FOUND_REJECT_CODE = 4004
+
+
+@database_sync_to_async
+def post_exists(post_id):
+    return Post.objects.bare().filter(id=post_id).exists()
+
+
+class PostCommentsConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes the comments created on or deleted from one post, so post pages
+    fetch `CommentView` once and then apply `comment_created` and
+    `comment_deleted` events. Only sockets in the group of the post get them.
+    """
+    group_name = None
+
+    async def connect(self):
+        user = self.scope['user']
+        if not user or not user.is_authenticated:
+            logger.info(f"Rejecting unauthenticated user with code {UNAUTH_REJECT_CODE}")
+            await self.close(code=UNAUTH_REJECT_CODE)
+            return
+        post_id = self.scope['url_route']['kwargs']['post_id']
+        if not await post_exists(post_id):
+            await self.close(code=NOT_FOUND_REJECT_CODE)
+            return
+        self.group_name = get_comments_group(post_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.group_name is not None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # read only, comments are written through `CommentCreateView`
+        pass
+
+    async def comment_created(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'comment_created',
+            'comment': event['comment'],
+        }))
+
+    async def comment_deleted(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'comment_deleted',
+            'comment_id': event['comment_id'],
+        }))
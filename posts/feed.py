@@ -0,0 +1,130 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from base.background import BackgroundQueue
+from base.models import User, UserFollowers
+from posts.models import Post, TimelineEntry
+
+# timeline rows written per statement, every batch commits on its own
+FANOUT_BATCH_SIZE = 1000
+
+
+def is_fanned_out(followers_count):
+    return followers_count <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def iter_batches(iterable, size=FANOUT_BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_follower_ids(user_id):
+    return UserFollowers.objects.filter(user_id=user_id) \
+        .values_list('follower_id', flat=True) \
+        .distinct() \
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+
+
+def fan_out_post(post_id):
+    """
+    Pushes a new post to the timelines of the author's followers. Posts of
+    authors with more than `FEED_FANOUT_MAX_FOLLOWERS` followers are left out,
+    the feed reads them from the posts table instead.
+    """
+    post = Post.objects.bare().filter(id=post_id).values('user_id', 'created_at').first()
+    if post is None:
+        return
+    if not is_fanned_out(User.objects.values_list('followers_count', flat=True).get(id=post['user_id'])):
+        return
+    for follower_ids in iter_batches(iter_follower_ids(post['user_id'])):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follower_id, post_id=post_id, created_at=post['created_at'])
+             for follower_id in follower_ids],
+            ignore_conflicts=True,
+        )
+
+
+def backfill_followers(user_id):
+    """
+    Copies the recent posts of a user whose followers count dropped to the
+    fan-out threshold to the timelines of all their followers. Their posts
+    were pulled until then, so they would drop out of the feeds otherwise.
+    """
+    if not is_fanned_out(User.objects.values_list('followers_count', flat=True).get(id=user_id)):
+        return
+    posts = list(Post.objects.filter(user_id=user_id).order_by('-created_at', '-id')
+                 .values_list('id', 'created_at')[:settings.FEED_BACKFILL_POSTS])
+    if not posts:
+        return
+    for follower_ids in iter_batches(iter_follower_ids(user_id), max(FANOUT_BATCH_SIZE // len(posts), 1)):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follower_id, post_id=post_id, created_at=created_at)
+             for follower_id in follower_ids for post_id, created_at in posts],
+            ignore_conflicts=True,
+        )
+
+
+# timeline writes of new posts, follows, unfollows and authors crossing the
+# fan-out threshold, so no request waits for them
+fan_out_queue = BackgroundQueue('feed.fan_out')
+
+
+def backfill_timeline(follower_id, user_id):
+    """
+    Copies the recent posts of a newly followed user to the follower's timeline.
+    """
+    if not is_fanned_out(User.objects.values_list('followers_count', flat=True).get(id=user_id)):
+        return
+    posts = Post.objects.filter(user_id=user_id).order_by('-created_at', '-id') \
+        .values_list('id', 'created_at')[:settings.FEED_BACKFILL_POSTS]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=follower_id, post_id=post_id, created_at=created_at) for post_id, created_at in posts],
+        ignore_conflicts=True,
+    )
+
+
+def remove_from_timeline(follower_id, user_id):
+    TimelineEntry.objects.filter(user_id=follower_id, post__user_id=user_id).delete()
+
+
+def trim_timeline(user_id, length=None):
+    """
+    Drops the entries past the newest `length` of a timeline.
+    """
+    length = length or settings.FEED_TIMELINE_LENGTH
+    last_kept = TimelineEntry.objects.filter(user_id=user_id) \
+        .order_by('-created_at', '-post_id') \
+        .values_list('created_at', 'post_id')[length - 1:length] \
+        .first()
+    if last_kept is None:
+        return 0
+    created_at, post_id = last_kept
+    deleted, _ = TimelineEntry.objects.filter(user_id=user_id) \
+        .filter(Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lt=post_id)) \
+        .delete()
+    return deleted
+
+
+def get_feed_querysets(user):
+    """
+    The sources of a home feed: the user's timeline, and the posts of the
+    followed accounts that are too big to fan out. Both are ordered and paged
+    by `(feed_created_at, feed_id)`, read from the timeline entries for the
+    first, so the `(user, created_at, post)` index serves it.
+    """
+    # the annotations reuse the join of the filter
+    timeline = Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_created_at=F('timeline_entries__created_at'),
+        feed_id=F('timeline_entries__post_id'),
+    )
+    pulled = Post.objects.filter(
+        user__in=User.objects.filter(followers__follower=user,
+                                     followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS).values('id')
+    ).annotate(feed_created_at=F('created_at'), feed_id=F('id'))
+    return [
+        queryset.order_by('-feed_created_at', '-feed_id')
+        for queryset in (timeline, pulled)
+    ]
@@ -0,0 +1,46 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from base import metrics
+from posts.serializers import CommentSerializer
+
+logger = logging.getLogger('posts.live')
+
+
+def get_comments_group(post_id):
+    """
+    Channel layer group of the sockets watching the comments of a post, see
+    `posts.consumers.PostCommentsConsumer`.
+    """
+    return f'post_{post_id}_comments'
+
+
+def send_to_comments_group(post_id, event):
+    """
+    Called once the change is committed, so a channel layer outage only costs
+    the sockets this event, never the request.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(get_comments_group(post_id), event)
+    except Exception:
+        logger.exception(f'Failed to send {event["type"]} to the sockets of post {post_id}')
+        metrics.increment('posts.live_send_failures')
+
+
+def send_comment_created(comment):
+    send_to_comments_group(comment.post_id, {
+        'type': 'comment_created',
+        'comment': CommentSerializer(comment).data,
+    })
+
+
+def send_comment_deleted(post_id, comment_id):
+    send_to_comments_group(post_id, {
+        'type': 'comment_deleted',
+        'comment_id': comment_id,
+    })
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from base.models import User, UserFollowers
+from base.pagination import FeedCursorPagination
+from posts.feed import FANOUT_BATCH_SIZE, backfill_timeline, fan_out_post, get_feed_querysets
+from posts.models import Post
+
+BENCHMARK_EMAIL_DOMAIN = '@benchmark.invalid'
+
+
+class Command(BaseCommand):
+    help = ('Times the timeline writes run by the fan-out queue, and the first feed page, for an author with '
+            'each given number of followers. The rows are created in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('followers', nargs='*', type=int, default=[100, 1000, 10000])
+        parser.add_argument('--posts', type=int, default=settings.FEED_BACKFILL_POSTS,
+                            help='Number of posts of the author')
+
+    def handle(self, *args, followers=(), posts=0, **options):
+        for count in followers:
+            with transaction.atomic():
+                timings = self.run(count, posts)
+                transaction.set_rollback(True)
+            self.stdout.write(f'{count} followers: ' + ', '.join(f'{name} {seconds:.3f}s'
+                                                                 for name, seconds in timings))
+
+    def run(self, count, posts):
+        author = User.objects.create(email='author' + BENCHMARK_EMAIL_DOMAIN, name='author')
+        reader = User.objects.create(email='reader' + BENCHMARK_EMAIL_DOMAIN, name='reader')
+        User.objects.bulk_create(
+            [User(email=f'{index}{BENCHMARK_EMAIL_DOMAIN}', name='follower') for index in range(count)],
+            batch_size=FANOUT_BATCH_SIZE,
+        )
+        followers = list(User.objects.filter(email__endswith=BENCHMARK_EMAIL_DOMAIN)
+                         .exclude(id__in=[author.id, reader.id]))
+        UserFollowers.objects.bulk_create([UserFollowers(user=author, follower=follower) for follower in followers],
+                                          batch_size=FANOUT_BATCH_SIZE)
+        User.objects.filter(id=author.id).update(followers_count=count)
+        Post.objects.bulk_create([Post(user=author, content=f'post {index}') for index in range(posts)])
+        post = Post.objects.create(user=author, content='post')
+
+        timings = []
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=count):
+            timings.append(('fan_out_post', self.time(fan_out_post, post.id)))
+            timings.append(('backfill_timeline', self.time(backfill_timeline, reader.id, author.id)))
+            timings.append(('timeline page', self.time(self.read_feed_page, followers[0])))
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=count - 1):
+            timings.append(('pulled page', self.time(self.read_feed_page, followers[0])))
+        return timings
+
+    @staticmethod
+    def read_feed_page(user):
+        for queryset in get_feed_querysets(user):
+            list(queryset[:FeedCursorPagination.page_size])
+
+    @staticmethod
+    def time(function, *args):
+        started = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - started
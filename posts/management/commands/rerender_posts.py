@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.rendering import get_content_hash, render_batch
+
+
+class Command(BaseCommand):
+    help = 'Re-renders the posts whose rendered content is missing or from an older sanitizer policy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=200, help='Posts rendered per task')
+        parser.add_argument('--force', action='store_true', help='Re-render posts that are up to date')
+
+    def handle(self, *args, workers=2, batch_size=200, force=False, **options):
+        rendered = skipped = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            for rows in self.iter_stale_posts(batch_size, force):
+                # keep a bounded number of batches in flight
+                if len(pending) >= workers * 2:
+                    rendered_count, skipped_count = self.collect(pending, return_when=FIRST_COMPLETED)
+                    rendered, skipped = rendered + rendered_count, skipped + skipped_count
+                future = executor.submit(render_batch, [(post_id, content) for post_id, content, _ in rows])
+                pending[future] = {post_id: content_hash for post_id, _, content_hash in rows}
+            rendered_count, skipped_count = self.collect(pending)
+            rendered, skipped = rendered + rendered_count, skipped + skipped_count
+
+        self.stdout.write(self.style.SUCCESS(f'{rendered} posts rendered, {skipped} edited meanwhile'))
+
+    @staticmethod
+    def iter_stale_posts(batch_size, force):
+        last_id = 0
+        while True:
+            rows = list(
+                Post.objects.bare().filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'content', 'content_hash')[:batch_size]
+            )
+            if not rows:
+                return
+            stale = [row for row in rows if force or get_content_hash(row[1]) != row[2]]
+            if stale:
+                yield stale
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def collect(pending, return_when=ALL_COMPLETED):
+        finished, _ = wait(pending, return_when=return_when)
+        rendered = skipped = 0
+        for future in finished:
+            previous_hashes = pending.pop(future)
+            with transaction.atomic():
+                for post_id, rendered_content, content_hash in future.result():
+                    # a post saved since it was read was rendered by its save
+                    updated = Post.objects.filter(id=post_id, content_hash=previous_hashes[post_id]) \
+                        .update(rendered_content=rendered_content, content_hash=content_hash)
+                    rendered += updated
+                    skipped += 1 - updated
+        return rendered, skipped
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.feed import trim_timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Drops the home feed entries past the newest FEED_TIMELINE_LENGTH of every timeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--length', type=int, default=settings.FEED_TIMELINE_LENGTH)
+
+    def handle(self, *args, length=None, **options):
+        user_ids = TimelineEntry.objects.order_by() \
+            .values('user_id') \
+            .annotate(entries=Count('id')) \
+            .filter(entries__gt=length) \
+            .values_list('user_id', flat=True)
+        deleted = sum(trim_timeline(user_id, length) for user_id in list(user_ids))
+        self.stdout.write(self.style.SUCCESS(f'{deleted} timeline entries removed'))
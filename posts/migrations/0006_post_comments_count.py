@@ -0,0 +1,28 @@
+# Generated by Django 4.0 on 2026-10-18 05:32
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_comments_count(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    rows = Comment.objects.order_by().values('post').annotate(count=Count('id'))
+    for row in rows.iterator():
+        Post.objects.filter(id=row['post']).update(comments_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
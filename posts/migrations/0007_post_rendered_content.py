@@ -0,0 +1,146 @@
+# Generated by Django 4.0 on 2026-10-18 05:36
+
+import hashlib
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+
+# a copy of the sanitizer `posts.rendering` had when this migration was
+# written, so later policy changes don't change what it stores, those are
+# picked up by `rerender_posts`
+RENDERING_VERSION = 1
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'del', 'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img',
+    'li', 'ol', 'p', 'pre', 's', 'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr',
+    'u', 'ul',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# dropped along with everything inside them
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'textarea', 'title'}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+}
+# tags an open tag of the same kind ends, `<li>a<li>b` is two items
+IMPLICITLY_CLOSED = {
+    'li': {'li'},
+    'p': {'p'},
+    'tr': {'tr', 'td', 'th'},
+    'td': {'td', 'th'},
+    'th': {'td', 'th'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_URL_SCHEMES = {'', 'http', 'https', 'mailto'}
+
+
+def is_safe_url(url):
+    # browsers ignore whitespace and control characters in schemes, `java\tscript:`
+    url = ''.join(char for char in url if char > ' ')
+    try:
+        return urlsplit(url).scheme.lower() in ALLOWED_URL_SCHEMES
+    except ValueError:
+        return False
+
+
+class ContentSanitizer(HTMLParser):
+    """
+    Rebuilds rich-editor HTML from the allowed tags and attributes only.
+    Other tags are dropped and their text kept, the text of `DROPPED_TAGS`
+    goes too. Every tag left open is closed at the end.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropped_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth += 1
+            return
+        if self.dropped_depth or tag not in ALLOWED_TAGS:
+            return
+        while self.open_tags and self.open_tags[-1] in IMPLICITLY_CLOSED.get(tag, ()):
+            self.parts.append(f'</{self.open_tags.pop()}>')
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        self.parts.append(f'<{tag}')
+        for name, value in attrs:
+            if name not in allowed or value is None or name in URL_ATTRIBUTES and not is_safe_url(value):
+                continue
+            self.parts.append(f' {name}="{escape(value)}"')
+        if tag == 'a':
+            self.parts.append(' rel="nofollow noopener"')
+        self.parts.append('>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth = max(self.dropped_depth - 1, 0)
+            return
+        if self.dropped_depth or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.parts.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropped_depth:
+            self.parts.append(escape(data, quote=False))
+
+    def render(self, content):
+        self.feed(content)
+        self.close()
+        while self.open_tags:
+            self.parts.append(f'</{self.open_tags.pop()}>')
+        return ''.join(self.parts)
+
+
+def render_content(content):
+    return ContentSanitizer().render(content)
+
+
+def get_content_hash(content):
+    return hashlib.sha256(f'{RENDERING_VERSION}:{content}'.encode()).hexdigest()
+
+
+def render_posts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = []
+    for post in Post.objects.only('id', 'content').iterator(chunk_size=1000):
+        post.rendered_content = render_content(post.content)
+        post.content_hash = get_content_hash(post.content)
+        posts.append(post)
+        if len(posts) >= 1000:
+            Post.objects.bulk_update(posts, ['rendered_content', 'content_hash'])
+            posts = []
+    Post.objects.bulk_update(posts, ['rendered_content', 'content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rendered_content',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 
 from base.models import BaseModel, User, TimestampFields
+from posts.rendering import get_content_hash, render_content
 
 
 # Create your models here.
@@ -8,13 +9,35 @@ from base.models import BaseModel, User, TimestampFields
 class Post(TimestampFields, BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False)
     content = models.TextField(null=False, blank=False)
+    # sanitized `content`, rendered on save, see `posts.rendering`
+    rendered_content = models.TextField(blank=True, default='')
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    # denormalized from `Comment`, kept up to date by `posts.signals`
+    comments_count = models.PositiveIntegerField(default=0)
 
-    def get_default_select_related_fields(self):
-        return ['user', 'comments']
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='post_user_created_idx'),
+        ]
 
-    def get_default_prefetch_related_fields(self):
+    @classmethod
+    def get_default_select_related_fields(cls):
+        return ['user']
+
+    @classmethod
+    def get_default_prefetch_related_fields(cls):
         return []
 
+    def save(self, *args, **kwargs):
+        content_hash = get_content_hash(self.content)
+        if content_hash != self.content_hash:
+            self.rendered_content = render_content(self.content)
+            self.content_hash = content_hash
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'rendered_content', 'content_hash'}
+        super().save(*args, **kwargs)
+
 
 class Comment(TimestampFields, BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False)
@@ -22,8 +45,33 @@ class Comment(TimestampFields, BaseModel):
                              related_name='comments')
     content = models.TextField(null=False, blank=False)
 
-    def get_default_select_related_fields(self):
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+        ]
+
+    @classmethod
+    def get_default_select_related_fields(cls):
         return ['user']
 
-    def get_default_prefetch_related_fields(self):
+    @classmethod
+    def get_default_prefetch_related_fields(cls):
         return []
+
+
+class TimelineEntry(models.Model):
+    """
+    A post pushed to the home feed of one follower of its author, see `posts.feed`.
+    `created_at` is the post's, so the timeline is ordered like the posts.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'post'], name='timeline_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='timeline_user_post_unique'),
+        ]
@@ -6,14 +6,11 @@ from posts.models import Post, Comment
 
 class PostSerializer(ExpandSerializer, serializers.ModelSerializer):
     user_data = serializers.SerializerMethodField(read_only=True)
-    comments_count = serializers.SerializerMethodField(read_only=True)
-
-    def get_comments_count(self, obj):
-        return obj.comments.count()
 
     class Meta:
         model = Post
-        read_only_fields = ('id', 'user', 'created_at', 'updated_at', 'user_data', 'comments_count')
+        read_only_fields = ('id', 'user', 'created_at', 'updated_at', 'user_data', 'comments_count',
+                            'rendered_content')
         fields = ('content',) + read_only_fields
         extra_kwargs = {
             field: {"read_only": True} for field in read_only_fields
@@ -23,7 +20,7 @@ class PostSerializer(ExpandSerializer, serializers.ModelSerializer):
 class CommentSerializer(ExpandSerializer, serializers.ModelSerializer):
     post_id = serializers.PrimaryKeyRelatedField(required=True,
                                                  source='post',
-                                                 queryset=Post.objects.all())
+                                                 queryset=Post.objects.bare())
     user_data = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
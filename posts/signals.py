@@ -0,0 +1,90 @@
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete, post_delete
+
+from base.follows import user_followed, user_unfollowed
+from base.models import User
+from posts.feed import fan_out_post, fan_out_queue, backfill_followers, backfill_timeline, remove_from_timeline
+from posts.live import send_comment_created, send_comment_deleted
+from posts.models import Post, Comment
+
+
+def fan_out_created_post(sender, instance, created, **kwargs):
+    if created:
+        post_id = instance.id
+        transaction.on_commit(lambda: fan_out_queue.schedule(fan_out_post, post_id))
+
+
+def backfill_followed_timeline(sender, follower_id, user_id, **kwargs):
+    transaction.on_commit(lambda: fan_out_queue.schedule(backfill_timeline, follower_id, user_id))
+
+
+def prune_unfollowed_timeline(sender, follower_id, user_id, count, **kwargs):
+    transaction.on_commit(lambda: fan_out_queue.schedule(remove_from_timeline, follower_id, user_id))
+    # the posts of an author that just dropped to the threshold were pulled
+    # by the feeds until now, push the recent ones to their followers
+    followers_count = User.objects.values_list('followers_count', flat=True).get(id=user_id)
+    if followers_count <= settings.FEED_FANOUT_MAX_FOLLOWERS < followers_count + count:
+        transaction.on_commit(lambda: fan_out_queue.schedule(backfill_followers, user_id))
+
+
+class DeletingPosts(threading.local):
+    """
+    Ids of the posts this thread is deleting. The comments deleted with them
+    need neither a count update nor a broadcast.
+    """
+
+    def __init__(self):
+        self.ids = set()
+
+
+deleting_posts = DeletingPosts()
+
+
+def mark_deleting_post(sender, instance, **kwargs):
+    # sent for the posts before their comments are deleted
+    deleting_posts.ids.add(instance.id)
+
+
+def unmark_deleted_post(sender, instance, **kwargs):
+    deleting_posts.ids.discard(instance.id)
+
+
+def count_created_comment(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(id=instance.post_id).update(comments_count=F('comments_count') + 1)
+
+
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts.ids:
+        return
+    # never below zero, a drifted count shouldn't fail the delete
+    Post.objects.filter(id=instance.post_id, comments_count__gt=0) \
+        .update(comments_count=F('comments_count') - 1)
+
+
+def broadcast_created_comment(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: send_comment_created(instance))
+
+
+def broadcast_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts.ids:
+        return
+    # the instance loses its pk once the delete finishes
+    post_id, comment_id = instance.post_id, instance.id
+    transaction.on_commit(lambda: send_comment_deleted(post_id, comment_id))
+
+
+post_save.connect(fan_out_created_post, sender=Post, dispatch_uid='posts_fan_out')
+user_followed.connect(backfill_followed_timeline, dispatch_uid='posts_timeline_follow')
+user_unfollowed.connect(prune_unfollowed_timeline, dispatch_uid='posts_timeline_unfollow')
+pre_delete.connect(mark_deleting_post, sender=Post, dispatch_uid='posts_post_deleting')
+post_delete.connect(unmark_deleted_post, sender=Post, dispatch_uid='posts_post_deleted')
+post_save.connect(count_created_comment, sender=Comment, dispatch_uid='posts_comment_created_count')
+post_delete.connect(count_deleted_comment, sender=Comment, dispatch_uid='posts_comment_deleted_count')
+post_save.connect(broadcast_created_comment, sender=Comment, dispatch_uid='posts_comment_created_broadcast')
+post_delete.connect(broadcast_deleted_comment, sender=Comment, dispatch_uid='posts_comment_deleted_broadcast')
@@ -1,3 +1,305 @@
-from django.test import TestCase
+from concurrent.futures import Future
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from base import metrics
+from base.follows import follow_user, unfollow_user
+from base.models import User
+from base.recommendations import recommendations_queue
+from posts.consumers import PostCommentsConsumer, UNAUTH_REJECT_CODE, NOT_FOUND_REJECT_CODE
+from posts.feed import backfill_timeline, fan_out_queue
+from posts.management.commands.rerender_posts import Command as RerenderPostsCommand
+from posts.models import Post, Comment, TimelineEntry
+from posts.rendering import get_content_hash, render_content
+
+
+class PostListQueryBudgetTestCase(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(email='author@example.com', name='author')
+        self.reader = User.objects.create(email='reader@example.com', name='reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def add_posts(self, count):
+        for index in range(count):
+            post = Post.objects.create(user=self.author, content=f'post {index}')
+            for _ in range(index % 3):
+                Comment.objects.create(user=self.reader, post=post, content='comment')
+            TimelineEntry.objects.create(user=self.reader, post=post, created_at=post.created_at)
+
+    def assert_constant_queries(self, url, expected):
+        self.add_posts(2)
+        with self.assertNumQueries(expected):
+            self.client.get(url)
+        self.add_posts(8)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        return response
+
+    def test_user_posts_queries(self):
+        response = self.assert_constant_queries(f'/api/user/posts/{self.author.id}/', 1)
+        posts = response.json()
+        self.assertEqual(len(posts), 10)
+        for post in posts:
+            self.assertEqual(post['comments_count'], Comment.objects.filter(post_id=post['id']).count())
+
+    def test_feed_queries(self):
+        response = self.assert_constant_queries('/api/posts/feed/', 2)
+        self.assertEqual(len(response.json()), 10)
+
+    def test_comments_count_follows_comments(self):
+        post = Post.objects.create(user=self.author, content='post')
+        comments = [Comment.objects.create(user=self.reader, post=post, content='comment') for _ in range(3)]
+        comments[0].delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+
+    def test_deleting_a_post_skips_its_comments(self):
+        post = Post.objects.create(user=self.author, content='post')
+        for _ in range(3):
+            Comment.objects.create(user=self.reader, post=post, content='comment')
+        with mock.patch('posts.signals.send_comment_deleted') as send, \
+                self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            post.delete()
+        send.assert_not_called()
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertFalse(Comment.objects.exists())
+
+        # comments deleted on their own are counted again
+        other = Post.objects.create(user=self.author, content='other')
+        Comment.objects.create(user=self.reader, post=other, content='comment').delete()
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 0)
+        Comment.objects.create(user=self.reader, post=other, content='comment')
+        Comment.objects.create(user=self.reader, post=other, content='comment').delete()
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 1)
+
+    def test_channel_layer_failures_keep_the_request(self):
+        post = Post.objects.create(user=self.author, content='post')
+        channel_layer = mock.Mock(group_send=mock.AsyncMock(side_effect=ConnectionError))
+        failures = metrics.value('posts.live_send_failures')
+        with mock.patch('posts.live.get_channel_layer', return_value=channel_layer), \
+                self.assertLogs('posts.live', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/comments/', {'post_id': post.id, 'content': 'comment'})
+        self.assertEqual(response.status_code, 201)
+        channel_layer.group_send.assert_called_once()
+        self.assertEqual(metrics.value('posts.live_send_failures'), failures + 1)
+
+    def test_post_and_comment_views_queries(self):
+        self.add_posts(3)
+        post = Post.objects.bare().latest('id')
+        for url in (f'/api/posts/{post.id}/', f'/api/posts/{post.id}/comments/'):
+            with self.subTest(url=url), self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+        # the fan-out runs on commit, outside of the request
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/user/posts/', {'content': 'post'}, format='json')
+        self.assertEqual(response.json()['user_data']['id'], self.reader.id)
+        # post lookup, insert and the counter update
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/posts/comments/', {'content': 'comment', 'post_id': post.id},
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTestCase(TestCase):
+    def setUp(self):
+        self.small = User.objects.create(email='small@example.com', name='small')
+        self.big = User.objects.create(email='big@example.com', name='big')
+        self.reader = User.objects.create(email='reader@example.com', name='reader')
+        self.other = User.objects.create(email='other@example.com', name='other')
+        follow_user(self.reader, self.small.id)
+        follow_user(self.reader, self.big.id)
+        follow_user(self.other, self.big.id)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        # run the queued timeline writes right away, and leave the recommendations out
+        for patcher in (mock.patch.object(fan_out_queue, 'schedule', lambda function, *args: function(*args)),
+                        mock.patch.object(recommendations_queue, 'schedule')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_post(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(user=user, content='post')
+
+    def get_feed_ids(self, **params):
+        return [post['id'] for post in self.client.get('/api/posts/feed/', params).json()]
+
+    def test_pages_merge_timeline_and_pulled_posts(self):
+        posts = [self.create_post(user) for user in (self.small, self.big, self.small, self.big, self.small)]
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 3)
+
+        ids, params = [], {'page_size': 2}
+        while params:
+            page = self.client.get('/api/posts/feed/', params).json()
+            ids += [post['id'] for post in page['results']]
+            params = page['next'] and parse_qs(urlsplit(page['next']).query)
+        self.assertEqual(ids, [post.id for post in reversed(posts)])
+
+    def test_pulled_posts_stay_when_the_author_drops_to_the_threshold(self):
+        post = self.create_post(self.big)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.get_feed_ids(), [post.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            unfollow_user(self.other, self.big.id)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.get_feed_ids(), [post.id])
+
+    def test_follows_update_the_timeline_in_the_background(self):
+        post = self.create_post(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_user(self.big, self.other.id)
+        self.assertEqual(list(TimelineEntry.objects.filter(user=self.big).values_list('post_id', flat=True)),
+                         [post.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            unfollow_user(self.big, self.other.id)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.big).exists())
+
+        with mock.patch.object(fan_out_queue, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                follow_user(self.big, self.other.id)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.big).exists())
+        schedule.assert_called_once_with(backfill_timeline, self.big.id, self.other.id)
+
+
+class ContentRenderingTestCase(TestCase):
+    def test_unsafe_urls_are_dropped(self):
+        for url in ('javascript:alert(1)', 'JavaScript:alert(1)', 'java\tscript:alert(1)', ' javascript:alert(1)',
+                    'java&#10;script:alert(1)', 'data:text/html,<script>alert(1)</script>', 'vbscript:msgbox(1)'):
+            with self.subTest(url=url):
+                self.assertEqual(render_content(f'<a href="{url}">link</a><img src="{url}">'),
+                                 '<a rel="nofollow noopener">link</a><img>')
+        self.assertEqual(render_content('<a href="https://example.com/?a=1&b=2">link</a>'),
+                         '<a href="https://example.com/?a=1&amp;b=2" rel="nofollow noopener">link</a>')
+
+    def test_only_allowed_attributes_are_kept(self):
+        self.assertEqual(render_content('<p onclick="alert(1)" style="color: red" class="x">text</p>'),
+                         '<p>text</p>')
+        self.assertEqual(render_content('<img src="/a.png" onerror="alert(1)" alt="a&quot;b">'),
+                         '<img src="/a.png" alt="a&quot;b">')
+
+    def test_dropped_tags_lose_their_bodies(self):
+        self.assertEqual(render_content('a<script>alert(1)</script>b<style>p {}</style>c'), 'abc')
+        self.assertEqual(render_content('<textarea><p>not markup</p></textarea>text'), 'text')
+        self.assertEqual(render_content('<b>bold<script>alert(1)'), '<b>bold</b>')
+        # other unknown tags only lose the tag itself
+        self.assertEqual(render_content('<div><font>text</font></div>'), 'text')
+
+    def test_comments_and_cdata_are_dropped(self):
+        self.assertEqual(render_content('a<!-- <script>alert(1)</script> -->b'), 'ab')
+        self.assertEqual(render_content('a<![CDATA[<script>alert(1)</script>]]>b'), 'ab')
+
+    def test_text_is_escaped(self):
+        self.assertEqual(render_content('1 &lt; 2 &amp;&amp; <b>3 &gt; 2</b>'), '1 &lt; 2 &amp;&amp; <b>3 &gt; 2</b>')
+
+    def test_open_tags_are_closed(self):
+        self.assertEqual(render_content('<p><b>bold <i>both'), '<p><b>bold <i>both</i></b></p>')
+        self.assertEqual(render_content('<b>bold</i> still</b>'), '<b>bold still</b>')
+        self.assertEqual(render_content('<b><i>both</b> none'), '<b><i>both</i></b> none')
+        self.assertEqual(render_content('<ul><li>a<li>b</ul>'), '<ul><li>a</li><li>b</li></ul>')
+        self.assertEqual(render_content('<p>a<p>b'), '<p>a</p><p>b</p>')
+        self.assertEqual(render_content('<table><tr><td>a<td>b<tr><td>c</table>'),
+                         '<table><tr><td>a</td><td>b</td></tr><tr><td>c</td></tr></table>')
+
+    def test_save_renders_changed_content_only(self):
+        user = User.objects.create(email='author@example.com', name='author')
+        post = Post.objects.create(user=user, content='<b>post</b><script>alert(1)</script>')
+        self.assertEqual((post.rendered_content, post.content_hash),
+                         ('<b>post</b>', get_content_hash(post.content)))
+
+        with mock.patch('posts.models.render_content') as render:
+            post.save()
+            Post.objects.get(id=post.id).save(update_fields=['content'])
+        render.assert_not_called()
+
+        post.content = '<i>edited</i>'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual((post.rendered_content, post.content_hash),
+                         ('<i>edited</i>', get_content_hash('<i>edited</i>')))
+
+
+class RerenderPostsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='author@example.com', name='author')
+
+    def test_stale_posts_are_rendered(self):
+        fresh = Post.objects.create(user=self.user, content='<b>fresh</b>')
+        stale = Post.objects.create(user=self.user, content='<b>stale</b>')
+        Post.objects.filter(id=stale.id).update(rendered_content='', content_hash='')
+
+        batches = list(RerenderPostsCommand.iter_stale_posts(batch_size=1, force=False))
+        self.assertEqual(batches, [[(stale.id, stale.content, '')]])
+        forced = list(RerenderPostsCommand.iter_stale_posts(batch_size=10, force=True))
+        self.assertEqual([[row[0] for row in batch] for batch in forced], [[fresh.id, stale.id]])
+
+    def test_posts_edited_meanwhile_are_skipped(self):
+        edited = Post.objects.create(user=self.user, content='<b>edited</b>')
+        untouched = Post.objects.create(user=self.user, content='<b>untouched</b>')
+        Post.objects.filter(id__in=[edited.id, untouched.id]).update(rendered_content='', content_hash='old')
+
+        # the batch was read before `edited` was saved again
+        future = Future()
+        future.set_result([(edited.id, '<b>stale</b>', 'stale'), (untouched.id, '<b>untouched</b>', 'new')])
+        edited.content = '<i>edited</i>'
+        edited.save()
+
+        self.assertEqual(RerenderPostsCommand.collect({future: {edited.id: 'old', untouched.id: 'old'}}), (1, 1))
+        edited.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual((edited.rendered_content, edited.content_hash),
+                         ('<i>edited</i>', get_content_hash('<i>edited</i>')))
+        self.assertEqual((untouched.rendered_content, untouched.content_hash), ('<b>untouched</b>', 'new'))
+
+
+class PostCommentsConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='reader@example.com', name='reader')
+        self.post = Post.objects.create(user=self.user, content='post')
+
+    def get_communicator(self, post_id, user):
+        communicator = WebsocketCommunicator(PostCommentsConsumer.as_asgi(), f'/posts/{post_id}/comments_ws')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'post_id': str(post_id)}}
+        return communicator
+
+    async def test_comment_events_reach_sockets_of_the_post(self):
+        communicator = self.get_communicator(self.post.id, self.user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        comment = await database_sync_to_async(Comment.objects.create)(user=self.user, post=self.post,
+                                                                       content='comment')
+        event = await communicator.receive_json_from()
+        self.assertEqual((event['type'], event['comment']['id']), ('comment_created', comment.id))
+
+        comment_id = comment.id
+        await database_sync_to_async(comment.delete)()
+        event = await communicator.receive_json_from()
+        self.assertEqual(event, {'type': 'comment_deleted', 'comment_id': comment_id})
+
+        other_post = await database_sync_to_async(Post.objects.create)(user=self.user, content='other')
+        await database_sync_to_async(Comment.objects.create)(user=self.user, post=other_post, content='comment')
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_rejected_connections(self):
+        for post_id, user, code in ((self.post.id, AnonymousUser(), UNAUTH_REJECT_CODE),
+                                    (self.post.id + 100, self.user, NOT_FOUND_REJECT_CODE)):
+            communicator = self.get_communicator(post_id, user)
+            connected, close_code = await communicator.connect()
+            self.assertEqual((connected, close_code), (False, code))
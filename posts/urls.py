@@ -1,7 +1,13 @@
-from django.urls import path
+from django.urls import path, re_path
+from . import consumers
 from . import views
 
+websocket_urlpatterns = [
+    re_path(r'^posts/(?P<post_id>\d+)/comments_ws$', consumers.PostCommentsConsumer.as_asgi()),
+]
+
 urlpatterns = [
+    path('feed/', views.FeedView.as_view(), name="feed"),
     path('comments/', views.CommentCreateView.as_view(), name="create_comment"),
     path('<str:pk>/comments/', views.CommentView.as_view(), name="get_comments"),
     path('<str:pk>/', views.PostView.as_view(), name="get_post"),
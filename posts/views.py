@@ -4,7 +4,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.utils.translation import gettext as _
 
+from base.pagination import CreatedAtCursorPagination, FeedCursorPagination
 from base.utils import normalize_serializer_errors
+from posts.feed import get_feed_querysets
 from posts.models import Post, Comment
 from posts.serializers import PostSerializer, CommentSerializer
 
@@ -18,6 +20,19 @@ class PostView(generics.RetrieveAPIView):
     serializer_class = PostSerializer
 
 
+class FeedView(generics.GenericAPIView):
+    """
+    Posts of the users the request user follows, newest first.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = PostSerializer
+    pagination_class = FeedCursorPagination
+
+    def get(self, request):
+        posts = self.paginate_queryset(get_feed_querysets(request.user))
+        return self.get_paginated_response(self.get_serializer(posts, many=True).data)
+
+
 class CommentCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Comment.objects.all()
@@ -31,6 +46,7 @@ class CommentView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Comment.objects.order_by('-created_at').all()
     serializer_class = CommentSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        return self.queryset.filter(post_id=self.kwargs.get('pk')).select_related('user')
+        return self.queryset.filter(post_id=self.kwargs.get('pk'))